@@ -0,0 +1,441 @@
+"""
+AI Waste Classification Service
+Flask API for the image and text classifiers (port 8000, called by the Node server)
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from dotenv import load_dotenv
+from flask import Flask, Request, Response, g, jsonify, request, stream_with_context
+from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+
+from models.bulk import (IMAGE_BATCH_SIZE, TEXT_BATCH_SIZE, classify_images_ndjson, classify_texts_ndjson,
+                         iter_archive_images, iter_ndjson_texts)
+from models.image_classifier import ImageClassifier
+from models.inference_backends import BACKENDS
+from models.metrics import metrics
+from models.model_registry import ModelRegistry
+from models.near_duplicates import NearDuplicateIndex
+from models.preprocessing import ImageRejected
+from models.shadow_evaluation import SHADOW_LOG_PATH, ShadowEvaluator
+from models.responses import PROFILES, get_guidance, has_guidance, parse_fields
+from models.result_cache import ResultCache
+from models.text_classifier import TextClassifier
+
+load_dotenv()
+
+PORT = int(os.getenv('PORT', '8000'))
+# Image requests allowed to run at once in this process; more get 429
+MAX_INFLIGHT_IMAGES = int(os.getenv('AI_MAX_INFLIGHT_IMAGES', '8'))
+# How long an image request may wait for a free slot before 429
+QUEUE_TIMEOUT = float(os.getenv('AI_QUEUE_TIMEOUT_MS', '0')) / 1000
+MAX_UPLOAD_BYTES = int(os.getenv('AI_MAX_UPLOAD_MB', '10')) * 1024 * 1024
+MAX_BULK_BYTES = int(os.getenv('AI_MAX_BULK_MB', '2048')) * 1024 * 1024
+# Bulk uploads up to this size stay in memory, larger ones spill to a temporary file
+BULK_SPOOL_BYTES = 8 * 1024 * 1024
+# Intra-op threads per model (per worker process); unset = library default
+MODEL_THREADS = int(os.getenv('AI_MODEL_THREADS', '0')) or None
+MODEL_INTER_OP_THREADS = int(os.getenv('AI_MODEL_INTER_OP_THREADS', '0')) or None
+# Model replicas run by dedicated inference threads per worker (0 = call the model on request threads)
+INFERENCE_REPLICAS = int(os.getenv('AI_INFERENCE_REPLICAS', '0'))
+# How long a request waits for its model call before falling back; unset = no limit
+INFERENCE_TIMEOUT_MS = float(os.getenv('AI_INFERENCE_TIMEOUT_MS', '0')) or None
+# Reuse the classification of an earlier image within this many differing perceptual-hash bits; unset = off
+NEAR_DUPLICATE_DISTANCE = os.getenv('AI_NEAR_DUPLICATE_DISTANCE', '')
+NEAR_DUPLICATE_ENTRIES = int(os.getenv('AI_NEAR_DUPLICATE_ENTRIES', '20000'))
+# Keras models only: run as compiled graphs per batch-size bucket, optionally with XLA and bfloat16
+GRAPH_MODE = os.getenv('AI_GRAPH_MODE', '0') == '1'
+INFERENCE_PRECISION = os.getenv('AI_INFERENCE_PRECISION', 'float32')
+XLA = os.getenv('AI_XLA', '0') == '1'
+# Versioned models (see models/model_registry.py); without a promoted version the files in models/ are used
+MODEL_REGISTRY_DIR = os.getenv('AI_MODEL_REGISTRY', 'models/registry')
+# How often each worker checks the registry for a newly promoted version (0 = never)
+MODEL_RELOAD_INTERVAL = float(os.getenv('AI_MODEL_RELOAD_INTERVAL', '30'))
+# Registry version to compare with the served model on live traffic (see models/shadow_evaluation.py); unset = off
+SHADOW_VERSION = os.getenv('AI_SHADOW_VERSION', '')
+# 'shadow': mirror AI_SHADOW_FRACTION of requests to it; 'ab': let it answer that fraction
+SHADOW_MODE = os.getenv('AI_SHADOW_MODE', 'shadow')
+SHADOW_FRACTION = float(os.getenv('AI_SHADOW_FRACTION', '1.0'))
+SHADOW_LOG = os.getenv('AI_SHADOW_LOG', SHADOW_LOG_PATH)
+MICRO_BATCHING = os.getenv('AI_MICRO_BATCHING', '0') == '1'
+# Reuse results for identical images / normalized texts (see models/result_cache.py)
+RESULT_CACHE = os.getenv('AI_RESULT_CACHE', '0') == '1'
+RESULT_CACHE_BYTES = int(os.getenv('AI_RESULT_CACHE_MB', '64')) * 1024 * 1024
+# SQLite file shared by the workers and kept across restarts; unset = memory only
+RESULT_CACHE_PATH = os.getenv('AI_RESULT_CACHE_PATH', '')
+
+# HTTP status per ImageRejected code; anything else is a 400
+REJECTION_STATUS = {'image_too_large': 413, 'unsupported_format': 415}
+
+
+class UploadRequest(Request):
+    """
+    Parses multipart uploads straight into memory.
+    Werkzeug would otherwise spool files over 500KB to a temporary file
+    that the classifier then reads back; the size is already capped by
+    MAX_CONTENT_LENGTH.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+_image_classifier = None
+_text_classifier = None
+_shadow = None
+_cache = None
+_cache_pid = None
+_init_lock = threading.Lock()
+_inflight = threading.BoundedSemaphore(MAX_INFLIGHT_IMAGES)
+_inflight_count = 0
+_count_lock = threading.Lock()
+
+
+def get_image_classifier() -> ImageClassifier:
+    global _image_classifier
+    if _image_classifier is None:
+        with _init_lock:
+            if _image_classifier is None:
+                _image_classifier = ImageClassifier(micro_batching=MICRO_BATCHING, num_threads=MODEL_THREADS,
+                                                    inter_op_threads=MODEL_INTER_OP_THREADS,
+                                                    inference_replicas=INFERENCE_REPLICAS,
+                                                    inference_timeout_ms=INFERENCE_TIMEOUT_MS,
+                                                    near_duplicates=_near_duplicate_index(),
+                                                    graph_mode=GRAPH_MODE, precision=INFERENCE_PRECISION,
+                                                    jit_compile=XLA, registry=_model_registry(),
+                                                    cache=_result_cache())
+    return _image_classifier
+
+
+def _model_registry():
+    return ModelRegistry(MODEL_REGISTRY_DIR) if MODEL_REGISTRY_DIR else None
+
+
+def _result_cache():
+    """This process's ResultCache, or None when disabled; SQLite connections must not cross fork"""
+    global _cache, _cache_pid
+    if not RESULT_CACHE:
+        return None
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = ResultCache(max_bytes=RESULT_CACHE_BYTES, disk_path=RESULT_CACHE_PATH or None)
+        _cache_pid = os.getpid()
+    return _cache
+
+
+def _near_duplicate_index():
+    if not NEAR_DUPLICATE_DISTANCE:
+        return None
+    return NearDuplicateIndex(int(NEAR_DUPLICATE_DISTANCE), NEAR_DUPLICATE_ENTRIES)
+
+
+def get_text_classifier() -> TextClassifier:
+    global _text_classifier
+    if _text_classifier is None:
+        with _init_lock:
+            if _text_classifier is None:
+                _text_classifier = TextClassifier(cache=_result_cache())
+    return _text_classifier
+
+
+def preload_classifiers():
+    """
+    Load models in the master process before gunicorn forks its workers,
+    so their memory is shared copy-on-write.
+
+    Only fork-safe models are preloaded: the text model, and an exported
+    TFLite/ONNX image model run single-threaded. TensorFlow is never
+    imported here; without an exported model each worker loads its own.
+    """
+    global _image_classifier
+    import gc
+
+    # Load the trained text model now rather than on the first request
+    get_text_classifier().text_model.available
+
+    registry = _model_registry()
+    version = registry.current() if registry is not None else None
+    if version is not None:
+        paths = registry.artifact_paths(version)
+    else:
+        paths = {name: path for name, (_, path) in BACKENDS.items()}
+    exported = [name for name in BACKENDS if name in paths and os.path.exists(paths[name])]
+    if exported:
+        # Threads do not survive fork: load synchronously, single-threaded, and
+        # leave the micro-batcher, inference and registry threads to init_worker
+        _image_classifier = ImageClassifier(background_load=False, backend=exported[0], num_threads=1,
+                                            near_duplicates=_near_duplicate_index(), registry=registry)
+    else:
+        print("ℹ️  No exported image model; each worker will load its own (see models/export_model.py)")
+
+    # Keep the garbage collector from touching (and so copying) preloaded objects in workers
+    gc.freeze()
+
+
+def init_worker():
+    """Start loading whatever was not preloaded (called after fork)"""
+    image_classifier = get_image_classifier()
+    if MICRO_BATCHING and not image_classifier.micro_batching:
+        image_classifier.enable_micro_batching(image_classifier.max_batch_size)
+    if INFERENCE_REPLICAS and image_classifier.inference_executor is None:
+        image_classifier.enable_inference_executor(INFERENCE_REPLICAS, INFERENCE_TIMEOUT_MS)
+    if image_classifier.registry is not None and MODEL_RELOAD_INTERVAL > 0:
+        image_classifier.watch_registry(MODEL_RELOAD_INTERVAL)
+    if SHADOW_VERSION:
+        start_shadow_evaluation(image_classifier)
+    # Classifiers preloaded in the master get this worker's own cache
+    image_classifier.cache = _result_cache()
+    get_text_classifier().cache = _result_cache()
+
+
+def start_shadow_evaluation(image_classifier: ImageClassifier):
+    """Load the candidate version (single-threaded, in the background) and route image requests through it"""
+    global _shadow
+    registry = image_classifier.registry or _model_registry()
+    if registry is None:
+        print("⚠️ AI_SHADOW_VERSION needs a model registry (AI_MODEL_REGISTRY)")
+        return
+    # num_threads=1 limits only the candidate's TFLite / ONNX interpreter; TensorFlow's
+    # process-wide thread pools stay as the primary configured them
+    candidate = ImageClassifier(num_threads=1, configure_tensorflow=False, registry=registry,
+                                version=SHADOW_VERSION, graph_mode=GRAPH_MODE,
+                                precision=INFERENCE_PRECISION, jit_compile=XLA)
+    _shadow = ShadowEvaluator(image_classifier, candidate, SHADOW_MODE, SHADOW_FRACTION, SHADOW_LOG)
+    print(f"🔍 Comparing model {SHADOW_VERSION} on live traffic ({SHADOW_MODE}, {SHADOW_FRACTION:.0%} of requests)")
+
+
+def _response_options():
+    """(profile, fields) from the query string, or raise ValueError"""
+    profile = request.args.get('profile', 'full')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}' (expected one of: {', '.join(PROFILES)})")
+    return profile, parse_fields(request.args.get('fields'))
+
+
+def _spool_body():
+    """
+    Copy the request body into a temporary file (in memory while small).
+    The body is read completely before results are streamed back: a client
+    that only reads the response after sending everything would otherwise
+    deadlock once both socket buffers fill up.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+    shutil.copyfileobj(request.stream, spool, 1024 * 1024)
+    spool.seek(0)
+    return spool
+
+
+def _bulk_batch_size(default: int) -> int:
+    return max(1, min(int(request.args.get('batch_size', default)), 4 * default))
+
+
+def _ndjson_response(lines, spool, on_close=None):
+    """
+    Stream NDJSON lines; a failure mid-stream becomes a final error line.
+    The spool is closed and `on_close` called when the server closes the
+    response, even if the client left before the body was iterated.
+    """
+    def generate():
+        try:
+            yield from lines
+        except Exception as e:
+            print(f"❌ Bulk classification failed: {e}")
+            yield json.dumps({'done': False, 'error': str(e)}, separators=(',', ':')).encode() + b'\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(spool.close)
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return response
+
+
+def _too_busy():
+    # Discard the upload unparsed; replying before the client finished
+    # sending would reset the connection instead of delivering the 429
+    while request.stream.read(64 * 1024):
+        pass
+
+    response = jsonify({'error': 'Too many image requests in progress, retry shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+app = Flask(__name__)
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+CORS(app)
+
+
+@app.before_request
+def _start_timer():
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    if metrics.enabled and 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+        metrics.increment('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def too_large(e):
+    limit = request.max_content_length or MAX_UPLOAD_BYTES
+    return jsonify({'error': f"Upload exceeds {limit // (1024 * 1024)}MB", 'code': 'upload_too_large'}), 413
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text format; per worker process (set AI_METRICS=1 to collect)"""
+    if not metrics.enabled:
+        return Response("# Metrics are disabled; set AI_METRICS=1\n", mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    image_status = _image_classifier.status() if _image_classifier is not None else {'state': 'not started'}
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'image_classifier': image_status,
+        'shadow': _shadow.stats() if _shadow is not None else None,
+        'image_requests_in_flight': _inflight_count,
+        'max_inflight_images': MAX_INFLIGHT_IMAGES,
+    })
+
+
+@app.route('/classify/image', methods=['POST'])
+def classify_image():
+    global _inflight_count
+
+    try:
+        profile, fields = _response_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Reject before parsing the upload, so an overloaded worker does no work for it
+    if not _inflight.acquire(timeout=QUEUE_TIMEOUT):
+        return _too_busy()
+
+    try:
+        with _count_lock:
+            _inflight_count += 1
+        image_file = request.files.get('image')
+        if image_file is None:
+            return jsonify({'error': "No image provided (multipart field 'image')"}), 400
+
+        result = (_shadow or get_image_classifier()).classify(image_file, profile=profile, fields=fields)
+        return jsonify(result)
+
+    except ImageRejected as e:
+        return jsonify({'error': str(e), 'code': e.code}), REJECTION_STATUS.get(e.code, 400)
+
+    except HTTPException:
+        # e.g. RequestEntityTooLarge while parsing the upload: keep its status (see too_large)
+        raise
+
+    except Exception as e:
+        print(f"❌ {e}")
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        with _count_lock:
+            _inflight_count -= 1
+        _inflight.release()
+
+
+@app.route('/classify/text', methods=['POST'])
+def classify_text():
+    try:
+        profile, fields = _response_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': "No text provided (JSON field 'text')"}), 400
+
+    try:
+        body = get_text_classifier().classify_json(text, profile=profile, fields=fields)
+        return Response(body, mimetype='application/json')
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        print(f"❌ {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/classify/bulk/text', methods=['POST'])
+def classify_bulk_text():
+    """NDJSON in ({"id": ..., "text": ...} per line), NDJSON out, one batch at a time"""
+    request.max_content_length = MAX_BULK_BYTES
+    try:
+        profile, fields = _response_options()
+        batch_size = _bulk_batch_size(TEXT_BATCH_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    spool = _spool_body()
+    lines = classify_texts_ndjson(get_text_classifier(), iter_ndjson_texts(spool), batch_size, profile, fields)
+    return _ndjson_response(lines, spool)
+
+
+@app.route('/classify/bulk/images', methods=['POST'])
+def classify_bulk_images():
+    """A zip or (compressed) tar of images in, NDJSON out, one batch at a time"""
+    request.max_content_length = MAX_BULK_BYTES
+    try:
+        profile, fields = _response_options()
+        batch_size = _bulk_batch_size(IMAGE_BATCH_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    kind = request.args.get('format') or ('zip' if 'zip' in (request.content_type or '') else 'tar')
+    if kind not in ('zip', 'tar'):
+        return jsonify({'error': f"Unknown archive format '{kind}' (expected zip or tar)"}), 400
+
+    # A bulk job holds one image slot for its whole duration
+    if not _inflight.acquire(timeout=QUEUE_TIMEOUT):
+        return _too_busy()
+
+    try:
+        spool = _spool_body()
+    except Exception:
+        _inflight.release()
+        raise
+
+    lines = classify_images_ndjson(get_image_classifier(), iter_archive_images(spool, kind, MAX_UPLOAD_BYTES),
+                                   batch_size, profile, fields)
+    return _ndjson_response(lines, spool, on_close=_inflight.release)
+
+
+@app.route('/guidance/<category>', methods=['GET'])
+def guidance(category):
+    if not has_guidance(category):
+        return jsonify({'error': f"Unknown category '{category}'"}), 404
+
+    body, etag = get_guidance(category)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag.strip('"'))
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+
+if __name__ == '__main__':
+    # Development server; use `gunicorn -c gunicorn.conf.py app:app` in production
+    init_worker()
+    app.run(host='0.0.0.0', port=PORT, threaded=True)
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for the AI service
+Run with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('AI_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# Processes run inference in parallel; threads overlap request I/O within a process.
+# Keep AI_WORKERS x AI_MODEL_THREADS at or below the number of cores.
+workers = int(os.getenv('AI_WORKERS', str(max(1, multiprocessing.cpu_count() // 2))))
+threads = int(os.getenv('AI_THREADS', '4'))
+worker_class = 'gthread'
+
+# First image requests may wait for a worker's model to finish loading
+timeout = int(os.getenv('AI_WORKER_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('AI_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# Load exported models once in the master and share them copy-on-write
+# (see app.preload_classifiers); otherwise every worker loads its own.
+preload_app = os.getenv('AI_PRELOAD', '1') == '1'
+
+accesslog = os.getenv('AI_ACCESS_LOG', '-') or None
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+        app.preload_classifiers()
+
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
@@ -0,0 +1,94 @@
+"""
+Helpers for the asyncio classification API.
+Incremental upload reading and cancellation of work running on executor threads.
+"""
+
+import asyncio
+import inspect
+from concurrent.futures import CancelledError, Executor, Future
+from typing import Callable, List
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class Cancellation:
+    """
+    Cancellation token shared between a coroutine and the thread doing
+    its work. Threads call `check()` between stages; futures registered
+    with `track()` (queued model calls) are cancelled with the token.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._futures: List[Future] = []
+
+    def check(self):
+        """Raise concurrent.futures.CancelledError once the caller has given up"""
+        if self.cancelled:
+            raise CancelledError("Request was cancelled")
+
+    def track(self, future: Future) -> Future:
+        self._futures.append(future)
+        if self.cancelled:
+            future.cancel()
+        return future
+
+    def cancel(self):
+        self.cancelled = True
+        for future in self._futures:
+            future.cancel()
+
+
+async def read_upload(upload, max_bytes: int = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> bytes:
+    """
+    Read an upload chunk by chunk without blocking the event loop.
+
+    Accepts bytes, async iterables of chunks (e.g. aiohttp's
+    `content.iter_chunked`), objects with an async `read(size)`
+    (asyncio.StreamReader, Starlette's UploadFile) and plain file objects,
+    which are read on the loop's default executor. Raises ValueError as
+    soon as more than `max_bytes` arrive.
+    """
+    if isinstance(upload, (bytes, bytearray)):
+        if max_bytes is not None and len(upload) > max_bytes:
+            raise ValueError(f"Upload exceeds {max_bytes} bytes")
+        return bytes(upload)
+
+    chunks, size = [], 0
+
+    def add(chunk):
+        nonlocal size
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise ValueError(f"Upload exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+
+    if hasattr(upload, '__aiter__'):
+        async for chunk in upload:
+            add(chunk)
+        return b''.join(chunks)
+
+    read = upload.read
+    asynchronous = inspect.iscoroutinefunction(read)
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await read(chunk_size) if asynchronous else await loop.run_in_executor(None, read, chunk_size)
+        if not chunk:
+            return b''.join(chunks)
+        add(chunk)
+
+
+async def run_cancellable(fn: Callable, *args, executor: Executor = None):
+    """
+    Run `fn(cancellation, *args)` on `executor` (default: the loop's).
+    If the awaiting task is cancelled, e.g. by asyncio.wait_for or a client
+    disconnect, work that has not started is skipped and running work is
+    told to stop through the token.
+    """
+    cancellation = Cancellation()
+    future = asyncio.get_running_loop().run_in_executor(executor, fn, cancellation, *args)
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancellation.cancel()
+        raise
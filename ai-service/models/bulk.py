@@ -0,0 +1,146 @@
+"""
+Bulk classification over NDJSON text and image archives.
+Inputs are read lazily and results are yielded as NDJSON lines, one batch at a time.
+"""
+
+import json
+import os
+import tarfile
+import zipfile
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from models.dataset_shards import IMAGE_EXTENSIONS
+from models.preprocessing import ImageRejected
+
+TEXT_BATCH_SIZE = 256
+IMAGE_BATCH_SIZE = 32
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _line(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def iter_ndjson_texts(stream: IO[bytes]) -> Iterator[Tuple[object, str, str]]:
+    """
+    Yield (id, text, error) per non-empty line of an NDJSON stream.
+    A line is either {"id": ..., "text": ...} or a bare JSON string; the id
+    defaults to the line number. Invalid lines carry an error instead of text.
+    """
+    for number, raw in enumerate(stream, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            yield number, None, 'Invalid JSON'
+            continue
+
+        if isinstance(value, str):
+            item_id, text = number, value
+        elif isinstance(value, dict):
+            item_id, text = value.get('id', number), value.get('text')
+        else:
+            item_id, text = number, None
+
+        if not isinstance(text, str) or not text.strip():
+            yield item_id, None, "Missing 'text'"
+        else:
+            yield item_id, text, None
+
+
+def _read_limited(member_file: IO[bytes], limit: int) -> bytes:
+    """Read at most limit + 1 bytes, so an overlong member is detected without inflating it"""
+    return member_file.read(limit + 1 if limit else -1)
+
+
+def iter_archive_images(archive: IO[bytes], kind: str,
+                        max_image_bytes: int = None) -> Iterator[Tuple[str, bytes, ImageRejected]]:
+    """
+    Yield (member name, image bytes, error) for every image in a zip or tar
+    archive (tar may be gzip/bz2/xz compressed). Only one image is held at
+    a time. Members larger than `max_image_bytes` (uncompressed) are never
+    inflated: they carry an ImageRejected instead of bytes.
+    """
+    def too_large(name):
+        return name, None, ImageRejected(
+            'image_too_large', f"Archive member is larger than {max_image_bytes // (1024 * 1024)}MB")
+
+    if kind == 'zip':
+        # Zip's index is at the end of the file, so `archive` must be seekable
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if max_image_bytes and info.file_size > max_image_bytes:
+                    yield too_large(info.filename)
+                    continue
+                # The declared size may lie; the bounded read does not trust it
+                with zf.open(info) as member_file:
+                    image_bytes = _read_limited(member_file, max_image_bytes)
+                if max_image_bytes and len(image_bytes) > max_image_bytes:
+                    yield too_large(info.filename)
+                else:
+                    yield info.filename, image_bytes, None
+    else:
+        with tarfile.open(fileobj=archive, mode='r|*') as tf:
+            for member in tf:
+                if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if max_image_bytes and member.size > max_image_bytes:
+                    yield too_large(member.name)
+                    continue
+                yield member.name, _read_limited(tf.extractfile(member), max_image_bytes), None
+
+
+def classify_texts_ndjson(classifier, items: Iterable[Tuple[object, str, str]], batch_size: int = TEXT_BATCH_SIZE,
+                          profile: str = 'full', fields=None) -> Iterator[bytes]:
+    """Classify (id, text, error) items batch by batch, yielding one NDJSON line per item and a summary"""
+    count, errors = 0, 0
+    for batch in batched(items, batch_size):
+        valid = [(item_id, text) for item_id, text, error in batch if error is None]
+        # An all-invalid batch never reaches the model (sklearn refuses 0 samples)
+        results = iter(classifier.classify_batch([text for _, text in valid], profile=profile, fields=fields)
+                       if valid else [])
+
+        lines = []
+        for item_id, text, error in batch:
+            if error is not None:
+                errors += 1
+                lines.append(_line({'id': item_id, 'error': error}))
+            else:
+                lines.append(_line({'id': item_id, **next(results)}))
+        count += len(batch)
+        yield b''.join(lines)
+
+    yield _line({'done': True, 'count': count, 'errors': errors})
+
+
+def classify_images_ndjson(classifier, images: Iterable[Tuple[str, bytes, ImageRejected]],
+                           batch_size: int = IMAGE_BATCH_SIZE, profile: str = 'full', fields=None) -> Iterator[bytes]:
+    """Classify (name, image bytes, error) items batch by batch, yielding one NDJSON line per image and a summary"""
+    count, errors = 0, 0
+    for batch in batched(images, batch_size):
+        valid = [(image_bytes, os.path.basename(name)) for name, image_bytes, error in batch if error is None]
+        # Rejected images come back as {'error': ..., 'code': ...}
+        results = iter(classifier.classify_images(valid, profile=profile, fields=fields) if valid else [])
+
+        lines = []
+        for name, _, error in batch:
+            result = {'error': str(error), 'code': error.code} if error is not None else next(results)
+            errors += 'error' in result
+            lines.append(_line({'id': name, **result}))
+        count += len(batch)
+        yield b''.join(lines)
+
+    yield _line({'done': True, 'count': count, 'errors': errors})
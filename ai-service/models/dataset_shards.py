@@ -0,0 +1,138 @@
+"""
+Pre-decoded dataset shards.
+Images are resized once and stored as memory-mappable uint8 .npy shards with a manifest.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import numpy as np
+
+from models.preprocessing import load_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SPLITS = ('train', 'validation', 'test')
+MANIFEST_NAME = 'manifest.json'
+
+
+def list_split(split_dir: str, class_indices: Dict[str, int] = None):
+    """
+    List (paths, labels, class_indices) for split_dir/<class>/<image>.
+    Classes are indexed in sorted order, the same as flow_from_directory,
+    unless `class_indices` (the training split's) is given: validation and
+    test may lack classes, so they must be labelled with the train map.
+    """
+    if not os.path.isdir(split_dir):
+        raise FileNotFoundError(f"Dataset directory not found: {split_dir}")
+
+    class_names = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+    if class_indices is None:
+        class_indices = {name: i for i, name in enumerate(class_names)}
+    unknown = [name for name in class_names if name not in class_indices]
+    if unknown:
+        raise ValueError(f"Class folders in {split_dir} are not in the training classes: {', '.join(unknown)}")
+
+    paths, labels = [], []
+    for name in class_names:
+        class_dir = os.path.join(split_dir, name)
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(class_indices[name])
+
+    return paths, np.array(labels, dtype=np.int32), class_indices
+
+
+def _write_shard(output_dir: str, name: str, paths, labels, size):
+    """Decode, resize and save one shard (runs in a worker process)"""
+    width, height = size
+    images = np.empty((len(paths), height, width, 3), dtype=np.uint8)
+    keep = []
+    for i, path in enumerate(paths):
+        try:
+            with open(path, 'rb') as f:
+                images[len(keep)] = np.asarray(load_image(f.read(), size))
+            keep.append(i)
+        except Exception as e:
+            print(f"⚠️  Skipping unreadable image {path}: {e}")
+
+    images_file = f"{name}-images.npy"
+    labels_file = f"{name}-labels.npy"
+    np.save(os.path.join(output_dir, images_file), images[:len(keep)])
+    np.save(os.path.join(output_dir, labels_file), np.asarray(labels, dtype=np.int32)[keep])
+
+    return {
+        'images': images_file,
+        'labels': labels_file,
+        'count': len(keep),
+        'sources': [paths[i] for i in keep],
+    }
+
+
+def build_shards(dataset_dir: str = 'datasets', output_dir: str = 'datasets/shards', size=(224, 224),
+                 shard_size: int = 1024, workers: int = None):
+    """
+    Convert datasets/<split>/<class>/ images into shards under output_dir.
+    Shards are built in parallel across a process pool.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    size = tuple(size)
+    manifest = {
+        'image_size': list(size),
+        'dtype': 'uint8',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'class_indices': None,
+        'splits': {},
+    }
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for split in SPLITS:
+            split_dir = os.path.join(dataset_dir, split)
+            if not os.path.isdir(split_dir):
+                continue
+
+            # Train comes first; the other splits are labelled with its class map
+            paths, labels, class_indices = list_split(split_dir, manifest['class_indices'])
+            manifest['class_indices'] = class_indices
+
+            start = time.perf_counter()
+            futures = [
+                pool.submit(_write_shard, output_dir, f"{split}-{n:05d}",
+                            paths[i:i + shard_size], labels[i:i + shard_size], size)
+                for n, i in enumerate(range(0, len(paths), shard_size))
+            ]
+            shards = [future.result() for future in futures]
+            count = sum(shard['count'] for shard in shards)
+
+            manifest['splits'][split] = {'count': count, 'shards': shards}
+            print(f"✅ {split}: {count} images in {len(shards)} shard(s) "
+                  f"({time.perf_counter() - start:.1f}s)")
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(shard_dir: str):
+    with open(os.path.join(shard_dir, MANIFEST_NAME), 'r') as f:
+        return json.load(f)
+
+
+def open_shard(shard_dir: str, shard):
+    """Memory-map one shard: (images uint8 NxHxWx3, labels int32 N)"""
+    images = np.load(os.path.join(shard_dir, shard['images']), mmap_mode='r')
+    labels = np.load(os.path.join(shard_dir, shard['labels']))
+    return images, labels
+
+
+def split_labels(shard_dir: str, split: str) -> np.ndarray:
+    """All labels of a split, in shard order"""
+    manifest = load_manifest(shard_dir)
+    shards = manifest['splits'][split]['shards']
+    if not shards:
+        return np.empty((0,), dtype=np.int32)
+    return np.concatenate([open_shard(shard_dir, shard)[1] for shard in shards])
@@ -0,0 +1,259 @@
+"""
+Knowledge Distillation Script
+Trains compact MobileNetV2 students (reduced width and input resolution) on the
+trained waste classifier's soft predictions and reports accuracy vs latency and size
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+from tensorflow.keras.applications import MobileNetV2
+
+from models.data_pipeline import build_dataset, build_dataset_from_shards, ThroughputLogger
+from models.inference_backends import GraphKerasBackend
+from models.model_registry import CLASS_INDICES_PATH, ModelRegistry
+
+TEACHER_PATH = 'models/waste_classifier_v1.h5'
+STUDENTS_DIR = 'models/students'
+REPORT_PATH = 'models/distill_report.json'
+
+# Students still take the service's 224x224 input and resize it inside the model,
+# so ImageClassifier, the registry and the exporters load them like the teacher
+IMG_SIZE = (224, 224)
+BATCH_SIZE = 32
+NUM_CLASSES = 6
+LEARNING_RATE = 0.001
+
+# Width multiplier x input resolution; all have ImageNet weights
+DEFAULT_CONFIGS = '0.35x128,0.5x128,0.5x160,0.75x160'
+
+
+def parse_configs(text: str):
+    """'0.35x128,0.5x160' -> [(0.35, 128), (0.5, 160)]"""
+    configs = []
+    for item in text.split(','):
+        alpha, resolution = item.strip().split('x')
+        configs.append((float(alpha), int(resolution)))
+    return configs
+
+
+def create_student(alpha: float, resolution: int, weights: str = 'imagenet'):
+    """
+    MobileNetV2 at width `alpha` and `resolution` px behind a resize from
+    IMG_SIZE. Returns (logits_model, model): training uses the logits, the
+    saved model ends in the same softmax 'predictions' layer as the teacher.
+    """
+    backbone = MobileNetV2(
+        input_shape=(resolution, resolution, 3),
+        alpha=alpha,
+        include_top=False,
+        weights=weights
+    )
+
+    inputs = keras.Input(IMG_SIZE + (3,))
+    x = layers.Resizing(resolution, resolution, name='student_resize')(inputs)
+    # The pipeline yields [0, 1]; MobileNetV2 expects [-1, 1]
+    x = layers.Rescaling(2.0, offset=-1.0)(x)
+    x = backbone(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    logits = layers.Dense(NUM_CLASSES, name='logits')(x)
+    predictions = layers.Activation('softmax', name='predictions')(logits)
+
+    name = f"WasteStudent_{alpha:g}x{resolution}"
+    return keras.Model(inputs, logits, name=f"{name}_logits"), keras.Model(inputs, predictions, name=name)
+
+
+def with_teacher_targets(dataset, teacher, temperature: float):
+    """
+    Append the teacher's softened probabilities to each batch's one-hot
+    labels: targets become [hard | soft], NUM_CLASSES columns each. The
+    teacher only outputs probabilities; log-probabilities equal its logits
+    up to a constant, which the softmax ignores.
+    """
+    def add_targets(images, labels):
+        probabilities = teacher(images, training=False)
+        soft = tf.nn.softmax(tf.math.log(probabilities + 1e-8) / temperature)
+        return images, tf.concat([labels, soft], axis=1)
+
+    return dataset.map(add_targets)
+
+
+def distillation_loss(temperature: float, hard_weight: float):
+    """Cross-entropy on the labels plus temperature-scaled KL divergence to the teacher"""
+    kl_divergence = keras.losses.KLDivergence()
+
+    def loss(targets, logits):
+        hard, soft = targets[:, :NUM_CLASSES], targets[:, NUM_CLASSES:]
+        hard_loss = keras.losses.categorical_crossentropy(hard, logits, from_logits=True)
+        soft_loss = kl_divergence(soft, tf.nn.softmax(logits / temperature))
+        # T^2 keeps the soft gradients on the same scale as the hard ones
+        return hard_weight * tf.reduce_mean(hard_loss) + (1 - hard_weight) * temperature ** 2 * soft_loss
+
+    return loss
+
+
+def hard_accuracy(targets, logits):
+    return keras.metrics.categorical_accuracy(targets[:, :NUM_CLASSES], logits)
+
+
+def measure_latency(model, repeats: int = 30):
+    """Median ms per image at batch 1 and 16, run as a compiled graph like graph_mode serving"""
+    graph = GraphKerasBackend(model, buckets=(1, 16))
+    graph.warmup()
+    latency = {}
+    for batch_size in (1, 16):
+        batch = np.zeros((batch_size,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            graph.predict(batch)
+            samples.append((time.perf_counter() - start) * 1000 / batch_size)
+        latency[f"b{batch_size}_ms_per_image"] = statistics.median(samples)
+    return latency
+
+
+def evaluate(model, test_dataset, test_labels, path: str):
+    """Test accuracy, latency, parameter count and file size of a saved model"""
+    predictions = model.predict(test_dataset, verbose=0)
+    return {
+        'test_accuracy': float(np.mean(np.argmax(predictions, axis=1) == test_labels)),
+        'params': int(model.count_params()),
+        'size_mb': os.path.getsize(path) / (1024 * 1024),
+        **measure_latency(model),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill the waste classifier into compact student models')
+    parser.add_argument('--teacher', default=TEACHER_PATH, help='Trained Keras model to distill')
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS,
+                        help='Students as width x resolution, comma separated (e.g. 0.35x128,0.5x160)')
+    parser.add_argument('--epochs', type=int, default=15, help='Training epochs per student')
+    parser.add_argument('--temperature', type=float, default=4.0, help='Softmax temperature of the soft targets')
+    parser.add_argument('--hard-weight', type=float, default=0.3,
+                        help='Weight of the label loss (the teacher loss gets the rest)')
+    parser.add_argument('--weights', choices=['imagenet', 'none'], default='imagenet',
+                        help='Backbone initialization (none: offline machines)')
+    parser.add_argument('--shards', metavar='DIR',
+                        help='Read pre-decoded shards instead of datasets/<split>/ images')
+    parser.add_argument('--register', metavar='CONFIG',
+                        help='Register this student (e.g. 0.5x160) in the model registry as a new version')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🎓 Waste Classifier Distillation")
+    print("=" * 60)
+
+    if args.shards:
+        # Shards are labelled with the train split's class map when built
+        load_split = lambda split, training=False, class_indices=None: build_dataset_from_shards(
+            args.shards, split, IMG_SIZE, BATCH_SIZE, NUM_CLASSES, training=training
+        )
+    else:
+        load_split = lambda split, training=False, class_indices=None: build_dataset(
+            f'datasets/{split}', IMG_SIZE, BATCH_SIZE, NUM_CLASSES, training=training, class_indices=class_indices
+        )
+    train_dataset, train_labels, class_indices = load_split('train', training=True)
+    # Validation and test may lack some classes: label them with the train indices
+    val_dataset, val_labels, _ = load_split('validation', class_indices=class_indices)
+    test_dataset, test_labels, _ = load_split('test', class_indices=class_indices)
+    print(f"✅ Training samples: {len(train_labels)}, validation: {len(val_labels)}, test: {len(test_labels)}")
+
+    # The teacher's outputs follow its class_indices.json; the labels must use the same order
+    if os.path.exists(CLASS_INDICES_PATH):
+        with open(CLASS_INDICES_PATH, 'r') as f:
+            teacher_classes = json.load(f)
+        if teacher_classes != class_indices:
+            print(f"❌ Training classes {class_indices} differ from the teacher's {CLASS_INDICES_PATH}")
+            sys.exit(1)
+
+    teacher = keras.models.load_model(args.teacher)
+    teacher.trainable = False
+    print(f"✅ Teacher loaded: {args.teacher}")
+
+    print("\n📊 Evaluating teacher...")
+    report = {
+        'temperature': args.temperature,
+        'hard_weight': args.hard_weight,
+        'epochs': args.epochs,
+        'models': {'teacher': evaluate(teacher, test_dataset, test_labels, args.teacher)},
+    }
+
+    distill_train = with_teacher_targets(train_dataset, teacher, args.temperature)
+    distill_val = with_teacher_targets(val_dataset, teacher, args.temperature)
+    os.makedirs(STUDENTS_DIR, exist_ok=True)
+
+    for alpha, resolution in parse_configs(args.configs):
+        name = f"{alpha:g}x{resolution}"
+        print(f"\n🎯 Student {name} (MobileNetV2 width {alpha:g}, {resolution}x{resolution} input)")
+        logits_model, student = create_student(alpha, resolution, None if args.weights == 'none' else 'imagenet')
+        logits_model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+            loss=distillation_loss(args.temperature, args.hard_weight),
+            metrics=[hard_accuracy]
+        )
+        logits_model.fit(
+            distill_train,
+            validation_data=distill_val,
+            epochs=args.epochs,
+            callbacks=[
+                ThroughputLogger(len(train_labels)),
+                keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True,
+                                              monitor='val_hard_accuracy', mode='max', verbose=1),
+                keras.callbacks.ReduceLROnPlateau(factor=0.5, patience=3, min_lr=1e-6,
+                                                  monitor='val_loss', verbose=1),
+            ],
+            verbose=1
+        )
+
+        path = os.path.join(STUDENTS_DIR, f"waste_student_{name}.h5")
+        student.save(path)
+        report['models'][name] = evaluate(student, test_dataset, test_labels, path)
+        report['models'][name]['path'] = path
+        # Same fields as train_model.py's metrics.json, so the registry manifest is filled in
+        with open(os.path.join(STUDENTS_DIR, f"waste_student_{name}_metrics.json"), 'w') as f:
+            json.dump({
+                'test_accuracy': report['models'][name]['test_accuracy'],
+                'model_architecture': f"MobileNetV2-{alpha:g}@{resolution}",
+                'image_size': IMG_SIZE,
+                'student_resolution': resolution,
+                'distilled_from': args.teacher,
+                'num_classes': NUM_CLASSES,
+            }, f, indent=2)
+
+    teacher_stats = report['models']['teacher']
+    print(f"\n{'Model':<10} {'Accuracy':>9} {'Δ acc':>7} {'Params':>9} {'Size MB':>8} "
+          f"{'b1 ms':>7} {'b16 ms/img':>11} {'Speedup':>8}")
+    for name, r in report['models'].items():
+        print(f"{name:<10} {r['test_accuracy']:>8.2%} {r['test_accuracy'] - teacher_stats['test_accuracy']:>+7.1%} "
+              f"{r['params'] / 1e6:>8.2f}M {r['size_mb']:>8.1f} {r['b1_ms_per_image']:>7.2f} "
+              f"{r['b16_ms_per_image']:>11.2f} {teacher_stats['b1_ms_per_image'] / r['b1_ms_per_image']:>7.1f}x")
+
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report saved: {REPORT_PATH}")
+
+    if args.register:
+        if args.register not in report['models'] or args.register == 'teacher':
+            print(f"❌ No student {args.register} in this run")
+            sys.exit(1)
+        path = report['models'][args.register]['path']
+        version = ModelRegistry().register(path, metrics_path=path.replace('.h5', '_metrics.json'), exports={})
+        print(f"✅ Registered student {args.register} as model {version} "
+              f"(python models/model_registry.py promote {version})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
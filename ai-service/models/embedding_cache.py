@@ -0,0 +1,108 @@
+"""
+On-disk cache of frozen-backbone embeddings.
+Lets the classifier head be retrained in seconds without re-running MobileNetV2.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Callable, List
+
+import numpy as np
+
+from models.preprocessing import INPUT_SIZE, load_image, normalize_in_place
+
+DEFAULT_CACHE_DIR = 'models/embedding_cache'
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_files(paths: List[str]) -> np.ndarray:
+    """Decode image files into a [0, 1] float32 batch, as in training"""
+    batch = np.empty((len(paths),) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            batch[i] = np.asarray(load_image(f.read()))
+    return normalize_in_place(batch, 'custom')
+
+
+class EmbeddingCache:
+    """
+    Append-only store of fixed-size float32 embeddings keyed by content hash.
+
+    Rows live in `<cache_dir>/<backbone_id>/embeddings.f32` (read through a
+    memory map) and keys in `keys.txt`, one per row. `backbone_id` must
+    change whenever the backbone weights or input preprocessing change.
+    """
+
+    def __init__(self, backbone_id: str, dim: int, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.dim = dim
+        self.directory = os.path.join(cache_dir, backbone_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self._data_path = os.path.join(self.directory, 'embeddings.f32')
+        self._keys_path = os.path.join(self.directory, 'keys.txt')
+        self._lock = threading.Lock()
+
+        self._index = {}
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, 'r') as f:
+                for row, key in enumerate(f.read().split()):
+                    self._index[key] = row
+
+        # Drop a partially written tail (e.g. interrupted run)
+        rows = os.path.getsize(self._data_path) // (4 * dim) if os.path.exists(self._data_path) else 0
+        if rows != len(self._index):
+            self._index = {k: r for k, r in self._index.items() if r < rows}
+            self._rewrite_keys(rows)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _rewrite_keys(self, rows: int):
+        keys = sorted(self._index, key=self._index.get)[:rows]
+        with open(self._keys_path, 'w') as f:
+            f.write(''.join(k + '\n' for k in keys))
+        if os.path.exists(self._data_path):
+            with open(self._data_path, 'r+b') as f:
+                f.truncate(len(keys) * 4 * self.dim)
+
+    def _matrix(self) -> np.ndarray:
+        if not self._index:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self._data_path, dtype=np.float32, mode='r', shape=(len(self._index), self.dim))
+
+    def get_or_compute(self, keys: List[str], load_batch: Callable[[List[int]], np.ndarray],
+                       backbone, batch_size: int = 64) -> np.ndarray:
+        """
+        Return embeddings for `keys` (N x dim), running `backbone` only on
+        keys not cached yet. `load_batch(indices)` must return the
+        preprocessed images for those positions in `keys`.
+        """
+        with self._lock:
+            missing, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self._index and key not in seen:
+                    seen.add(key)
+                    missing.append(i)
+
+            if missing:
+                print(f"🧠 Computing {len(missing)} new embeddings ({len(keys) - len(missing)} cached)")
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                embeddings = np.asarray(backbone.predict(load_batch(chunk), verbose=0), dtype=np.float32)
+                with open(self._data_path, 'ab') as f:
+                    f.write(embeddings.reshape(len(chunk), self.dim).tobytes())
+                with open(self._keys_path, 'a') as f:
+                    for i in chunk:
+                        self._index[keys[i]] = len(self._index)
+                        f.write(keys[i] + '\n')
+
+            matrix = self._matrix()
+            return np.asarray(matrix[[self._index[key] for key in keys]])
@@ -0,0 +1,269 @@
+"""
+Model Export Script
+Converts the trained Keras model to TFLite and/or ONNX, then checks
+accuracy drift against Keras and measures latency and memory per backend
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from queue import Empty
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from models.preprocessing import INPUT_SIZE, load_image, normalize_in_place
+from models.dataset_shards import list_split, load_manifest, open_shard
+from models.inference_backends import (KerasBackend, OnnxBackend, TFLiteBackend,
+                                       ONNX_MODEL_PATH, TFLITE_MODEL_PATH)
+
+KERAS_MODEL_PATH = 'models/waste_classifier_v1.h5'
+VALIDATION_DIR = 'datasets/validation'
+REPORT_PATH = 'models/export_report.json'
+
+
+def list_images(split_dir: str):
+    """Image paths under split_dir/<category>/, in a stable order"""
+    if not os.path.isdir(split_dir):
+        return []
+    return list_split(split_dir)[0]
+
+
+def load_shard_batch(shard_dir: str, split: str, limit: int):
+    """Read up to `limit` pre-decoded images from shards and normalize them"""
+    manifest = load_manifest(shard_dir)
+    if tuple(manifest['image_size']) != INPUT_SIZE:
+        raise ValueError(f"Shards are {manifest['image_size']}, model expects {list(INPUT_SIZE)}")
+    parts, remaining = [], limit
+    for shard in manifest['splits'].get(split, {}).get('shards', []):
+        if remaining <= 0:
+            break
+        images = open_shard(shard_dir, shard)[0][:remaining]
+        parts.append(images.astype(np.float32))
+        remaining -= len(images)
+    if not parts:
+        return np.empty((0,) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    return normalize_in_place(np.concatenate(parts), 'custom')
+
+
+def load_batch(paths):
+    """Decode and normalize images exactly as ImageClassifier does for the custom model"""
+    batch = np.empty((len(paths),) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            batch[i] = np.asarray(load_image(f.read()))
+    return normalize_in_place(batch, 'custom')
+
+
+def export_tflite(keras_model, output_path: str, quantize: str, calibration_paths):
+    """Convert to TFLite: 'none' (float32), 'float16' or 'int8' (calibrated)"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if not calibration_paths:
+            raise ValueError(f"int8 quantization needs calibration images in {VALIDATION_DIR}")
+
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [load_batch([path])]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(keras_model, output_path: str):
+    """Convert to ONNX with tf2onnx"""
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = (tf.TensorSpec((None,) + INPUT_SIZE[::-1] + (3,), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=13, output_path=output_path)
+
+
+def _peak_rss_mb() -> float:
+    """
+    Peak RSS of this process. Prefers VmHWM, which exec resets: ru_maxrss
+    keeps the peak of the parent that forked the spawned process.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(backend_name: str, model_path: str, batch: np.ndarray, repeats: int, queue):
+    """Runs in a fresh process so RSS reflects one backend only"""
+    backend_class = {'keras': KerasBackend, 'tflite': TFLiteBackend, 'onnx': OnnxBackend}[backend_name]
+
+    start = time.perf_counter()
+    backend = backend_class(model_path)
+    load_seconds = time.perf_counter() - start
+
+    predictions = backend.predict(batch)
+
+    # Single-image latency, after a warm-up call
+    backend.predict(batch[:1])
+    latencies = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        backend.predict(batch[i % len(batch):i % len(batch) + 1])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    backend.predict(batch)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    queue.put({
+        'predictions': predictions,
+        'load_seconds': load_seconds,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'batch_ms_per_image': batch_ms / len(batch),
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+
+
+def measure_backend(backend_name: str, model_path: str, batch: np.ndarray, repeats: int = 50,
+                    timeout: float = 1800):
+    """
+    Run _measure in a fresh process. Raises RuntimeError if that process
+    dies (missing runtime, OOM, crashing delegate) or takes over `timeout` seconds.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(backend_name, model_path, batch, repeats, queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = queue.get(timeout=1.0)
+            break
+        except Empty:
+            pass
+        if not process.is_alive():
+            # It may have put its result just before exiting
+            try:
+                result = queue.get(timeout=1.0)
+                break
+            except Empty:
+                raise RuntimeError(f"Measuring the {backend_name} backend ({model_path}) failed: "
+                                   f"its process exited with code {process.exitcode}")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError(f"Measuring the {backend_name} backend ({model_path}) took over {timeout:.0f}s")
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the waste classifier to TFLite / ONNX')
+    parser.add_argument('--model', default=KERAS_MODEL_PATH, help='Keras model to export')
+    parser.add_argument('--tflite', choices=['none', 'float16', 'int8'], default='float16',
+                        help='TFLite quantization (none = float32)')
+    parser.add_argument('--skip-tflite', action='store_true', help='Do not export TFLite')
+    parser.add_argument('--onnx', action='store_true', help='Also export ONNX (requires tf2onnx)')
+    parser.add_argument('--calibration-images', type=int, default=200,
+                        help='Validation images used for int8 calibration')
+    parser.add_argument('--eval-images', type=int, default=500,
+                        help='Validation images used for the drift check')
+    parser.add_argument('--shards', metavar='DIR',
+                        help='Read validation images from pre-decoded shards instead of image files')
+    parser.add_argument('--max-top1-disagreement', type=float, default=0.01,
+                        help='Fail if a backend disagrees with Keras on more than this fraction')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📦 Waste Classifier Export")
+    print("=" * 60)
+
+    from tensorflow import keras
+    keras_model = keras.models.load_model(args.model)
+
+    validation_paths = list_images(VALIDATION_DIR)
+    print(f"✅ Validation images available: {len(validation_paths)}")
+
+    exports = {'keras': args.model}
+    if not args.skip_tflite:
+        print(f"\n⚙️  Exporting TFLite ({args.tflite})...")
+        export_tflite(keras_model, TFLITE_MODEL_PATH, args.tflite, validation_paths[:args.calibration_images])
+        exports['tflite'] = TFLITE_MODEL_PATH
+    if args.onnx:
+        print("\n⚙️  Exporting ONNX...")
+        export_onnx(keras_model, ONNX_MODEL_PATH)
+        exports['onnx'] = ONNX_MODEL_PATH
+
+    # Drift and performance check on validation images
+    if args.shards:
+        batch = load_shard_batch(args.shards, 'validation', args.eval_images)
+    else:
+        batch = load_batch(validation_paths[:args.eval_images])
+    if not len(batch):
+        print("\n⚠️  No validation images; skipping drift check")
+        return
+
+    print(f"\n📊 Measuring backends on {len(batch)} validation images...")
+    results = {}
+    for name, path in exports.items():
+        try:
+            results[name] = measure_backend(name, path, batch)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    reference = results['keras']['predictions']
+    report = {'tflite_quantization': args.tflite, 'eval_images': len(batch), 'backends': {}}
+    failed = []
+    for name, result in results.items():
+        predictions = result.pop('predictions')
+        disagreement = float(np.mean(predictions.argmax(axis=1) != reference.argmax(axis=1)))
+        result['top1_disagreement'] = disagreement
+        result['max_abs_prob_diff'] = float(np.abs(predictions - reference).max())
+        result['size_mb'] = os.path.getsize(exports[name]) / (1024 * 1024)
+        report['backends'][name] = result
+        if name != 'keras' and disagreement > args.max_top1_disagreement:
+            failed.append(name)
+
+    print(f"\n{'Backend':<8} {'Size MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'Batch ms/img':>13} "
+          f"{'RSS MB':>8} {'Top-1 diff':>11}")
+    for name, r in report['backends'].items():
+        print(f"{name:<8} {r['size_mb']:>8.1f} {r['latency_ms_p50']:>8.2f} {r['latency_ms_p99']:>8.2f} "
+              f"{r['batch_ms_per_image']:>13.2f} {r['peak_rss_mb']:>8.0f} {r['top1_disagreement']:>10.2%}")
+
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report saved: {REPORT_PATH}")
+
+    if failed:
+        # Never leave a drifting artifact where ImageClassifier would pick it up
+        for name in failed:
+            os.remove(exports[name])
+            print(f"❌ {name}: accuracy drift above {args.max_top1_disagreement:.1%}, removed {exports[name]}")
+        print("   Re-export with less quantization or a larger calibration set")
+        sys.exit(1)
+
+    print("✅ Exported models agree with Keras; ImageClassifier will prefer them on next start")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
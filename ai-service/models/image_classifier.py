@@ -3,50 +3,106 @@ Enhanced AI Waste Classification with Trained Model Support
 Supports both custom trained model and MobileNetV2 fallback
 """
 
-import io
 import os
 import json
+import asyncio
+import threading
+import time
+import importlib.util
 import numpy as np
-from PIL import Image
-from typing import Dict
-from models.waste_database import WASTE_DATABASE
-
-# Import TensorFlow
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    TENSORFLOW_AVAILABLE = True
-except ImportError:
-    TENSORFLOW_AVAILABLE = False
+from concurrent.futures import CancelledError
+from functools import partial
+from typing import Dict, List, Tuple
+from models.responses import build_response
+from models.micro_batcher import MicroBatcher
+from models.inference_executor import InferenceExecutor
+from models.async_support import read_upload, run_cancellable
+from models.near_duplicates import dhash
+from models.metrics import metrics
+from models.preprocessing import (batch_buffer, normalize_in_place, preflight_image, preprocess_batch,
+                                  ImageRejected, INPUT_SIZE)
+from models.inference_backends import BACKENDS, GraphKerasBackend
+from models.model_registry import CLASS_INDICES_PATH, KERAS_MODEL_PATH
+
+# TensorFlow is imported lazily (it takes seconds); only check that it exists
+TENSORFLOW_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+if not TENSORFLOW_AVAILABLE:
     print("⚠️ TensorFlow not available, using fallback classification")
 
+# How long a replaced inference executor keeps serving requests that started before the swap
+RETIRE_AFTER_SECONDS = 30.0
+
 class ImageClassifier:
     """
     AI-powered image classification for waste sorting.
     
     Priority order:
-    1. Custom trained model (waste_classifier_v1.h5)
+    1. Custom trained model, exported (waste_classifier_v1.tflite / .onnx)
+       or full Keras (waste_classifier_v1.h5)
     2. MobileNetV2 with keyword mapping
     3. Filename analysis fallback
+    
+    The model is loaded and warmed up on a background thread by default;
+    until it is ready, requests are answered by filename analysis.
+    With `inference_replicas`, model calls run on an InferenceExecutor.
+    With `graph_mode`, Keras models run as compiled graphs (GraphKerasBackend).
+    With a `registry` (ModelRegistry), its current version (or `version`) is
+    loaded instead of the files above, and `reload()` swaps in newly
+    promoted versions.
     """
     
-    def __init__(self):
+    def __init__(self, micro_batching: bool = False, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 cache=None, background_load: bool = True, backend: str = 'auto', num_threads: int = None,
+                 inter_op_threads: int = None, inference_replicas: int = 0, inference_timeout_ms: float = None,
+                 near_duplicates=None, graph_mode: bool = False, precision: str = 'float32',
+                 jit_compile: bool = False, registry=None, version: str = None,
+                 configure_tensorflow: bool = True):
         self.categories = ['Organic', 'Recyclable', 'Hazardous', 'E-Waste', 'Dry Waste', 'Medical Waste']
         self.model = None
         self.model_type = None
+        # Requested backend: 'auto' (TFLite, then ONNX, then Keras), 'tflite', 'onnx' or 'keras'
+        self.backend = backend
+        self.backend_name = None
+        # Intra-op threads per model (None = library default, usually all cores)
+        self.num_threads = num_threads
+        # TensorFlow inter-op threads (independent ops run in parallel)
+        self.inter_op_threads = inter_op_threads
+        # Keras models only: fixed-shape tf.function per batch bucket, optional XLA / bfloat16
+        self.graph_mode = graph_mode
+        self.precision = precision
+        self.jit_compile = jit_compile
         self.class_indices = None
+        self.index_to_class = {i: cat for i, cat in enumerate(self.categories)}
+        # Optional ModelRegistry; `version` is the registry version being served
+        self.registry = registry
+        self.version = None
+        # Registry version to load instead of the current one (e.g. a candidate under evaluation)
+        self._pinned_version = version
+        self.last_reload = None
+        self._failed_versions = set()
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        # Published model object -> (model_type, index_to_class), for the current and the
+        # replaced model, so requests that started before a swap finish consistently
+        self._published = {}
+        # TensorFlow's thread pools are process-wide: a second classifier in the same
+        # process (e.g. a shadow candidate) passes configure_tensorflow=False so only its
+        # TFLite / ONNX interpreters get `num_threads` and the primary's settings stand
+        self._tensorflow_configured = not configure_tensorflow
+        self.max_batch_size = max_batch_size
+        self._batcher = None
+        # (replicas, timeout_ms, max_queue) while an inference executor is wanted
+        self._executor_options = None
+        self._publish_lock = threading.Lock()
+        # Optional ResultCache (see models/result_cache.py)
+        self.cache = cache
+        # Optional NearDuplicateIndex (see models/near_duplicates.py)
+        self.near_duplicates = near_duplicates
         
-        # Try to load custom trained model first
-        if TENSORFLOW_AVAILABLE:
-            self._load_custom_model()
-            
-            # If custom model not available, try MobileNetV2
-            if self.model is None:
-                self._load_mobilenet_fallback()
-        
-        if self.model is None:
-            print("📸 Image classifier initialized (filename analysis mode)")
-            print("   Train a model using: python models/train_model.py")
+        # Readiness: 'loading' -> 'ready' (model serving) or 'fallback' (filename analysis)
+        self.state = 'loading'
+        self.ready = threading.Event()
+        self.startup_timings = {}
         
         # Filename keywords for ultimate fallback
         self.filename_keywords = {
@@ -63,162 +119,779 @@ class ImageClassifier:
             'Medical Waste': ['mask', 'syringe', 'bandage', 'glove', 'medical', 'hospital',
                             'surgical', 'ppe', 'sanitizer', 'swab']
         }
-    
-    def _load_custom_model(self):
-        """Load custom trained waste classification model"""
-        model_path = 'models/waste_classifier_v1.h5'
-        class_indices_path = 'models/class_indices.json'
-        
-        if os.path.exists(model_path):
+
+        if micro_batching:
+            self.enable_micro_batching(max_batch_size, max_wait_ms)
+        if inference_replicas:
+            self.enable_inference_executor(inference_replicas, inference_timeout_ms)
+
+        if background_load:
+            print("📸 Image classifier initialized (loading model in background, filename analysis until ready)")
+            threading.Thread(target=self._load_model, name='image-model-loader', daemon=True).start()
+        else:
+            self._load_model()
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        """Block until model loading has finished (successfully or not)"""
+        return self.ready.wait(timeout)
+
+    def status(self) -> Dict:
+        """Readiness state and startup phase timings (seconds)"""
+        executor = self.inference_executor
+        return {
+            'state': self.state,
+            'model_type': self.model_type,
+            'backend': self.backend_name,
+            'version': self.version,
+            'last_reload': self.last_reload,
+            'startup_timings': dict(self.startup_timings),
+            'inference': executor.stats() if executor is not None else None,
+            'near_duplicates': self.near_duplicates.stats() if self.near_duplicates is not None else None,
+        }
+
+    def _load_model(self):
+        """Import TensorFlow, load the best available model and warm it up"""
+        start = time.perf_counter()
+        loaded = None
+        version = self._pinned_version
+        if version is None and self.registry is not None:
+            version = self.registry.current()
+
+        try:
+            loaded = self._load_version(version, self.startup_timings)
+        except Exception as e:
+            print(f"⚠️ Model startup failed: {e}")
+            if version is not None:
+                self._failed_versions.add(version)
+
+        self.startup_timings['total'] = time.perf_counter() - start
+
+        if loaded is not None:
+            self._publish(*loaded, version=version)
+            self.state = 'ready'
+        else:
+            self.state = 'fallback'
+            print("📸 Image classifier using filename analysis mode")
+            print("   Train a model using: python models/train_model.py")
+
+        timings = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in self.startup_timings.items())
+        print(f"⏱️  Image classifier startup: {timings}")
+        self.ready.set()
+
+    def _load_version(self, version: str, timings: Dict, fallback: bool = True):
+        """
+        Load and warm up registry `version`, or the files in models/ when it
+        is None, without publishing anything. Returns (model, model_type,
+        backend_name, index_to_class, class_indices), or None if there is no
+        model (MobileNetV2 is tried only with `fallback`). Raises if the
+        version's checksums, load or warm-up fail.
+        """
+        model, model_type, backend_name = None, None, None
+        if version is None:
+            paths = {name: path for name, (_, path) in BACKENDS.items()}
+            paths['keras'] = KERAS_MODEL_PATH
+            index_to_class, class_indices = self._load_class_map()
+        else:
+            phase = time.perf_counter()
+            self.registry.verify(version)
+            manifest = self.registry.manifest(version)
+            if tuple(manifest['input_size']) != tuple(INPUT_SIZE):
+                raise ValueError(f"Model {version} expects {manifest['input_size']} input, not {list(INPUT_SIZE)}")
+            paths = self.registry.artifact_paths(version)
+            class_indices = manifest['class_indices']
+            index_to_class = {v: k for k, v in class_indices.items()}
+            timings['verify'] = time.perf_counter() - phase
+
+        # Lightweight exported model first; needs neither Keras nor a TF import
+        phase = time.perf_counter()
+        # Registry versions are immutable; loose files in models/ may predate a retrain
+        exported = self._load_exported_model(paths, check_stale=version is None)
+        if exported is not None:
+            model = exported
+            model_type, backend_name = 'custom', exported.name
+            timings['model_load'] = time.perf_counter() - phase
+
+        if model is None and TENSORFLOW_AVAILABLE and self.backend in ('auto', 'keras'):
+            self._import_tensorflow(timings)
+
+            # Try to load custom trained model first
+            phase = time.perf_counter()
+            loaded = self._load_custom_model(paths.get('keras'), index_to_class)
+            if loaded is not None:
+                model, model_type, backend_name = loaded, 'custom', 'keras'
+            elif fallback:
+                # If custom model not available, try MobileNetV2
+                model = self._load_mobilenet_fallback()
+                if model is not None:
+                    model_type, backend_name = 'mobilenet', 'keras'
+            timings['model_load'] = time.perf_counter() - phase
+
+            if model is not None and self.graph_mode:
+                phase = time.perf_counter()
+                model = GraphKerasBackend(model, jit_compile=self.jit_compile, precision=self.precision)
+                backend_name = model.name
+                timings['graph_trace'] = time.perf_counter() - phase
+
+        if model is None:
+            if version is not None:
+                raise ValueError(f"Model {version} has no artifact this service can load")
+            return None
+
+        # Run inference once (every batch bucket for graphs) so the first real request does not pay tracing
+        phase = time.perf_counter()
+        if hasattr(model, 'warmup'):
+            model.warmup()
+        output = model.predict(np.zeros((1,) + INPUT_SIZE[::-1] + (3,), dtype=np.float32), verbose=0)
+        output = np.asarray(output)
+        if model_type == 'custom' and output.shape[-1] != len(index_to_class):
+            raise ValueError(f"Model outputs {output.shape[-1]} classes, its class map has {len(index_to_class)}")
+        if not np.all(np.isfinite(output)):
+            raise ValueError("Model warm-up produced non-finite outputs")
+        timings['warmup'] = time.perf_counter() - phase
+
+        return model, model_type, backend_name, index_to_class, class_indices
+
+    def _import_tensorflow(self, timings: Dict):
+        """Import TensorFlow (timed) and apply the thread settings, once per classifier"""
+        phase = time.perf_counter()
+        import tensorflow as tf  # heavy import, timed on its own
+        timings['tensorflow_import'] = time.perf_counter() - phase
+        if self._tensorflow_configured:
+            return
+        self._tensorflow_configured = True
+        if self.num_threads or self.inter_op_threads:
+            try:
+                if self.num_threads:
+                    tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+                if self.inter_op_threads:
+                    tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+            except RuntimeError as e:
+                # TensorFlow was already initialized elsewhere in this process
+                print(f"⚠️ Could not set TensorFlow threads: {e}")
+
+    def _publish(self, model, model_type: str, backend_name: str, index_to_class: Dict, class_indices: Dict,
+                 version: str = None):
+        """
+        Swap a loaded, warmed-up model in with one reference assignment.
+        Requests already running keep the model they started with; a
+        replaced inference executor is closed after RETIRE_AFTER_SECONDS.
+        """
+        with self._publish_lock:
+            if self._executor_options is not None:
+                model = self._start_executor(model, *self._executor_options)
+            retired = self.model
+            self._published = {model: (model_type, index_to_class)}
+            if retired is not None:
+                self._published[retired] = (self.model_type, self.index_to_class)
+            self.index_to_class = index_to_class
+            self.class_indices = class_indices
+            self.model_type = model_type
+            self.backend_name = backend_name
+            self.version = version
+            self.model = model
+
+        if self.near_duplicates is not None:
+            # Entries may have been answered by an earlier model
+            self.near_duplicates.clear()
+        if isinstance(retired, InferenceExecutor):
+            closer = threading.Timer(RETIRE_AFTER_SECONDS, retired.close)
+            closer.daemon = True
+            closer.start()
+
+    def _model_info(self, model) -> Tuple[str, Dict]:
+        """(model_type, index_to_class) that `model` was published with"""
+        return self._published.get(model) or (self.model_type, self.index_to_class)
+
+    def reload(self, version: str = None) -> bool:
+        """
+        Load `version` (default: the registry's current one) next to the
+        serving model, warm it up and swap it in; in-flight requests finish
+        on the old model. If verification, loading or warm-up fails, the old
+        model keeps serving and the version is not retried automatically.
+        Returns True if a new version was swapped in.
+        """
+        if self.registry is None:
+            raise ValueError("No model registry configured")
+
+        with self._reload_lock:
+            version = version or self.registry.current()
+            if version is None or version == self.version:
+                return False
+
+            print(f"🔄 Loading model {version} (serving {self.version or self.backend_name or 'filename analysis'})")
+            timings = {}
+            start = time.perf_counter()
             try:
+                loaded = self._load_version(version, timings, fallback=False)
+                self._publish(*loaded, version=version)
+            except Exception as e:
+                self._failed_versions.add(version)
+                self.last_reload = {'version': version, 'result': 'rolled_back', 'error': str(e)}
+                metrics.increment('model_reloads_total', kind='image', result='rolled_back')
+                print(f"❌ Model {version} failed, still serving {self.version or 'the previous model'}: {e}")
+                return False
+
+            timings['total'] = time.perf_counter() - start
+            self.last_reload = {'version': version, 'result': 'swapped', 'timings': timings}
+            self.state = 'ready'
+            metrics.increment('model_reloads_total', kind='image', result='swapped')
+            print(f"✅ Now serving model {version} ({self.backend_name}, loaded in {timings['total']:.2f}s)")
+            return True
+
+    def watch_registry(self, interval: float = 30.0):
+        """Check the registry every `interval` seconds and reload when another version is promoted"""
+        if self.registry is None:
+            raise ValueError("No model registry configured")
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    version = self.registry.current()
+                    if version is not None and version != self.version and version not in self._failed_versions:
+                        self.reload(version)
+                except Exception as e:
+                    print(f"⚠️ Model registry check failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name='image-model-watcher', daemon=True)
+        self._watcher.start()
+
+    def _load_exported_model(self, paths: Dict[str, str], check_stale: bool = False):
+        """
+        Load a TFLite or ONNX export of the custom model, if present. With
+        `check_stale`, exports older than the Keras model next to them were
+        made before the last retrain and are skipped in 'auto' mode.
+        """
+        names = ['tflite', 'onnx'] if self.backend == 'auto' else [self.backend]
+        keras_path = paths.get('keras')
+        for name in names:
+            if name not in BACKENDS or name not in paths:
+                continue
+            backend_class, _ = BACKENDS[name]
+            path = paths[name]
+            if not os.path.exists(path):
+                continue
+            if check_stale and keras_path and os.path.exists(keras_path) \
+                    and os.path.getmtime(path) < os.path.getmtime(keras_path):
+                if self.backend == 'auto':
+                    print(f"⚠️ Skipping {path}: older than {keras_path} (re-run models/export_model.py)")
+                    continue
+                print(f"⚠️ {path} is older than {keras_path}; serving it because backend='{name}' was requested")
+            try:
+                print(f"🤖 Loading exported model ({name})...")
+                backend = backend_class(path, num_threads=self.num_threads)
+                print(f"✅ Exported model loaded: {path}")
+                return backend
+            except Exception as e:
+                print(f"⚠️ Failed to load {name} model: {e}")
+        return None
+
+    def _load_class_map(self):
+        """Return (index_to_class, class_indices) from class_indices.json or defaults"""
+        if os.path.exists(CLASS_INDICES_PATH):
+            with open(CLASS_INDICES_PATH, 'r') as f:
+                class_indices = json.load(f)
+            # Reverse mapping: index -> class name
+            return {v: k for k, v in class_indices.items()}, class_indices
+        # Default mapping
+        return {i: cat for i, cat in enumerate(self.categories)}, None
+
+    def _load_custom_model(self, model_path: str, index_to_class: Dict):
+        """
+        Load custom trained waste classification model.
+        Returns the model or None.
+        """
+        if model_path and os.path.exists(model_path):
+            try:
+                from tensorflow import keras
                 print("🤖 Loading custom trained model...")
-                self.model = keras.models.load_model(model_path)
-                self.model_type = 'custom'
-                
-                # Load class indices
-                if os.path.exists(class_indices_path):
-                    with open(class_indices_path, 'r') as f:
-                        self.class_indices = json.load(f)
-                        # Reverse mapping: index -> class name
-                        self.index_to_class = {v: k for k, v in self.class_indices.items()}
-                else:
-                    # Default mapping
-                    self.index_to_class = {i: cat for i, cat in enumerate(self.categories)}
+                model = keras.models.load_model(model_path)
                 
                 print("✅ Custom trained model loaded successfully!")
-                print(f"   Classes: {', '.join(self.index_to_class.values())}")
+                print(f"   Classes: {', '.join(index_to_class.values())}")
+                return model
                 
             except Exception as e:
                 print(f"⚠️ Failed to load custom model: {e}")
-                self.model = None
-                self.model_type = None
+        
+        return None
     
     def _load_mobilenet_fallback(self):
-        """Load MobileNetV2 as fallback"""
+        """Load MobileNetV2 as fallback; returns the model or None"""
         try:
             from tensorflow.keras.applications import MobileNetV2
             print("🤖 Loading MobileNetV2 fallback model...")
-            self.model = MobileNetV2(weights='imagenet', include_top=True)
-            self.model_type = 'mobilenet'
+            model = MobileNetV2(weights='imagenet', include_top=True)
             print("✅ MobileNetV2 fallback loaded")
+            return model
             
         except Exception as e:
             print(f"⚠️ Failed to load MobileNetV2: {e}")
-            self.model = None
-            self.model_type = None
+            return None
     
-    def classify(self, image_file) -> Dict:
+    def classify(self, image_file, profile: str = 'full', fields=None, observer=None) -> Dict:
         """
         Classify waste from image using best available method.
+        `profile` ('full' or 'compact') or `fields` select the response keys.
+        Corrupt, unsupported or oversized images raise ImageRejected.
+        `observer(image_bytes, filename, (category, confidence, method))`, if
+        given, is called before the response is built (see shadow_evaluation.py).
         """
         try:
             filename = image_file.filename.lower() if hasattr(image_file, 'filename') else ''
             image_bytes = image_file.read()
-            
-            # Try AI classification
-            if self.model is not None:
-                if self.model_type == 'custom':
-                    category, confidence, method = self._classify_with_custom_model(image_bytes)
-                elif self.model_type == 'mobilenet':
-                    category, confidence, method = self._classify_with_mobilenet(image_bytes, filename)
-                else:
-                    category, confidence, method = self._classify_by_filename(filename, len(image_bytes))
+            self._preflight(image_bytes)
+
+            batcher = self._batcher
+            if batcher is not None and self.model is not None:
+                # Decode here, then share one model call with other concurrent requests
+                classify_items = lambda items: self._classify_items(
+                    items, lambda *args: self._predict_batched(batcher, *args))
             else:
-                # Fallback to filename analysis
-                category, confidence, method = self._classify_by_filename(filename, len(image_bytes))
-            
-            # Get comprehensive information
-            waste_info = WASTE_DATABASE.get(category, {})
-            
-            return {
-                'category': category,
-                'confidence': confidence,
-                'detection_method': method,
-                'waste_name': waste_info.get('name', category),
-                'examples': waste_info.get('examples', []),
-                'risk_level': waste_info.get('risk_level', 'Unknown'),
-                'risk_reason': waste_info.get('risk_reason', ''),
-                'storage': waste_info.get('storage', {}),
-                'sanitization': waste_info.get('sanitization', {}),
-                'disposal': waste_info.get('disposal', {}),
-                'monitoring': waste_info.get('monitoring', {}),
-                'tools_required': waste_info.get('tools_required', []),
-                'environmental_impact': waste_info.get('environmental_impact', {}),
-                'pros_cons': waste_info.get('pros_cons', {})
-            }
-            
+                classify_items = self._classify_items
+
+            category, confidence, method = self._classify_cached([(image_bytes, filename)], classify_items)[0]
+            if observer is not None:
+                observer(image_bytes, filename, (category, confidence, method))
+
+            with metrics.timer('response', kind='image'):
+                return self._build_response(category, confidence, method, profile, fields)
+
+        except ImageRejected:
+            raise
         except Exception as e:
             raise Exception(f"Image processing error: {str(e)}")
-    
-    def _classify_with_custom_model(self, image_bytes: bytes):
+
+    async def classify_async(self, image_file, profile: str = 'full', fields=None, timeout: float = None,
+                             max_bytes: int = None, executor=None) -> Dict:
         """
-        Classify using custom trained model.
+        asyncio variant of `classify`. The upload (bytes, a stream or an
+        async file, see read_upload) is read in chunks; decoding runs on
+        `executor` (default: the loop's) and inference on the inference
+        executor or micro-batcher if enabled.
+
+        Raises TimeoutError after `timeout` seconds. Timing out, or
+        cancelling the task when the client disconnects, stops the work at
+        the next stage and drops a model call that has not started.
         """
+        return await asyncio.wait_for(self._classify_async(image_file, profile, fields, max_bytes, executor),
+                                      timeout)
+
+    async def _classify_async(self, image_file, profile, fields, max_bytes, executor) -> Dict:
         try:
-            # Load and preprocess image
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to RGB
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize to 224x224 (model input size)
-            image = image.resize((224, 224))
-            
-            # Convert to array and normalize
-            img_array = np.array(image) / 255.0
-            img_array = np.expand_dims(img_array, axis=0)
-            
-            # Get predictions
-            predictions = self.model.predict(img_array, verbose=0)[0]
-            
-            # Get top prediction
-            top_idx = np.argmax(predictions)
-            confidence = float(predictions[top_idx])
-            category = self.index_to_class.get(top_idx, self.categories[top_idx])
-            
-            # Get top 3 predictions for method description
-            top_3_indices = np.argsort(predictions)[-3:][::-1]
-            top_3_predictions = [
-                f"{self.index_to_class.get(i, self.categories[i])} ({predictions[i]:.1%})"
-                for i in top_3_indices
-            ]
-            
-            method = f"AI Model (Trained): {', '.join(top_3_predictions[:2])}"
-            
-            return category, confidence, method
-            
+            filename = image_file.filename.lower() if getattr(image_file, 'filename', None) else ''
+            image_bytes = await read_upload(image_file, max_bytes)
+
+            category, confidence, method = await run_cancellable(self._classify_cancellable, image_bytes,
+                                                                 filename, executor=executor)
+
+            with metrics.timer('response', kind='image'):
+                return self._build_response(category, confidence, method, profile, fields)
+
+        except ImageRejected:
+            raise
         except Exception as e:
-            print(f"Custom model classification error: {e}")
-            # Fallback to filename
-            return self._classify_by_filename('', len(image_bytes))
-    
+            raise Exception(f"Image processing error: {str(e)}")
+
+    def _classify_cancellable(self, cancellation, image_bytes: bytes, filename: str) -> Tuple[str, float, str]:
+        """Executor thread of classify_async: stops before decoding and before the model call once cancelled"""
+        cancellation.check()
+        self._preflight(image_bytes)
+        batcher = self._batcher
+        if batcher is not None and self.model is not None:
+            predict_rows = partial(self._predict_batched, batcher, cancellation=cancellation)
+        else:
+            predict_rows = partial(self._predict_rows, cancellation=cancellation)
+
+        return self._classify_cached([(image_bytes, filename)],
+                                     lambda items: self._classify_items(items, predict_rows))[0]
+
+    def classify_batch(self, image_files: List, profile: str = 'full', fields=None) -> List[Dict]:
+        """
+        Classify several images with a single model call.
+        Results are returned in the same order as the input files.
+        """
+        items = []
+        for image_file in image_files:
+            filename = image_file.filename if hasattr(image_file, 'filename') else ''
+            items.append((image_file.read(), filename))
+
+        return self.classify_images(items, profile, fields)
+
+    def classify_images(self, items: List[Tuple[bytes, str]], profile: str = 'full', fields=None) -> List[Dict]:
+        """
+        Classify (image_bytes, filename) pairs, e.g. read from an archive,
+        in chunks of `max_batch_size`. Results keep the input order; a
+        rejected image gets {'error': ..., 'code': ...} instead.
+        """
+        try:
+            rejected = {}
+            accepted = []
+            for i, (image_bytes, filename) in enumerate(items):
+                try:
+                    self._preflight(image_bytes)
+                    accepted.append((image_bytes, (filename or '').lower()))
+                except ImageRejected as e:
+                    rejected[i] = {'error': str(e), 'code': e.code}
+
+            results = []
+            for start in range(0, len(accepted), self.max_batch_size):
+                results.extend(self._classify_cached(accepted[start:start + self.max_batch_size],
+                                                     self._classify_items))
+
+            with metrics.timer('response', kind='image'):
+                responses = iter([self._build_response(*result, profile, fields) for result in results])
+                return [rejected[i] if i in rejected else next(responses) for i in range(len(items))]
+
+        except Exception as e:
+            raise Exception(f"Image processing error: {str(e)}")
+
+    def enable_micro_batching(self, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        """
+        Route `classify` calls through a micro-batcher so that concurrent
+        requests are stacked into one `model.predict` call.
+        """
+        self.disable_micro_batching()
+        self.max_batch_size = max_batch_size
+        self._batcher = MicroBatcher(
+            self._predict_stacked,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name='image-classifier-batcher'
+        )
+        print(f"📦 Micro-batching enabled (max batch {max_batch_size}, max wait {max_wait_ms}ms)")
+
+    @property
+    def micro_batching(self) -> bool:
+        return self._batcher is not None
+
+    def disable_micro_batching(self):
+        """Flush and stop the micro-batcher, if any"""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+
+    def enable_inference_executor(self, replicas: int = 1, timeout_ms: float = None, max_queue: int = 64):
+        """
+        Run model calls on `replicas` copies of the model, each owned by one
+        worker thread, instead of on the request threads. A call waiting
+        longer than `timeout_ms` falls back to filename analysis. Takes effect
+        when the model finishes loading if it has not yet.
+        """
+        if replicas < 1:
+            raise ValueError("replicas must be at least 1")
+        self.disable_inference_executor()
+        with self._publish_lock:
+            self._executor_options = (replicas, timeout_ms, max_queue)
+            if self.model is not None:
+                self.model = self._start_executor(self.model, replicas, timeout_ms, max_queue)
+
+    @property
+    def inference_executor(self):
+        model = self.model
+        return model if isinstance(model, InferenceExecutor) else None
+
+    def disable_inference_executor(self):
+        """Finish queued model calls, stop the workers and call the model directly again"""
+        with self._publish_lock:
+            self._executor_options = None
+            executor = self.inference_executor
+            if executor is not None:
+                self.model = executor.replicas[0]
+        if executor is not None:
+            executor.close()
+
+    def _start_executor(self, model, replicas: int, timeout_ms: float, max_queue: int) -> InferenceExecutor:
+        executor = InferenceExecutor(
+            self._replicate(model, replicas),
+            timeout=None if timeout_ms is None else timeout_ms / 1000.0,
+            max_queue=max_queue,
+            name='image-inference'
+        )
+        timeout = f", timeout {timeout_ms:.0f}ms" if timeout_ms is not None else ''
+        print(f"🧵 Inference executor started ({replicas} replica{'s' if replicas > 1 else ''}{timeout})")
+        return executor
+
+    def _replicate(self, model, count: int) -> List:
+        """`count` independent, warmed-up copies of a loaded model (the first is `model` itself)"""
+        replicas = [model]
+        for _ in range(count - 1):
+            if getattr(model, 'thread_safe', False):
+                # Compiled graphs are safe to call concurrently; every worker shares one
+                replicas.append(model)
+                continue
+            if type(model) in {backend_class for backend_class, _ in BACKENDS.values()}:
+                # Exported models map the same file, so copies share its pages
+                replica = type(model)(model.model_path, num_threads=self.num_threads)
+            else:
+                from tensorflow import keras
+                if not isinstance(model, keras.Model):
+                    raise ValueError(f"Cannot replicate a {type(model).__name__} model")
+                replica = keras.models.clone_model(model)
+                replica.set_weights(model.get_weights())
+            replica.predict(np.zeros((1,) + INPUT_SIZE[::-1] + (3,), dtype=np.float32), verbose=0)
+            replicas.append(replica)
+        return replicas
+
+    def _classify_cached(self, items: List[Tuple[bytes, str]], classify_items) -> List[Tuple[str, float, str]]:
+        """
+        Look items up in the result cache and only classify the misses.
+        Keys hash the image bytes only, so renamed uploads still hit; only
+        model answers, which never depend on the filename, are stored.
+        """
+        # Snapshot: init_worker may attach a cache while requests run
+        cache = self.cache
+        if cache is None:
+            return classify_items(items)
+
+        # The registry version is part of the key: files on disk do not change when it does
+        keys = [cache.make_key('image', image_bytes, version=self.version or '') for image_bytes, _ in items]
+        results = [cache.get(key) for key in keys]
+        if metrics.enabled:
+            misses = results.count(None)
+            metrics.increment('cache_requests_total', len(results) - misses, kind='image', result='hit')
+            metrics.increment('cache_requests_total', misses, kind='image', result='miss')
+
+        # Classify each distinct missing image once, even if repeated in the batch
+        missing = {}
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[i], []).append(i)
+
+        if missing:
+            fresh = classify_items([items[indexes[0]] for indexes in missing.values()])
+            for (key, indexes), result in zip(missing.items(), fresh):
+                # Only model answers: filename and random fallbacks (loading, decode or
+                # predict failures) must not outlive the condition that caused them
+                if result[2].startswith('AI '):
+                    cache.put(key, list(result))
+                for i in indexes:
+                    results[i] = result
+
+        return [tuple(result) for result in results]
+
+    def _preflight(self, image_bytes: bytes):
+        """Refuse corrupt, unsupported or oversized images from their header, before any decoding"""
+        try:
+            preflight_image(image_bytes)
+        except ImageRejected as e:
+            metrics.increment('rejected_total', kind='image', code=e.code)
+            raise
+
+    def _build_response(self, category: str, confidence: float, method: str,
+                        profile: str = 'full', fields=None) -> Dict:
+        """Build the response for a classified category (see models/responses.py)"""
+        return build_response(category, confidence, method, profile=profile, fields=fields)
+
+    def _classify_items(self, items: List[Tuple[bytes, str]], predict_rows=None) -> List[Tuple[str, float, str]]:
+        """
+        Classify a batch of (image_bytes, filename) pairs.
+        Images that fail to decode, or a failed model call, fall back to
+        filename analysis for the affected items only. `predict_rows`
+        replaces `_predict_rows` for the decoded batch.
+        """
+        # Snapshot: the model may be published or swapped by another thread at any time
+        model = self.model
+        model_type, _ = self._model_info(model)
+        if model is None or model_type not in ('custom', 'mobilenet'):
+            # Fallback to filename analysis
+            return [self._classify_by_filename(filename, len(image_bytes))
+                    for image_bytes, filename in items]
+
+        results = [None] * len(items)
+        fallback_names = ['' if model_type == 'custom' else filename for _, filename in items]
+
+        # Decode straight into a shared float32 batch buffer
+        timings = {} if metrics.enabled else None
+        batch, positions, errors = preprocess_batch([image_bytes for image_bytes, _ in items],
+                                                    model_type, timings=timings)
+        if timings:
+            for stage, seconds in timings.items():
+                metrics.observe('stage_seconds', seconds, stage=stage, kind='image')
+        for i, e in errors.items():
+            print(f"Image preprocessing error: {e}")
+            metrics.increment('errors_total', stage='decode', kind='image')
+            results[i] = self._classify_by_filename(fallback_names[i], len(items[i][0]))
+
+        if positions:
+            rows = self._predict_unseen(model, model_type, batch, [(items[i][1], len(items[i][0])) for i in positions],
+                                        predict_rows or self._predict_rows)
+            for i, result in zip(positions, rows):
+                results[i] = result
+
+        return results
+
+    def classify_decoded(self, pixels: np.ndarray, names_sizes: List[Tuple[str, int]]) -> List[Tuple[str, float, str]]:
+        """
+        Classify images already decoded and resized to INPUT_SIZE
+        (uint8, N x H x W x 3), e.g. by worker processes with load_image.
+        `names_sizes[k]` is the (filename, byte size) of `pixels[k]`, used by
+        the fallbacks. Returns (category, confidence, method) per image.
+        """
+        model = self.model
+        model_type, _ = self._model_info(model)
+        if model is None or model_type not in ('custom', 'mobilenet'):
+            return [self._classify_by_filename(filename.lower(), size) for filename, size in names_sizes]
+
+        batch = batch_buffer(len(pixels))
+        np.copyto(batch, pixels, casting='unsafe')
+        normalize_in_place(batch, model_type)
+
+        return self._predict_unseen(model, model_type, batch,
+                                    [(filename.lower(), size) for filename, size in names_sizes], self._predict_rows)
+
+    def _predict_unseen(self, model, model_type: str, batch: np.ndarray, names_sizes: List[Tuple[str, int]],
+                        predict_rows) -> List[Tuple[str, float, str]]:
+        """
+        Answer near-duplicates of earlier images from the perceptual-hash
+        index, if any, and run `predict_rows` on the rest of the batch.
+        """
+        index = self.near_duplicates
+        if index is None:
+            return predict_rows(model, model_type, batch, names_sizes)
+
+        # Cells within ~2 gray levels of each other count as a flat image (see normalize_in_place)
+        min_contrast = (4.0 if model_type == 'mobilenet' else 2.0) / 255.0
+        with metrics.timer('phash', kind='image'):
+            hashes = [dhash(row, min_contrast) for row in batch]
+
+        results = [None] * len(batch)
+        unseen = []
+        for k, image_hash in enumerate(hashes):
+            # A featureless (flat) image hashes to 0 and says nothing about its content
+            match = index.lookup(image_hash) if image_hash else None
+            if match is None:
+                unseen.append(k)
+            else:
+                (category, confidence, method), distance = match
+                results[k] = (category, confidence, f"{method} (near-duplicate, distance {distance})")
+
+        if unseen:
+            rows = batch if len(unseen) == len(batch) else batch[unseen]
+            fresh = predict_rows(model, model_type, rows, [names_sizes[k] for k in unseen])
+            for k, result in zip(unseen, fresh):
+                results[k] = result
+                # Only model answers are reusable; fallbacks depend on the filename
+                if hashes[k] and result[2].startswith('AI '):
+                    index.add(hashes[k], result)
+
+        return results
+
+    def _predict_batched(self, batcher: MicroBatcher, model, model_type: str, batch: np.ndarray,
+                         names_sizes: List[Tuple[str, int]], cancellation=None) -> List[Tuple[str, float, str]]:
+        """Hand rows decoded by this request thread to the micro-batcher"""
+        if cancellation is not None:
+            cancellation.check()
+        # Copy: the batch buffer belongs to this thread and is reused by its next request
+        futures = [batcher.submit((model, model_type, batch[k].copy(), names_sizes[k]))
+                   for k in range(len(batch))]
+        if cancellation is not None:
+            # The batcher skips cancelled entries
+            for future in futures:
+                cancellation.track(future)
+        return [future.result() for future in futures]
+
+    def _predict_stacked(self, entries: List[Tuple]) -> List[Tuple[str, float, str]]:
+        """Micro-batcher: stack rows from concurrent requests into one model call per model"""
+        # Entries only differ in model around a swap (new version or executor started)
+        groups = {}
+        for k, entry in enumerate(entries):
+            groups.setdefault(entry[0], []).append(k)
+
+        results = [None] * len(entries)
+        for model, indexes in groups.items():
+            batch = batch_buffer(len(indexes))
+            for row, k in enumerate(indexes):
+                batch[row] = entries[k][2]
+            rows = self._predict_rows(model, entries[indexes[0]][1], batch, [entries[k][3] for k in indexes])
+            for k, result in zip(indexes, rows):
+                results[k] = result
+        return results
+
+    def _predict_rows(self, model, model_type: str, batch: np.ndarray,
+                      names_sizes: List[Tuple[str, int]], cancellation=None) -> List[Tuple[str, float, str]]:
+        """
+        One predict call over a normalized batch, interpreted row by row.
+        A cancelled `cancellation` token (see async_support.py) raises
+        CancelledError instead of calling, or waiting for, the model.
+        """
+        metrics.observe('batch_size', len(batch), kind='image')
+        try:
+            # One predict call over the stacked tensor
+            with metrics.timer('predict', kind='image', backend=self.backend_name):
+                if cancellation is None:
+                    predictions = model.predict(batch, verbose=0)
+                elif isinstance(model, InferenceExecutor):
+                    predictions = model.predict(batch, verbose=0, cancellation=cancellation)
+                else:
+                    cancellation.check()
+                    predictions = model.predict(batch, verbose=0)
+        except CancelledError:
+            # The caller gave up; there is nobody to fall back for
+            raise
+        except Exception as e:
+            print(f"{model_type} model classification error: {e}")
+            metrics.increment('errors_total', stage='timeout' if isinstance(e, TimeoutError) else 'predict',
+                              kind='image')
+            predictions = None
+
+        results = []
+        _, index_to_class = self._model_info(model)
+        with metrics.timer('interpret', kind='image'):
+            for row, (filename, image_size) in enumerate(names_sizes):
+                if predictions is None:
+                    results.append(self._classify_by_filename('' if model_type == 'custom' else filename,
+                                                              image_size))
+                elif model_type == 'custom':
+                    results.append(self._interpret_custom_prediction(predictions[row], index_to_class))
+                else:
+                    results.append(self._interpret_mobilenet_prediction(predictions[row], filename, image_size))
+        return results
+
+    def _classify_with_custom_model(self, image_bytes: bytes):
+        """
+        Classify using custom trained model.
+        """
+        return self._classify_items([(image_bytes, '')])[0]
+
+    def _interpret_custom_prediction(self, predictions: np.ndarray, index_to_class: Dict = None):
+        """Turn one row of custom model output into (category, confidence, method)"""
+        index_to_class = index_to_class or self.index_to_class
+        # Get top prediction
+        top_idx = int(np.argmax(predictions))
+        confidence = float(predictions[top_idx])
+        category = index_to_class.get(top_idx, self.categories[top_idx])
+
+        # Get top 3 predictions for method description
+        top_3_indices = np.argsort(predictions)[-3:][::-1]
+        top_3_predictions = [
+            f"{index_to_class.get(i, self.categories[i])} ({predictions[i]:.1%})"
+            for i in top_3_indices
+        ]
+
+        method = f"AI Model (Trained): {', '.join(top_3_predictions[:2])}"
+        metrics.increment('classifications_total', kind='image', method='custom')
+
+        return category, confidence, method
+
     def _classify_with_mobilenet(self, image_bytes: bytes, filename: str):
         """
         Classify using MobileNetV2 with keyword mapping.
         """
+        return self._classify_items([(image_bytes, filename)])[0]
+
+    def _interpret_mobilenet_prediction(self, predictions: np.ndarray, filename: str, image_size: int):
+        """Map one row of ImageNet predictions to a waste category"""
         try:
-            from tensorflow.keras.applications.mobilenet_v2 import preprocess_input, decode_predictions
-            
-            # Load and preprocess image
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            image = image.resize((224, 224))
-            
-            img_array = np.array(image)
-            img_array = np.expand_dims(img_array, axis=0)
-            img_array = preprocess_input(img_array)
-            
-            # Get predictions
-            predictions = self.model.predict(img_array, verbose=0)
-            decoded = decode_predictions(predictions, top=5)[0]
-            
+            from tensorflow.keras.applications.mobilenet_v2 import decode_predictions
+
+            decoded = decode_predictions(np.expand_dims(predictions, axis=0), top=5)[0]
+
             # Map to waste categories (simplified)
             detected_objects = [f"{label} ({score:.1%})" for _, label, score in decoded]
-            
+
             # Simple heuristic mapping
             best_score = decoded[0][2]
             if best_score > 0.5:
@@ -226,15 +899,17 @@ class ImageClassifier:
                 method = f"AI Vision (MobileNet): {detected_objects[0]}"
                 # Map to category based on detected object
                 category = self._map_object_to_category(decoded[0][1])
+                metrics.increment('classifications_total', kind='image', method='mobilenet')
             else:
-                return self._classify_by_filename(filename, len(image_bytes))
-            
+                return self._classify_by_filename(filename, image_size)
+
             return category, confidence, method
-            
+
         except Exception as e:
             print(f"MobileNet classification error: {e}")
-            return self._classify_by_filename(filename, len(image_bytes))
-    
+            metrics.increment('errors_total', stage='mobilenet_decode', kind='image')
+            return self._classify_by_filename(filename, image_size)
+
     def _map_object_to_category(self, object_name: str) -> str:
         """Map detected object to waste category"""
         obj_lower = object_name.lower()
@@ -274,6 +949,7 @@ class ImageClassifier:
             confidence = min(0.90, 0.70 + (best_score / 15) * 0.20)
             matched_kw = ', '.join(scores[best_category]['keywords'][:2])
             method = f"Filename analysis: detected '{matched_kw}'"
+            metrics.increment('classifications_total', kind='image', method='filename')
             return best_category, float(confidence), method
         else:
             # Random fallback
@@ -281,4 +957,5 @@ class ImageClassifier:
             category = self.categories[image_size % len(self.categories)]
             confidence = 0.55 + random.random() * 0.15
             method = "Low confidence - train a model for better accuracy"
+            metrics.increment('classifications_total', kind='image', method='random')
             return category, float(confidence), method
@@ -0,0 +1,198 @@
+"""
+Lightweight inference backends for the exported waste classifier.
+Each backend exposes a Keras-style `predict(batch, verbose=0)`.
+"""
+
+import threading
+import numpy as np
+
+TFLITE_MODEL_PATH = 'models/waste_classifier_v1.tflite'
+ONNX_MODEL_PATH = 'models/waste_classifier_v1.onnx'
+
+# Batch sizes GraphKerasBackend compiles for; other sizes are padded up to the next one
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+PRECISIONS = ('float32', 'bfloat16')
+
+
+def cpu_supports_bfloat16() -> bool:
+    """Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX); elsewhere it is emulated"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            cpuinfo = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in cpuinfo or 'amx_bf16' in cpuinfo
+
+
+def _tflite_interpreter_class():
+    """Prefer the standalone tflite-runtime (no full TensorFlow import)"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    """
+    Runs a .tflite model. Handles float32, float16 and int8-quantized
+    models; int8 inputs/outputs are (de)quantized with the model's scale
+    and zero point so callers always pass normalized float32 batches.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path: str = TFLITE_MODEL_PATH, num_threads: int = None):
+        self.model_path = model_path
+        self.interpreter = _tflite_interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        if batch_size == self._batch_size:
+            return
+        shape = list(self._input['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        with self._lock:
+            self._resize(len(batch))
+
+            dtype = self._input['dtype']
+            if dtype in (np.int8, np.uint8):
+                scale, zero_point = self._input['quantization']
+                info = np.iinfo(dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+            else:
+                batch = batch.astype(dtype, copy=False)
+
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+
+            if output.dtype in (np.int8, np.uint8):
+                scale, zero_point = self._output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output.astype(np.float32, copy=True)
+
+
+class OnnxBackend:
+    """Runs a .onnx model with onnxruntime on CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH, num_threads: int = None):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+class KerasBackend:
+    """Full Keras model (H5 or SavedModel)"""
+
+    name = 'keras'
+
+    def __init__(self, model_path: str):
+        from tensorflow import keras
+
+        self.model_path = model_path
+        self.model = keras.models.load_model(model_path)
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self.model.predict(batch, verbose=verbose)
+
+
+class GraphKerasBackend:
+    """
+    Runs a Keras model as a tf.function with one fixed input signature per
+    batch-size bucket, bypassing `model.predict`'s per-call setup (which
+    dominates single-image latency). Batches are zero-padded to the next
+    bucket so no call ever retraces; larger batches run in chunks of the
+    largest bucket.
+
+    `jit_compile` compiles each bucket with XLA. `precision='bfloat16'`
+    turns on oneDNN's auto mixed precision graph rewrite, which computes in
+    bfloat16 where the CPU supports it natively. The rewrite is a
+    process-wide TensorFlow option and applies to every graph built
+    afterwards.
+    """
+
+    # One graph can be called from several threads at once
+    thread_safe = True
+
+    def __init__(self, model, buckets=BATCH_BUCKETS, jit_compile: bool = False, precision: str = 'float32',
+                 input_size=(224, 224)):
+        import tensorflow as tf
+
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}' (expected one of: {', '.join(PRECISIONS)})")
+        if precision == 'bfloat16' and not cpu_supports_bfloat16():
+            print("⚠️ CPU has no native bfloat16 support; using float32")
+            precision = 'float32'
+        if precision == 'bfloat16':
+            tf.config.optimizer.set_experimental_options({'auto_mixed_precision_onednn_bfloat16': True})
+
+        self.model = model
+        self.buckets = tuple(sorted(buckets))
+        self.jit_compile = jit_compile
+        self.precision = precision
+        self.name = 'keras-graph' + ('-xla' if jit_compile else '') + ('-bf16' if precision == 'bfloat16' else '')
+
+        width, height = input_size
+        function = tf.function(lambda batch: model(batch, training=False), jit_compile=jit_compile)
+        self._functions = {
+            size: function.get_concrete_function(tf.TensorSpec((size, height, width, 3), tf.float32))
+            for size in self.buckets
+        }
+        # Padding buffers, per thread and bucket
+        self._local = threading.local()
+
+    def warmup(self):
+        """Run every bucket once, so XLA compilation and graph optimization happen now"""
+        for size, function in self._functions.items():
+            function(np.zeros(function.inputs[0].shape, dtype=np.float32))
+
+    def _padded(self, chunk: np.ndarray, size: int) -> np.ndarray:
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(size)
+        if buffer is None:
+            buffer = buffers[size] = np.zeros((size,) + chunk.shape[1:], dtype=np.float32)
+        buffer[:len(chunk)] = chunk
+        buffer[len(chunk):] = 0.0
+        return buffer
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            size = next(bucket for bucket in self.buckets if bucket >= len(chunk))
+            inputs = chunk.astype(np.float32, copy=False) if size == len(chunk) else self._padded(chunk, size)
+            outputs.append(np.asarray(self._functions[size](inputs))[:len(chunk)].astype(np.float32))
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+
+BACKENDS = {
+    'tflite': (TFLiteBackend, TFLITE_MODEL_PATH),
+    'onnx': (OnnxBackend, ONNX_MODEL_PATH),
+}
@@ -0,0 +1,131 @@
+"""
+Inference executor: model replicas served by dedicated worker threads.
+Request threads submit batches and wait on futures instead of calling a model directly.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List
+
+import numpy as np
+
+from models.metrics import metrics
+from models.preprocessing import release_batch_buffer
+
+_STOP = object()
+
+
+class InferenceExecutor:
+    """
+    Runs batches on a pool of model replicas, one worker thread each.
+
+    Batches wait in a bounded queue and are taken by whichever replica is
+    free, so every replica is only ever called from its own thread. While a
+    replica runs (TensorFlow, TFLite and ONNX Runtime release the GIL),
+    request threads keep decoding and preprocessing the next images.
+
+    `predict` has the Keras-style signature of the inference backends, so
+    an executor can stand in for the model it wraps. It waits at most
+    `timeout` seconds, queueing included; work that is still queued when
+    its caller gives up is skipped.
+    """
+
+    def __init__(self, replicas: List, timeout: float = None, max_queue: int = 64,
+                 name: str = 'inference', kind: str = 'image'):
+        if not replicas:
+            raise ValueError("At least one model replica is required")
+
+        self.replicas = list(replicas)
+        self.timeout = timeout
+        self.kind = kind
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, args=(replica,), name=f"{name}-{i}", daemon=True)
+            for i, replica in enumerate(self.replicas)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, batch: np.ndarray, timeout: float = None) -> Future:
+        """
+        Queue one batch and return a Future for the model output.
+        Waits up to `timeout` seconds for room in the queue (None = forever).
+        """
+        if self._closed:
+            raise RuntimeError("InferenceExecutor is closed")
+
+        future = Future()
+        try:
+            self._queue.put((batch, future, time.perf_counter()), timeout=timeout)
+        except queue.Full:
+            raise TimeoutError(f"Inference queue is full ({self._queue.maxsize} batches waiting)")
+        return future
+
+    def predict(self, batch: np.ndarray, verbose: int = 0, timeout: float = None,
+                cancellation=None) -> np.ndarray:
+        """
+        Run `batch` on the next free replica and wait for its output.
+        A cancelled `cancellation` token (see async_support.py) drops the
+        call if it is still queued.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        future = self.submit(batch, timeout)
+        if cancellation is not None:
+            cancellation.track(future)
+        try:
+            return future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Skipped if no replica has picked it up yet; otherwise the output is discarded
+            if not future.cancel():
+                # The replica is still reading `batch`, which may be this thread's
+                # reusable buffer: give the next request on this thread a fresh one
+                release_batch_buffer()
+            raise TimeoutError(f"Inference timed out after {timeout * 1000:.0f}ms")
+
+    def stats(self) -> Dict:
+        return {
+            'replicas': len(self.replicas),
+            'busy': self._busy,
+            'queued': self._queue.qsize(),
+            'timeout_ms': None if self.timeout is None else self.timeout * 1000,
+        }
+
+    def close(self, timeout: float = None):
+        """Stop accepting work, finish what is queued and stop the workers"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self, replica):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+
+            batch, future, queued_at = entry
+            # Skip batches whose callers already gave up
+            if not future.set_running_or_notify_cancel():
+                continue
+            metrics.observe('stage_seconds', time.perf_counter() - queued_at, stage='queue', kind=self.kind)
+
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                future.set_result(replica.predict(batch, verbose=0))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
@@ -0,0 +1,93 @@
+"""
+Compiled multi-pattern keyword matcher.
+Finds every weighted keyword hit in one pass over the text, on word boundaries.
+"""
+
+import re
+from typing import Dict, List
+
+# Plurals the regular rules below do not produce
+IRREGULAR_PLURALS = {'leaf': 'leaves', 'knife': 'knives', 'shelf': 'shelves', 'loaf': 'loaves', 'mouse': 'mice'}
+
+
+def plural(word: str) -> str:
+    """Regular English plural: 'es' after s/x/z/ch/sh, 'ies' after consonant + y, else 's'"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        return word + 'es'
+    if len(word) > 1 and word.endswith('y') and word[-2] not in 'aeiou':
+        return word[:-1] + 'ies'
+    return word + 's'
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, replace punctuation with spaces and collapse whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+class KeywordMatcher:
+    """
+    Scores text against weighted keyword tables of the form
+    {category: {tier: [keywords]}} with {tier: weight}.
+
+    Keywords are compiled once into a hash table of word n-grams, so a text
+    is matched in a single pass over its words with at most `max_words`
+    lookups per word, independent of the number of keywords. Matching is on
+    whole words, so 'can' no longer matches 'scan' or 'cancer', and
+    multi-word keys like 'food waste' match regardless of spacing. The
+    regular plural of a keyword's last word ('bottles', 'glasses',
+    'batteries') still matches it, but no other suffixed forms
+    ('canes' is not 'can'). Each
+    keyword counts once per text, like the original substring scoring.
+    """
+
+    def __init__(self, keyword_tables: Dict[str, Dict[str, List[str]]], weights: Dict[str, int]):
+        self.categories = list(keyword_tables.keys())
+
+        # keyword -> [(category, weight), ...]
+        self.keyword_weights = {}
+        for category, tiers in keyword_tables.items():
+            for tier, keywords in tiers.items():
+                for keyword in keywords:
+                    key = normalize_text(keyword)
+                    if key:
+                        self.keyword_weights.setdefault(key, []).append((category, weights[tier]))
+
+        # Surface form (the keyword and its plural) -> keyword; an exact keyword wins over a plural
+        self.lookup = {}
+        for key in self.keyword_weights:
+            head, _, last = key.rpartition(' ')
+            self.lookup.setdefault(f"{head} {plural(last)}" if head else plural(last), key)
+        for key in self.keyword_weights:
+            self.lookup[key] = key
+        self.max_words = max((len(key.split()) for key in self.keyword_weights), default=0)
+
+    def find(self, text: str) -> set:
+        """Return the set of normalized keywords present in normalized `text`"""
+        words = text.split()
+        lookup = self.lookup
+        found = set()
+        for i in range(len(words)):
+            phrase = words[i]
+            for n in range(self.max_words):
+                if n:
+                    if i + n >= len(words):
+                        break
+                    phrase = phrase + ' ' + words[i + n]
+                key = lookup.get(phrase)
+                if key is not None:
+                    found.add(key)
+        return found
+
+    def score(self, text: str) -> Dict[str, int]:
+        """Weighted score per category for already-normalized `text`"""
+        scores = {category: 0 for category in self.categories}
+        for key in self.find(text):
+            for category, weight in self.keyword_weights[key]:
+                scores[category] += weight
+        return scores
+
+    def score_batch(self, texts: List[str]) -> List[Dict[str, int]]:
+        """Score many already-normalized texts"""
+        return [self.score(text) for text in texts]
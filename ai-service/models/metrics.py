@@ -0,0 +1,191 @@
+"""
+Lightweight metrics for the classification paths.
+Counters and histograms rendered in the Prometheus text format, plus hooks for other sinks.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# Seconds; from sub-millisecond decode stages up to slow first predictions
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+# Differing bits between perceptual hashes (of 64)
+DISTANCE_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 24, 32)
+
+# Metric name -> (type, help, buckets)
+METRICS = {
+    'stage_seconds': ('histogram', 'Time spent per classification stage', LATENCY_BUCKETS),
+    'batch_size': ('histogram', 'Images or texts per model call', BATCH_SIZE_BUCKETS),
+    'request_seconds': ('histogram', 'HTTP request latency by endpoint', LATENCY_BUCKETS),
+    'near_duplicate_distance': ('histogram', 'Distance to the nearest earlier image hash', DISTANCE_BUCKETS),
+    'classifications_total': ('counter', 'Classifications computed (cache misses), by answering method', None),
+    'cache_requests_total': ('counter', 'Result cache lookups by outcome', None),
+    'errors_total': ('counter', 'Failures that triggered a fallback, by stage', None),
+    'rejected_total': ('counter', 'Images refused before decoding, by reason', None),
+    'model_reloads_total': ('counter', 'Model version reloads, swapped in or rolled back', None),
+    'shadow_comparisons_total': ('counter', 'Requests mirrored to the second model, by outcome', None),
+    'requests_total': ('counter', 'HTTP requests by endpoint and status', None),
+}
+PREFIX = 'waste_ai_'
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    In-process metrics registry.
+
+    When disabled, `timer()` returns a shared no-op context manager and
+    `observe` / `increment` return immediately; hot paths additionally
+    check `enabled` before taking timestamps, so the cost is one
+    attribute read.
+
+    Hooks are callables `hook(kind, name, value, labels)` invoked for every
+    observation ('histogram') and increment ('counter'), e.g. to forward
+    to StatsD or a tracing system.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._series = {}
+        self._hooks: List[Callable] = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_hook(self, hook: Callable[[str, str, float, Dict[str, str]], None]):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a histogram sample"""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Histogram(METRICS[name][2])
+            series.observe(value)
+        for hook in self._hooks:
+            hook('histogram', name, value, labels)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+        for hook in self._hooks:
+            hook('counter', name, amount, labels)
+
+    def timer(self, stage: str, **labels):
+        """Context manager observing 'stage_seconds' for `stage`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, tuple], object]:
+        """Copy of every series: counter values, histogram (buckets, counts, sum, count)"""
+        with self._lock:
+            return {key: value if not isinstance(value, _Histogram)
+                    else (value.buckets, list(value.counts), value.sum, value.count)
+                    for key, value in self._series.items()}
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, (kind, help_text, _) in METRICS.items():
+            series = sorted((labels, value) for (series_name, labels), value in snapshot.items()
+                            if series_name == name)
+            if not series:
+                continue
+            full_name = PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f"{full_name}{_labels(labels)} {value}")
+                    continue
+                buckets, counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{full_name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_labels(labels)} {total}")
+                lines.append(f"{full_name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _key(name: str, labels: Dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'labels', 'start')
+
+    def __init__(self, metrics: Metrics, stage: str, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe('stage_seconds', time.perf_counter() - self.start, stage=self.stage, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# Process-wide registry used by the classifiers; AI_METRICS=1 turns it on
+metrics = Metrics(enabled=os.getenv('AI_METRICS', '0') == '1')
@@ -0,0 +1,240 @@
+"""
+Model Registry
+Versioned image model directories with a manifest (architecture, input size, class map,
+training metrics, checksums) and a pointer to the version the service should run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.inference_backends import ONNX_MODEL_PATH, TFLITE_MODEL_PATH
+from models.preprocessing import INPUT_SIZE
+
+REGISTRY_DIR = 'models/registry'
+MANIFEST_FILE = 'manifest.json'
+POINTER_FILE = 'CURRENT.json'
+
+# What train_model.py and export_model.py write; registered as a new version
+KERAS_MODEL_PATH = 'models/waste_classifier_v1.h5'
+CLASS_INDICES_PATH = 'models/class_indices.json'
+METRICS_PATH = 'models/metrics.json'
+
+# Backend -> artifact file inside a version directory
+ARTIFACT_FILES = {'tflite': 'model.tflite', 'onnx': 'model.onnx', 'keras': 'model.h5'}
+
+
+def file_checksum(path: str) -> str:
+    """sha256 of a file, read in 1MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: Dict):
+    """Write to a temporary file and rename, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """
+    Image model versions under `root`, one directory each:
+
+        models/registry/
+            CURRENT.json        {"version": "v3", "previous": "v2", ...}
+            v3/manifest.json    architecture, input size, class map, metrics, checksums
+            v3/model.h5         and/or model.tflite, model.onnx
+
+    Version directories are written under a temporary name and renamed
+    when complete, and never modified afterwards. The service runs the
+    version named in CURRENT.json (see ImageClassifier.reload); promoting
+    another one only rewrites that pointer.
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    def versions(self) -> List[str]:
+        """Registered versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        versions = [name for name in os.listdir(self.root)
+                    if os.path.exists(os.path.join(self.root, name, MANIFEST_FILE))]
+        return sorted(versions, key=lambda version: (self.manifest(version)['created'], version))
+
+    def manifest(self, version: str) -> Dict:
+        path = os.path.join(self.root, version, MANIFEST_FILE)
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown model version '{version}'")
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _pointer(self) -> Dict:
+        try:
+            with open(os.path.join(self.root, POINTER_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def current(self) -> Optional[str]:
+        """The version the service should run, or None before anything was promoted"""
+        return self._pointer().get('version')
+
+    def previous(self) -> Optional[str]:
+        return self._pointer().get('previous')
+
+    def artifact_paths(self, version: str) -> Dict[str, str]:
+        """Backend -> path of each artifact of `version`"""
+        manifest = self.manifest(version)
+        return {backend: os.path.join(self.root, version, filename)
+                for backend, filename in manifest['artifacts'].items()}
+
+    def verify(self, version: str):
+        """Raise ValueError unless every artifact of `version` matches its manifest checksum"""
+        manifest = self.manifest(version)
+        for filename, checksum in manifest['checksums'].items():
+            path = os.path.join(self.root, version, filename)
+            if not os.path.exists(path):
+                raise ValueError(f"Model {version}: {filename} is missing")
+            if file_checksum(path) != checksum:
+                raise ValueError(f"Model {version}: {filename} does not match its checksum")
+
+    def register(self, model_path: str = KERAS_MODEL_PATH, class_indices_path: str = CLASS_INDICES_PATH,
+                 metrics_path: str = METRICS_PATH, exports: Dict[str, str] = None,
+                 version: str = None) -> str:
+        """
+        Copy a trained model (and the exports passed in, backend -> path)
+        into a new version directory and write its manifest. Returns the
+        version name (default: v1, v2, ...). Does not promote it.
+
+        Exports are never picked up implicitly: files in models/ may come
+        from another model or predate a retrain, and the service prefers
+        them over the .h5.
+        """
+        artifacts = dict(exports or {})
+        if model_path and os.path.exists(model_path):
+            artifacts['keras'] = model_path
+        if not artifacts:
+            raise ValueError("No model artifacts to register")
+
+        with open(class_indices_path, 'r') as f:
+            class_indices = json.load(f)
+        training_metrics = {}
+        if metrics_path and os.path.exists(metrics_path):
+            with open(metrics_path, 'r') as f:
+                training_metrics = json.load(f)
+
+        if version is None:
+            numbers = [int(name[1:]) for name in self.versions() if name[:1] == 'v' and name[1:].isdigit()]
+            version = f"v{max(numbers, default=0) + 1}"
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise ValueError(f"Model version '{version}' already exists")
+
+        staging = os.path.join(self.root, f".{version}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        checksums = {}
+        for backend, path in artifacts.items():
+            filename = ARTIFACT_FILES[backend]
+            shutil.copyfile(path, os.path.join(staging, filename))
+            checksums[filename] = file_checksum(os.path.join(staging, filename))
+
+        manifest = {
+            'version': version,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'architecture': training_metrics.get('model_architecture', 'unknown'),
+            'input_size': list(training_metrics.get('image_size', INPUT_SIZE)),
+            'class_indices': class_indices,
+            'metrics': training_metrics,
+            'artifacts': {backend: ARTIFACT_FILES[backend] for backend in artifacts},
+            'checksums': checksums,
+        }
+        _write_json(os.path.join(staging, MANIFEST_FILE), manifest)
+        os.rename(staging, target)
+        return version
+
+    def promote(self, version: str):
+        """Point the service at `version` (checked first); running services pick it up on their next reload"""
+        self.verify(version)
+        current = self.current()
+        if version == current:
+            return
+        _write_json(os.path.join(self.root, POINTER_FILE), {
+            'version': version,
+            'previous': current,
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+
+    def rollback(self) -> str:
+        """Point the service back at the previously promoted version"""
+        previous = self.previous()
+        if previous is None:
+            raise ValueError("No previous model version to roll back to")
+        self.promote(previous)
+        return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage versioned image models')
+    parser.add_argument('--root', default=REGISTRY_DIR, help='Registry directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    register = commands.add_parser('register', help='Register the trained model (and exports) as a new version')
+    register.add_argument('--model', default=KERAS_MODEL_PATH, help='Keras model to register')
+    register.add_argument('--tflite', nargs='?', const=TFLITE_MODEL_PATH, metavar='PATH',
+                          help=f'Also bundle this TFLite export of the model (default path: {TFLITE_MODEL_PATH})')
+    register.add_argument('--onnx', nargs='?', const=ONNX_MODEL_PATH, metavar='PATH',
+                          help=f'Also bundle this ONNX export of the model (default path: {ONNX_MODEL_PATH})')
+    register.add_argument('--version', help='Version name (default: next vN)')
+    register.add_argument('--promote', action='store_true', help='Also make it the current version')
+    commands.add_parser('list', help='List versions')
+    promote = commands.add_parser('promote', help='Make a version current')
+    promote.add_argument('version')
+    commands.add_parser('rollback', help='Make the previous version current again')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    try:
+        if args.command == 'register':
+            exports = {name: path for name, path in (('tflite', args.tflite), ('onnx', args.onnx)) if path}
+            missing = [path for path in exports.values() if not os.path.exists(path)]
+            if missing:
+                raise ValueError(f"Export not found: {', '.join(missing)}")
+            version = registry.register(args.model, exports=exports, version=args.version)
+            print(f"✅ Registered model {version}: {os.path.join(args.root, version)}")
+            if args.promote:
+                registry.promote(version)
+                print(f"🚀 {version} is now current")
+        elif args.command == 'list':
+            current = registry.current()
+            for version in registry.versions():
+                manifest = registry.manifest(version)
+                accuracy = manifest['metrics'].get('test_accuracy')
+                print(f"{'*' if version == current else ' '} {version:<8} {manifest['created']}  "
+                      f"{manifest['architecture']:<12} {'/'.join(manifest['artifacts'])}"
+                      + (f"  accuracy {accuracy:.2%}" if accuracy is not None else ''))
+        elif args.command == 'promote':
+            registry.promote(args.version)
+            print(f"🚀 {args.version} is now current")
+        else:
+            print(f"↩️  Rolled back to {registry.rollback()}")
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
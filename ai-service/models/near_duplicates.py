@@ -0,0 +1,153 @@
+"""
+Perceptual-hash index of earlier image classifications.
+dHash of the already-resized image, matched by Hamming distance with multi-index hashing.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from models.metrics import metrics
+
+HASH_BITS = 64
+
+
+def dhash(image: np.ndarray, min_contrast: float = 0.0) -> int:
+    """
+    64-bit difference hash of an H x W x 3 image at any scale or offset
+    (e.g. a normalized row of a batch buffer). The grayscale image is
+    averaged into 8 rows x 9 columns; each bit says whether a cell is
+    brighter than its right-hand neighbour. Returns 0 for images whose
+    cells differ by no more than `min_contrast` (in the image's units):
+    the bits of a near-uniform image are noise.
+    """
+    height, width = image.shape[:2]
+    row_edges = np.linspace(0, height, 9, dtype=int)
+    column_edges = np.linspace(0, width, 10, dtype=int)
+
+    # Sum rows first, over contiguous memory, and channels last, over 72 values;
+    # reducing the channels of the full image first is several times slower
+    flat = image.reshape(height, -1)
+    if height % 8 == 0:
+        rows = flat.reshape(8, height // 8, -1).sum(axis=1, dtype=np.float32)
+    else:
+        rows = np.add.reduceat(flat, row_edges[:-1], axis=0, dtype=np.float32)
+    sums = np.add.reduceat(rows.reshape(8, width, -1), column_edges[:-1], axis=1).sum(axis=2)
+    # Cells are not all the same size (224 / 9), so compare means rather than sums
+    cells = sums / (np.diff(column_edges) * np.diff(row_edges)[:, None] * image.shape[2])
+
+    if cells.max() - cells.min() <= min_contrast:
+        return 0
+    bits = cells[:, :-1] > cells[:, 1:]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class NearDuplicateIndex:
+    """
+    Results stored by perceptual hash and found again for any hash within
+    `max_distance` differing bits.
+
+    Multi-index hashing: the 64 bits are split into max_distance + 1
+    chunks, one hash table each. A hash within max_distance of a stored
+    one must agree with it exactly on at least one chunk, so only the
+    entries sharing a chunk are compared. At most `max_entries` hashes are
+    kept, evicting the least recently matched.
+
+    For tuning, `stats()` includes how often each distance was the nearest
+    one found; beyond `max_distance` only entries sharing a chunk are seen,
+    so those counts are a sample.
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 20000):
+        if not 0 <= max_distance < HASH_BITS // 2:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS // 2 - 1}")
+
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+
+        chunks = max_distance + 1
+        self._chunks = []
+        shift = 0
+        for i in range(chunks):
+            bits = HASH_BITS // chunks + (1 if i < HASH_BITS % chunks else 0)
+            self._chunks.append((shift, (1 << bits) - 1))
+            shift += bits
+        self._tables = [{} for _ in self._chunks]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.distances: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, image_hash: int) -> Optional[Tuple[object, int]]:
+        """(result, distance) of the nearest stored hash within max_distance, or None"""
+        with self._lock:
+            nearest, distance = None, HASH_BITS + 1
+            seen = set()
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                for candidate in table.get((image_hash >> shift) & mask, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    candidate_distance = bin(image_hash ^ candidate).count('1')
+                    if candidate_distance < distance:
+                        nearest, distance = candidate, candidate_distance
+
+            if nearest is not None:
+                self.distances[distance] = self.distances.get(distance, 0) + 1
+            if nearest is None or distance > self.max_distance:
+                self.misses += 1
+                match = None
+            else:
+                self.hits += 1
+                self._entries.move_to_end(nearest)
+                match = self._entries[nearest], distance
+
+        if nearest is not None:
+            metrics.observe('near_duplicate_distance', distance)
+        metrics.increment('cache_requests_total', kind='near_duplicate', result='hit' if match else 'miss')
+        return match
+
+    def add(self, image_hash: int, result):
+        with self._lock:
+            if image_hash in self._entries:
+                self._entries[image_hash] = result
+                self._entries.move_to_end(image_hash)
+                return
+
+            self._entries[image_hash] = result
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                table.setdefault((image_hash >> shift) & mask, set()).add(image_hash)
+
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                for (shift, mask), table in zip(self._chunks, self._tables):
+                    key = (oldest >> shift) & mask
+                    bucket = table[key]
+                    bucket.discard(oldest)
+                    if not bucket:
+                        del table[key]
+
+    def clear(self):
+        """Forget every entry, e.g. after the model changed; counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_distance': self.max_distance,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'nearest_distances': dict(sorted(self.distances.items())),
+        }
@@ -0,0 +1,311 @@
+"""
+Model Optimization Script
+Channel pruning with short fine-tuning and int8 post-training quantization of the
+trained waste classifier; every variant is re-scored with the test-set classification
+report and only one within the allowed accuracy drop is kept
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from models.data_pipeline import build_dataset
+from models.dataset_shards import list_split
+from models.export_model import KERAS_MODEL_PATH, VALIDATION_DIR, export_tflite, list_images, load_batch, \
+    measure_backend
+from models.inference_backends import TFLiteBackend
+from models.model_registry import CLASS_INDICES_PATH, METRICS_PATH, ModelRegistry
+
+TEST_DIR = 'datasets/test'
+OUTPUT_DIR = 'models/optimized'
+REPORT_PATH = 'models/optimize_report.json'
+
+IMG_SIZE = (224, 224)
+BATCH_SIZE = 32
+NUM_CLASSES = 6
+FINE_TUNE_LEARNING_RATE = 1e-5
+# Test images decoded per predict call while scoring
+EVAL_CHUNK = 64
+# MobileNetV2 inverted-residual layers whose expansion channels are pruned together
+EXPAND_LAYER = re.compile(r'(block_\d+)_expand')
+BLOCK_LAYER = re.compile(r'(block_\d+)_(expand|expand_BN|depthwise|depthwise_BN|project)')
+
+
+def iter_layers(model):
+    """All layers, descending into nested models such as the MobileNetV2 backbone"""
+    for layer in model.layers:
+        if hasattr(layer, 'layers'):
+            yield from iter_layers(layer)
+        else:
+            yield layer
+
+
+def select_channels(model, fraction: float) -> Dict[str, np.ndarray]:
+    """
+    Expansion channels to keep in every MobileNetV2 inverted-residual block
+    (block_N_expand -> depthwise -> block_N_project), by block name. A
+    channel's importance is its depthwise BatchNormalization scale times the
+    L1 norm of its projection weights; the least important `fraction` is
+    dropped, keeping a multiple of 8 channels (SIMD width) and at least 8.
+    """
+    by_name = {layer.name: layer for layer in iter_layers(model)}
+    kept = {}
+    for name in by_name:
+        match = EXPAND_LAYER.fullmatch(name)
+        if not match:
+            continue
+        block = match.group(1)
+        gamma = np.abs(by_name[f"{block}_depthwise_BN"].get_weights()[0])
+        projection = np.abs(by_name[f"{block}_project"].get_weights()[0]).sum(axis=(0, 1, 3))
+        importance = gamma * projection
+        keep = max(8, int(round(len(importance) * (1 - fraction) / 8)) * 8)
+        kept[block] = np.sort(np.argsort(importance)[::-1][:keep])
+    if not kept:
+        raise ValueError("Channel pruning needs a MobileNetV2 backbone (block_N_expand layers)")
+    return kept
+
+
+def shrink(model, kept: Dict[str, np.ndarray]):
+    """
+    Rebuild `model` with only the `kept` expansion channels: the expand
+    convolution, both BatchNormalizations, the depthwise kernel and the
+    projection's input lose the dropped channels, so every later call does
+    less work. Block outputs and residual connections keep their width.
+    """
+    from tensorflow import keras
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        match = EXPAND_LAYER.fullmatch(layer.name)
+        if match:
+            config['filters'] = len(kept[match.group(1)])
+        return layer.__class__.from_config(config)
+
+    pruned = keras.models.clone_model(model, clone_function=clone_layer, recursive=True)
+    original = {layer.name: layer for layer in iter_layers(model)}
+    for layer in iter_layers(pruned):
+        if not layer.weights:
+            continue
+        weights = original[layer.name].get_weights()
+        match = BLOCK_LAYER.fullmatch(layer.name)
+        if match:
+            channels, part = kept[match.group(1)], match.group(2)
+            if part == 'expand':
+                weights = [weights[0][..., channels]]
+            elif part.endswith('_BN'):
+                weights = [w[channels] for w in weights]
+            else:
+                # Depthwise kernel (3, 3, C, 1) and projection kernel (1, 1, C, out)
+                weights = [weights[0][:, :, channels, :]] + weights[1:]
+        layer.set_weights(weights)
+    return pruned
+
+
+def prune(model, fraction: float, train_dataset, epochs: int):
+    """
+    Remove the least important `fraction` of expansion channels from every
+    block (see select_channels), then fine-tune the smaller model briefly
+    to recover accuracy. Returns (pruned model, fraction of expansion
+    channels actually removed).
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    kept = select_channels(model, fraction)
+    total = sum(int(layer.kernel.shape[-1]) for layer in iter_layers(model) if EXPAND_LAYER.fullmatch(layer.name))
+    removed = 1 - sum(len(channels) for channels in kept.values()) / total
+    pruned = shrink(model, kept)
+
+    # Fine-tune every layer except BatchNormalization, whose statistics stay frozen
+    pruned.trainable = True
+    for layer in iter_layers(pruned):
+        if isinstance(layer, layers.BatchNormalization):
+            layer.trainable = False
+    pruned.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=FINE_TUNE_LEARNING_RATE),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    pruned.fit(train_dataset, epochs=epochs, verbose=1)
+    return pruned, removed
+
+
+def predict_test(backend_name: str, path: str, test_paths):
+    """Class probabilities for every test image, preprocessed exactly as in serving"""
+    if backend_name == 'tflite':
+        model = TFLiteBackend(path)
+    else:
+        from tensorflow import keras
+        model = keras.models.load_model(path)
+    return np.concatenate([np.asarray(model.predict(load_batch(test_paths[start:start + EVAL_CHUNK]), verbose=0))
+                           for start in range(0, len(test_paths), EVAL_CHUNK)])
+
+
+def score(name: str, backend_name: str, path: str, test_paths, test_labels, class_names):
+    """Classification report, size and latency of one saved variant"""
+    from sklearn.metrics import classification_report
+
+    predicted = np.argmax(predict_test(backend_name, path, test_paths), axis=1)
+    report = classification_report(test_labels, predicted, labels=list(range(len(class_names))),
+                                   target_names=class_names, output_dict=True, zero_division=0)
+    print(f"\n📊 {name}")
+    print(classification_report(test_labels, predicted, labels=list(range(len(class_names))),
+                                target_names=class_names, zero_division=0))
+
+    with open(path, 'rb') as f:
+        compressed = len(gzip.compress(f.read()))
+    # Latency and peak memory in a fresh process, on a few test images
+    timing = measure_backend(backend_name, path, load_batch(test_paths[:BATCH_SIZE]), repeats=30)
+    timing.pop('predictions')
+    return {
+        'path': path,
+        'backend': backend_name,
+        'accuracy': report['accuracy'],
+        'macro_f1': report['macro avg']['f1-score'],
+        'recall': {name: report[name]['recall'] for name in class_names},
+        'size_mb': os.path.getsize(path) / (1024 * 1024),
+        'gzip_mb': compressed / (1024 * 1024),
+        **timing,
+        'classification_report': report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prune and int8-quantize the waste classifier under an accuracy gate')
+    parser.add_argument('--model', default=KERAS_MODEL_PATH, help='Trained Keras model to optimize')
+    parser.add_argument('--class-indices', default=CLASS_INDICES_PATH,
+                        help="The model's class map (its output order)")
+    parser.add_argument('--prune-fraction', default='0.3',
+                        help='Fractions of expansion channels removed from every MobileNetV2 block, '
+                             'one pruned variant each, comma separated (e.g. 0.2,0.3,0.5)')
+    parser.add_argument('--prune-epochs', type=int, default=2, help='Fine-tuning epochs while pruning')
+    parser.add_argument('--calibration-images', type=int, default=200,
+                        help='Validation images used for int8 calibration')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help='Largest test accuracy drop (absolute) a kept variant may have')
+    parser.add_argument('--max-class-drop', type=float, default=0.05,
+                        help='Largest drop in any single class recall a kept variant may have')
+    parser.add_argument('--register', action='store_true',
+                        help='Register the kept variant in the model registry as a new version')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("✂️  Waste Classifier Pruning and Quantization")
+    print("=" * 60)
+
+    from tensorflow import keras
+
+    # Label every split with the model's own output order: the test split may lack classes
+    with open(args.class_indices, 'r') as f:
+        class_indices = json.load(f)
+    class_names = sorted(class_indices, key=class_indices.get)
+    test_paths, test_labels, _ = list_split(TEST_DIR, class_indices)
+    calibration_paths = list_images(VALIDATION_DIR)[:args.calibration_images]
+    train_dataset, train_labels, _ = build_dataset('datasets/train', IMG_SIZE, BATCH_SIZE, NUM_CLASSES,
+                                                   training=True, class_indices=class_indices)
+    print(f"✅ Test images: {len(test_paths)}, calibration images: {len(calibration_paths)}, "
+          f"fine-tuning images: {len(train_labels)}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    variants = {'float32': ('keras', args.model)}
+
+    print("\n⚙️  Quantizing the original model (int8)...")
+    int8_path = os.path.join(OUTPUT_DIR, 'waste_classifier_int8.tflite')
+    export_tflite(keras.models.load_model(args.model), int8_path, 'int8', calibration_paths)
+    variants['int8'] = ('tflite', int8_path)
+
+    channels_removed = {}
+    for fraction in [float(value) for value in args.prune_fraction.split(',')]:
+        name = f"pruned{fraction * 100:.0f}"
+        print(f"\n✂️  Removing {fraction:.0%} of the expansion channels, then {args.prune_epochs} fine-tuning epochs...")
+        model, channels_removed[name] = prune(keras.models.load_model(args.model), fraction, train_dataset,
+                                              args.prune_epochs)
+        path = os.path.join(OUTPUT_DIR, f"waste_classifier_{name}.h5")
+        model.save(path, include_optimizer=False)
+        variants[name] = ('keras', path)
+
+        print(f"⚙️  Quantizing {name} (int8)...")
+        path = os.path.join(OUTPUT_DIR, f"waste_classifier_{name}_int8.tflite")
+        export_tflite(model, path, 'int8', calibration_paths)
+        variants[f"{name}-int8"] = ('tflite', path)
+        channels_removed[f"{name}-int8"] = channels_removed[name]
+
+    results = {name: score(name, backend_name, path, test_paths, test_labels, class_names)
+               for name, (backend_name, path) in variants.items()}
+
+    baseline = results['float32']
+    for name, result in results.items():
+        result['channels_removed'] = channels_removed.get(name, 0.0)
+        result['accuracy_drop'] = baseline['accuracy'] - result['accuracy']
+        result['worst_class_drop'] = max(baseline['recall'][c] - result['recall'][c] for c in class_names)
+        result['passed'] = (result['accuracy_drop'] <= args.max_accuracy_drop
+                            and result['worst_class_drop'] <= args.max_class_drop)
+
+    print(f"\n{'Variant':<16} {'Pruned':>8} {'Accuracy':>9} {'Drop':>7} {'Class drop':>11} {'Size MB':>8} "
+          f"{'gzip MB':>8} {'p50 ms':>7} {'Batch ms/img':>13} {'RSS MB':>7}  Gate")
+    for name, r in results.items():
+        print(f"{name:<16} {r['channels_removed']:>8.0%} {r['accuracy']:>8.2%} {r['accuracy_drop']:>+7.1%} "
+              f"{r['worst_class_drop']:>+11.1%} {r['size_mb']:>8.1f} {r['gzip_mb']:>8.1f} {r['latency_ms_p50']:>7.2f} "
+              f"{r['batch_ms_per_image']:>13.2f} {r['peak_rss_mb']:>7.0f}  {'✅' if r['passed'] else '❌'}")
+
+    # Smallest passing artifact (as shipped, then compressed), then the fastest; the original always passes
+    kept = min((name for name, r in results.items() if r['passed']),
+               key=lambda name: (round(results[name]['size_mb'], 1), results[name]['gzip_mb'],
+                                 results[name]['batch_ms_per_image']))
+    report = {
+        'max_accuracy_drop': args.max_accuracy_drop,
+        'max_class_drop': args.max_class_drop,
+        'kept': kept,
+        'variants': results,
+    }
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report saved: {REPORT_PATH}")
+
+    if kept == 'float32':
+        print(f"⚠️  No optimized variant stays within {args.max_accuracy_drop:.1%} accuracy "
+              f"({args.max_class_drop:.1%} per class); keep the original model")
+        print("=" * 60)
+        return
+
+    backend_name, path = variants[kept]
+    extension = '.tflite' if backend_name == 'tflite' else '.h5'
+    output_path = os.path.join(OUTPUT_DIR, f"waste_classifier_optimized{extension}")
+    shutil.copyfile(path, output_path)
+    print(f"✅ Kept {kept}: {output_path} ({results[kept]['accuracy']:.2%} accuracy, "
+          f"{results[kept]['size_mb']:.1f} MB vs {baseline['size_mb']:.1f} MB)")
+
+    if args.register:
+        training_metrics = {}
+        if os.path.exists(METRICS_PATH):
+            with open(METRICS_PATH, 'r') as f:
+                training_metrics = json.load(f)
+        metrics_path = os.path.join(OUTPUT_DIR, 'metrics.json')
+        with open(metrics_path, 'w') as f:
+            json.dump({
+                **training_metrics,
+                'test_accuracy': results[kept]['accuracy'],
+                'model_architecture': f"{training_metrics.get('model_architecture', 'MobileNetV2')}+{kept}",
+                'image_size': IMG_SIZE,
+                'optimized_from': args.model,
+            }, f, indent=2)
+        if backend_name == 'tflite':
+            version = ModelRegistry().register(None, args.class_indices, metrics_path,
+                                               exports={'tflite': output_path})
+        else:
+            version = ModelRegistry().register(output_path, args.class_indices, metrics_path)
+        print(f"✅ Registered as model {version} (python models/model_registry.py promote {version})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
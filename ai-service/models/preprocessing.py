@@ -0,0 +1,184 @@
+"""
+Shared image preprocessing for waste classification models.
+Decodes uploads straight into preallocated float32 batch buffers.
+"""
+
+import io
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+# Model input size (width, height)
+INPUT_SIZE = (224, 224)
+
+# Uploads declaring more pixels than this are refused from the header alone
+MAX_IMAGE_PIXELS = 50_000_000
+# Pixels actually decoded, after JPEG draft downscaling; bounds decode time and memory
+MAX_DECODE_PIXELS = 16_000_000
+ALLOWED_FORMATS = frozenset({'JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'BMP'})
+# Large images are first shrunk by an integer factor (box filter) before the final resample
+RESIZE_REDUCING_GAP = 3.0
+
+_thread_buffers = threading.local()
+
+
+class ImageRejected(ValueError):
+    """
+    An image refused before decoding. `code` is a stable reason:
+    empty_image, invalid_image, unsupported_format, truncated_image or
+    image_too_large.
+    """
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def preflight_image(image_bytes: bytes, size=INPUT_SIZE) -> Image.Image:
+    """
+    Parse only the header and refuse images that should not be decoded:
+    unreadable or unsupported formats, missing end-of-image markers, and
+    dimensions above MAX_IMAGE_PIXELS. JPEGs are switched to draft mode
+    for `size` first, so a huge JPEG passes when it can be decoded at
+    1/2-1/8 scale within MAX_DECODE_PIXELS. Returns the opened, not yet
+    decoded image; raises ImageRejected.
+    """
+    if not image_bytes:
+        raise ImageRejected('empty_image', "Empty image upload")
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+    except Image.DecompressionBombError as e:
+        raise ImageRejected('image_too_large', str(e))
+    except Exception:
+        raise ImageRejected('invalid_image', "Not a readable image")
+
+    if image.format not in ALLOWED_FORMATS:
+        raise ImageRejected('unsupported_format', f"Unsupported image format: {image.format}")
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageRejected('image_too_large',
+                            f"Image is {width}x{height}; the limit is {MAX_IMAGE_PIXELS // 1_000_000} megapixels")
+
+    # A missing end marker means the upload was cut off; the decoder would fail (or pad) late
+    end_marker = {'JPEG': b'\xff\xd9', 'MPO': b'\xff\xd9', 'PNG': b'IEND'}.get(image.format)
+    if end_marker is not None and image_bytes.rfind(end_marker) == -1:
+        raise ImageRejected('truncated_image', f"Incomplete {image.format} data")
+
+    # Only affects JPEG; picks the smallest scale that is still >= size
+    image.draft('RGB', size)
+
+    width, height = image.size
+    if width * height > MAX_DECODE_PIXELS:
+        raise ImageRejected('image_too_large',
+                            f"Image is {width}x{height}; at most {MAX_DECODE_PIXELS // 1_000_000} megapixels "
+                            f"are decoded for {image.format}")
+
+    return image
+
+
+def load_image(image_bytes: bytes, size=INPUT_SIZE, timings: dict = None) -> Image.Image:
+    """
+    Decode and resize an image to `size` in RGB, after preflight_image.
+
+    For JPEGs, draft mode lets the decoder downscale by 1/2, 1/4 or 1/8 in
+    the DCT domain, so a 12 MP phone photo is never fully decoded just to be
+    shrunk to 224x224; other large images are reduced by an integer factor
+    before resampling. If `timings` is given, seconds spent decoding and
+    resizing are added to its 'decode' and 'resize' entries.
+    """
+    start = time.perf_counter() if timings is not None else 0.0
+    image = preflight_image(image_bytes, size)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if timings is not None:
+        image.load()
+        decoded = time.perf_counter()
+        timings['decode'] = timings.get('decode', 0.0) + decoded - start
+
+    if image.size != size:
+        image = image.resize(size, reducing_gap=RESIZE_REDUCING_GAP)
+
+    if timings is not None:
+        timings['resize'] = timings.get('resize', 0.0) + time.perf_counter() - decoded
+
+    return image
+
+
+def normalize_in_place(array: np.ndarray, model_type: str) -> np.ndarray:
+    """
+    Apply the normalization each model expects, without extra copies.
+
+    custom:    [0, 255] -> [0, 1]   (rescale=1./255 used in train_model.py)
+    mobilenet: [0, 255] -> [-1, 1]  (same as mobilenet_v2.preprocess_input)
+    """
+    if model_type == 'mobilenet':
+        array *= 1.0 / 127.5
+        array -= 1.0
+    else:
+        array *= 1.0 / 255.0
+    return array
+
+
+def preprocess_into(image_bytes: bytes, out: np.ndarray, model_type: str, timings: dict = None) -> np.ndarray:
+    """Decode one image into `out` (an HxWx3 float32 view) and normalize it"""
+    height, width = out.shape[:2]
+    image = load_image(image_bytes, (width, height), timings)
+
+    # uint8 -> float32 cast happens directly into the buffer
+    np.copyto(out, np.asarray(image), casting='unsafe')
+
+    return normalize_in_place(out, model_type)
+
+
+def batch_buffer(batch_size: int, size=INPUT_SIZE) -> np.ndarray:
+    """
+    Return a float32 (batch_size, H, W, 3) buffer.
+
+    Buffers are reused per thread and only grow, so steady-state batches
+    do not allocate. The contents are overwritten by the next call on the
+    same thread, so copy anything that must outlive the batch.
+    """
+    width, height = size
+    buffer = getattr(_thread_buffers, 'buffer', None)
+    if (buffer is None or buffer.shape[0] < batch_size
+            or buffer.shape[1:3] != (height, width)):
+        buffer = np.empty((batch_size, height, width, 3), dtype=np.float32)
+        _thread_buffers.buffer = buffer
+    return buffer[:batch_size]
+
+
+def release_batch_buffer():
+    """
+    Forget this thread's buffer so the next batch_buffer call allocates a new
+    one. Call it when another thread may still be reading the current buffer,
+    e.g. a model replica running a batch whose caller timed out.
+    """
+    _thread_buffers.buffer = None
+
+
+def preprocess_batch(images, model_type: str, size=INPUT_SIZE, timings: dict = None):
+    """
+    Preprocess a list of image bytes into one contiguous batch.
+
+    Returns (batch, positions, errors): `batch` holds only the images that
+    decoded successfully, `positions[k]` is the input index of `batch[k]`,
+    and `errors` maps failed input indexes to their exception. `timings`
+    accumulates decode/resize seconds as in load_image.
+    """
+    buffer = batch_buffer(len(images), size)
+    positions = []
+    errors = {}
+
+    for i, image_bytes in enumerate(images):
+        try:
+            # Failed images are overwritten by the next one, keeping the batch dense
+            preprocess_into(image_bytes, buffer[len(positions)], model_type, timings)
+            positions.append(i)
+        except Exception as e:
+            errors[i] = e
+
+    return buffer[:len(positions)], positions, errors
@@ -0,0 +1,148 @@
+"""
+Classification response payloads.
+Static per-category guidance is built and JSON-encoded once at import; responses project or splice it.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from models.waste_database import WASTE_DATABASE
+
+# Per-request fields, followed by the static guidance taken from WASTE_DATABASE
+DYNAMIC_FIELDS = ('category', 'confidence', 'detection_method')
+GUIDANCE_FIELDS = ('waste_name', 'examples', 'risk_level', 'risk_reason', 'storage', 'sanitization',
+                   'disposal', 'monitoring', 'tools_required', 'environmental_impact', 'pros_cons')
+RESPONSE_FIELDS = DYNAMIC_FIELDS + GUIDANCE_FIELDS
+
+# 'compact' carries what the Node server reads (convertToSimpleFormat); the
+# full guidance can be fetched separately and revalidated with guidance_etag
+PROFILES = ('full', 'compact')
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _full_guidance(category: str) -> Dict:
+    waste_info = WASTE_DATABASE.get(category, {})
+    return {
+        'waste_name': waste_info.get('name', category),
+        'examples': waste_info.get('examples', []),
+        'risk_level': waste_info.get('risk_level', 'Unknown'),
+        'risk_reason': waste_info.get('risk_reason', ''),
+        'storage': waste_info.get('storage', {}),
+        'sanitization': waste_info.get('sanitization', {}),
+        'disposal': waste_info.get('disposal', {}),
+        'monitoring': waste_info.get('monitoring', {}),
+        'tools_required': waste_info.get('tools_required', []),
+        'environmental_impact': waste_info.get('environmental_impact', {}),
+        'pros_cons': waste_info.get('pros_cons', {})
+    }
+
+
+class _Guidance:
+    """Guidance for one category in every profile, as dicts and as encoded JSON"""
+
+    def __init__(self, category: str):
+        full = _full_guidance(category)
+        self.json = _encode(full)
+        self.etag = '"' + hashlib.sha256(self.json).hexdigest()[:16] + '"'
+
+        methods = full['disposal'].get('methods', []) if isinstance(full['disposal'], dict) else []
+        compact = {
+            'waste_name': full['waste_name'],
+            'risk_level': full['risk_level'],
+            'risk_reason': full['risk_reason'],
+            'disposal': {'methods': methods[:1]},
+            'guidance_etag': self.etag,
+        }
+
+        self.fields = {'full': full, 'compact': compact}
+        # Encoded without the surrounding braces, ready to be spliced after the dynamic fields
+        self.body = {profile: _encode(value)[1:-1] for profile, value in self.fields.items()}
+
+
+_GUIDANCE = {category: _Guidance(category) for category in WASTE_DATABASE}
+
+
+def _guidance_for(category: str) -> _Guidance:
+    guidance = _GUIDANCE.get(category)
+    if guidance is None:
+        # Categories without a database entry (e.g. 'Medical Waste') are built once, on first use
+        guidance = _GUIDANCE.setdefault(category, _Guidance(category))
+    return guidance
+
+
+def has_guidance(category: str) -> bool:
+    """True for database categories and any category a classifier has returned"""
+    return category in _GUIDANCE
+
+
+def get_guidance(category: str) -> Tuple[bytes, str]:
+    """Pre-encoded full guidance JSON for a category and its ETag"""
+    guidance = _guidance_for(category)
+    return guidance.json, guidance.etag
+
+
+def parse_fields(fields: Union[None, str, Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """
+    Normalize a `fields=` selection ("a,b" or a list) and validate the names.
+    Returns None when no selection was made.
+    """
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = tuple(name.strip() for name in fields if name.strip())
+    if not fields:
+        return None
+
+    unknown = [name for name in fields if name not in RESPONSE_FIELDS + ('guidance_etag', 'probabilities')]
+    if unknown:
+        raise ValueError(f"Unknown response field(s): {', '.join(unknown)}")
+    return fields
+
+
+def build_response(category: str, confidence: float, method: str, profile: str = 'full',
+                   fields: Union[None, str, Iterable[str]] = None, extra: Optional[Dict] = None) -> Dict:
+    """
+    Response dict for a classification.
+
+    `profile` selects 'full' (every guidance field, the historical shape) or
+    'compact'. `fields` overrides the profile with an explicit selection.
+    `extra` holds additional per-request fields such as 'probabilities'.
+    The guidance values are shared between responses and must not be mutated.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown response profile: {profile}")
+    guidance = _guidance_for(category)
+
+    result = {'category': category, 'confidence': confidence, 'detection_method': method}
+    selected = parse_fields(fields)
+    if selected is None:
+        result.update(guidance.fields[profile])
+        if extra:
+            result.update(extra)
+        return result
+
+    available = {**result, **guidance.fields['full'], 'guidance_etag': guidance.etag, **(extra or {})}
+    return {name: available[name] for name in selected if name in available}
+
+
+def encode_response(category: str, confidence: float, method: str, profile: str = 'full',
+                    fields: Union[None, str, Iterable[str]] = None, extra: Optional[Dict] = None) -> bytes:
+    """
+    `build_response(...)` as JSON bytes.
+    For profiles only the per-request fields (and `extra`) are serialized;
+    the guidance bytes encoded at import are spliced in after them.
+    """
+    if fields is not None and parse_fields(fields) is not None:
+        return _encode(build_response(category, confidence, method, profile, fields, extra))
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown response profile: {profile}")
+
+    dynamic = {'category': category, 'confidence': confidence, 'detection_method': method}
+    if extra:
+        dynamic.update(extra)
+    return _encode(dynamic)[:-1] + b',' + _guidance_for(category).body[profile] + b'}'
@@ -0,0 +1,198 @@
+"""
+Content-hash result cache for image and text classification.
+In-memory LRU tier bounded by bytes, with an optional SQLite tier that survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+# Namespace -> model artifacts whose changes invalidate its cached results. Text
+# results are versioned by TextClassifier itself (keyword tables + trained model)
+DEFAULT_VERSION_FILES = {
+    'image': ('models/waste_classifier_v1.h5', 'models/waste_classifier_v1.tflite',
+              'models/waste_classifier_v1.onnx', 'models/class_indices.json'),
+}
+
+
+class ResultCache:
+    """
+    Caches classification results keyed by a hash of the input content.
+
+    Keys are '<namespace>:<hash>'. Every key includes a fingerprint (path,
+    size, mtime) of its namespace's `version_files`. When a model file is
+    replaced the fingerprint changes, so old entries simply stop matching;
+    that namespace's entries are dropped from both tiers and the other
+    namespaces are kept.
+
+    Any object with the same `make_key` / `get` / `put` methods can be
+    passed to the classifiers instead of this class.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_path: Optional[str] = None,
+                 max_disk_entries: int = 100_000,
+                 version_files: Dict[str, Iterable[str]] = DEFAULT_VERSION_FILES,
+                 version_check_interval: float = 1.0):
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.version_files = {namespace: tuple(files) for namespace, files in version_files.items()}
+        self.version_check_interval = version_check_interval
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._versions: Dict[str, str] = {}
+        self._version_checked_at = 0.0
+        self._counters = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'invalidations': 0}
+
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results '
+                '(key TEXT PRIMARY KEY, version TEXT, value TEXT, created REAL)'
+            )
+            self._db.commit()
+
+        self._refresh_version(force=True)
+
+    def version(self, namespace: str) -> str:
+        """Fingerprint of the model files watched for `namespace` ('' if none)"""
+        self._refresh_version()
+        return self._versions.get(namespace, '')
+
+    def make_key(self, namespace: str, *parts: bytes, version: str = '') -> str:
+        """Hash content parts together with the namespace and model versions"""
+        digest = hashlib.sha256()
+        for part in (namespace.encode(), self.version(namespace).encode(), version.encode()) + parts:
+            digest.update(len(part).to_bytes(8, 'little'))
+            digest.update(part)
+        return f"{namespace}:{digest.hexdigest()}"
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._counters['hits'] += 1
+                return json.loads(entry)
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT value FROM results WHERE key = ? AND version = ?',
+                    (key, self._key_version(key))
+                ).fetchone()
+            if row is not None:
+                self._store_memory(key, row[0])
+                with self._lock:
+                    self._counters['hits'] += 1
+                    self._counters['disk_hits'] += 1
+                return json.loads(row[0])
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, key: str, value):
+        """Store a JSON-serializable value"""
+        encoded = json.dumps(value)
+        self._store_memory(key, encoded)
+
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results (key, version, value, created) VALUES (?, ?, ?, ?)',
+                    (key, self._key_version(key), encoded, time.time())
+                )
+                self._db.execute(
+                    'DELETE FROM results WHERE rowid IN (SELECT rowid FROM results '
+                    'ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current memory usage"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': self._counters['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'max_bytes': self.max_bytes,
+                'versions': dict(self._versions),
+            }
+
+    def _store_memory(self, key: str, encoded: str):
+        size = len(encoded) + len(key)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous) + len(key)
+
+            self._memory[key] = encoded
+            self._memory_bytes += size
+
+            # Evict least recently used entries until within budget
+            while self._memory_bytes > self.max_bytes:
+                old_key, old_value = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old_value) + len(old_key)
+                self._counters['evictions'] += 1
+
+    def _key_version(self, key: str) -> str:
+        return self._versions.get(key.split(':', 1)[0], '')
+
+    def _refresh_version(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        for namespace, files in self.version_files.items():
+            digest = hashlib.sha256()
+            for path in files:
+                try:
+                    st = os.stat(path)
+                    digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+                except OSError:
+                    digest.update(f"{path}:missing;".encode())
+            version = digest.hexdigest()[:16]
+
+            previous = self._versions.get(namespace)
+            if version == previous:
+                continue
+            prefix = f"{namespace}:"
+            with self._lock:
+                self._versions[namespace] = version
+                if previous is not None:
+                    self._counters['invalidations'] += 1
+                    print(f"♻️ {namespace} model files changed, invalidating cached results "
+                          f"({previous} -> {version})")
+                    for key in [key for key in self._memory if key.startswith(prefix)]:
+                        self._memory_bytes -= len(self._memory.pop(key)) + len(key)
+                # Also drops rows written by an older model before a restart
+                if self._db is not None:
+                    self._db.execute('DELETE FROM results WHERE key >= ? AND key < ? AND version != ?',
+                                     (prefix, f"{namespace};", version))
+                    self._db.commit()
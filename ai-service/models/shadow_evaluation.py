@@ -0,0 +1,271 @@
+"""
+Shadow and A/B evaluation of a candidate image model on live traffic.
+The second model runs on its own queue and thread, off the request path; comparisons go to a JSONL log.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from models.metrics import metrics
+from models.preprocessing import INPUT_SIZE, load_image
+
+SHADOW_LOG_PATH = 'logs/shadow_eval.jsonl'
+MODES = ('shadow', 'ab')
+
+_STOP = object()
+
+
+def _lower_thread_priority():
+    """Run the calling thread below request threads' CPU priority (Linux; elsewhere a no-op)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+class ShadowEvaluator:
+    """
+    Serves image requests from `primary` and compares a sample of them
+    with `candidate` (both ImageClassifiers).
+
+    mode='shadow': every request is answered by the primary; `fraction` of
+    them are mirrored to the candidate. mode='ab': `fraction` of requests
+    are answered by the candidate (once it is ready), and the same fraction
+    of the rest is mirrored to it. Only the candidate ever runs on the
+    shadow thread: comparisons reuse the primary answer already served, so
+    the primary's replicas, near-duplicate index and metrics see real
+    traffic only.
+
+    Mirrored images wait in a queue bounded by both `max_queue` entries and
+    `max_queue_bytes` of upload bytes (including the batch in progress),
+    and are classified in batches of up to `max_batch_size` by one
+    low-priority thread; when the queue is full they are dropped, so the second model never slows a response
+    down. Each comparison of two model answers is appended to `log_path`
+    as one JSON line (see summarize_log).
+    """
+
+    def __init__(self, primary, candidate, mode: str = 'shadow', fraction: float = 1.0,
+                 log_path: str = SHADOW_LOG_PATH, max_queue: int = 256, max_batch_size: int = 16,
+                 max_queue_bytes: int = 64 * 1024 * 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}' (expected one of: {', '.join(MODES)})")
+        if not 0.0 <= fraction <= 1.0:
+            raise ValueError("fraction must be between 0 and 1")
+
+        self.primary = primary
+        self.candidate = candidate
+        self.mode = mode
+        self.fraction = fraction
+        self.log_path = log_path
+        self.max_batch_size = max_batch_size
+        self.max_queue_bytes = max_queue_bytes
+
+        self._random = random.Random()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Upload bytes held by queued and in-progress entries
+        self._queued_bytes = 0
+        self.counts = {'agree': 0, 'disagree': 0, 'skipped': 0, 'dropped': 0, 'served_by_candidate': 0}
+        # primary category -> candidate category -> count
+        self.confusion: Dict[str, Dict[str, int]] = {}
+
+        if os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        # O_APPEND: whole-line writes from several worker processes do not interleave
+        self._log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._worker = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+        self._worker.start()
+
+    def classify(self, image_file, profile: str = 'full', fields=None) -> Dict:
+        """ImageClassifier.classify on the model serving this request; mirrors it if sampled"""
+        if self.mode == 'ab' and self.candidate.state == 'ready' and self._random.random() < self.fraction:
+            with self._lock:
+                self.counts['served_by_candidate'] += 1
+            return self.candidate.classify(image_file, profile=profile, fields=fields)
+        observer = self._mirror if self._random.random() < self.fraction else None
+        return self.primary.classify(image_file, profile=profile, fields=fields, observer=observer)
+
+    def _mirror(self, image_bytes: bytes, filename: str, result):
+        """Queue a request answered by the primary for the candidate; never blocks"""
+        with self._lock:
+            admitted = self._queued_bytes + len(image_bytes) <= self.max_queue_bytes
+            if admitted:
+                self._queued_bytes += len(image_bytes)
+        if admitted:
+            try:
+                self._queue.put_nowait((image_bytes, filename, result))
+                return
+            except queue.Full:
+                self._release(len(image_bytes))
+        self._count('dropped')
+
+    def _release(self, size: int):
+        with self._lock:
+            self._queued_bytes -= size
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+        metrics.increment('shadow_comparisons_total', result=outcome)
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            entries = [entry]
+            while len(entries) < self.max_batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                entries.append(entry)
+            try:
+                self._compare(entries)
+            except Exception as e:
+                print(f"⚠️ Shadow evaluation failed: {e}")
+            finally:
+                self._release(sum(len(entry[0]) for entry in entries))
+
+    def _compare(self, entries: List):
+        """Classify one batch of mirrored requests with the candidate and log the comparisons"""
+        if self.candidate.state != 'ready':
+            # Nothing to compare with until the candidate is loaded
+            for _ in entries:
+                self._count('skipped')
+            return
+
+        pixels, decoded = [], []
+        for entry in entries:
+            try:
+                pixels.append(np.asarray(load_image(entry[0], INPUT_SIZE)))
+                decoded.append(entry)
+            except Exception:
+                self._count('skipped')
+        if not decoded:
+            return
+        answers = self.candidate.classify_decoded(np.stack(pixels),
+                                                  [(entry[1], len(entry[0])) for entry in decoded])
+
+        lines = []
+        for (image_bytes, filename, primary), candidate in zip(decoded, answers):
+            # Filename-analysis answers say nothing about the models
+            if not (primary[2].startswith('AI ') and candidate[2].startswith('AI ')):
+                self._count('skipped')
+                continue
+            agree = primary[0] == candidate[0]
+            self._count('agree' if agree else 'disagree')
+            with self._lock:
+                row = self.confusion.setdefault(primary[0], {})
+                row[candidate[0]] = row.get(candidate[0], 0) + 1
+            lines.append(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'primary_version': self.primary.version,
+                'candidate_version': self.candidate.version,
+                'image_sha256': hashlib.sha256(image_bytes).hexdigest(),
+                'primary': primary[0],
+                'primary_confidence': round(float(primary[1]), 4),
+                'candidate': candidate[0],
+                'candidate_confidence': round(float(candidate[1]), 4),
+                'agree': agree,
+            }))
+        if lines:
+            os.write(self._log_fd, ('\n'.join(lines) + '\n').encode())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+            confusion = {category: dict(row) for category, row in self.confusion.items()}
+        compared = counts['agree'] + counts['disagree']
+        return {
+            'mode': self.mode,
+            'fraction': self.fraction,
+            'primary_version': self.primary.version,
+            'candidate_version': self.candidate.version,
+            'candidate_state': self.candidate.state,
+            'queued': self._queue.qsize(),
+            'queued_mb': round(self._queued_bytes / (1024 * 1024), 1),
+            **counts,
+            'agreement': counts['agree'] / compared if compared else None,
+            'confusion': confusion,
+        }
+
+    def close(self, timeout: float = None):
+        """Finish the queued comparisons and close the log"""
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+        os.close(self._log_fd)
+
+
+def summarize_log(paths: Iterable[str]) -> Dict:
+    """Agreement overall and per primary category, and the confusion counts, from shadow logs"""
+    total, agreed = 0, 0
+    confusion: Dict[str, Dict[str, int]] = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                total += 1
+                agreed += record['agree']
+                row = confusion.setdefault(record['primary'], {})
+                row[record['candidate']] = row.get(record['candidate'], 0) + 1
+
+    per_class = {}
+    for category, row in sorted(confusion.items()):
+        count = sum(row.values())
+        per_class[category] = {'count': count, 'agreement': row.get(category, 0) / count}
+    return {
+        'compared': total,
+        'agreement': agreed / total if total else None,
+        'per_class': per_class,
+        'confusion': confusion,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize shadow / A-B comparison logs')
+    parser.add_argument('logs', nargs='*', default=[SHADOW_LOG_PATH], help='JSONL logs written by ShadowEvaluator')
+    args = parser.parse_args()
+
+    summary = summarize_log(args.logs)
+    print("=" * 60)
+    print("🔍 Shadow Evaluation Summary")
+    print("=" * 60)
+    if not summary['compared']:
+        print("No comparisons logged yet")
+        return
+
+    print(f"Compared: {summary['compared']}   Agreement: {summary['agreement']:.2%}")
+    print(f"\n{'Primary category':<16} {'Count':>7} {'Agreement':>10}")
+    for category, entry in summary['per_class'].items():
+        print(f"{category:<16} {entry['count']:>7} {entry['agreement']:>10.2%}")
+
+    categories = sorted(set(summary['confusion']) | {c for row in summary['confusion'].values() for c in row})
+    print("\n🔢 Confusion (rows: primary, columns: candidate)")
+    print(' ' * 16 + ''.join(f"{category[:10]:>11}" for category in categories))
+    for category in categories:
+        row = summary['confusion'].get(category, {})
+        print(f"{category:<16}" + ''.join(f"{row.get(other, 0):>11}" for other in categories))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,25 @@
-import re
-from typing import Dict
-from models.waste_database import WASTE_DATABASE
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Tuple
+from models.responses import build_response, encode_response
+from models.metrics import metrics
+from models.async_support import run_cancellable
+from models.keyword_matcher import KeywordMatcher, normalize_text
+from models.text_model import TextModel, DEFAULT_MODEL_PATH, load_training_csv
 
 class TextClassifier:
     """
     Text classification model for waste sorting.
     
-    This implementation uses weighted keyword matching for classification.
-    Can be enhanced with ML models (TF-IDF + Random Forest or BERT-based models).
+    Priority order:
+    1. Trained TF-IDF + Logistic Regression model (text_classifier.joblib)
+    2. Weighted keyword matching
     """
     
-    def __init__(self):
+    def __init__(self, cache=None, model_path: str = DEFAULT_MODEL_PATH):
+        # Optional ResultCache (see models/result_cache.py)
+        self.cache = cache
         self.categories = ['Organic', 'Recyclable', 'Hazardous', 'E-Waste', 'Dry Waste']
         
         # Weighted keywords for each category
@@ -42,71 +51,177 @@ class TextClassifier:
             }
         }
         
-        print("📝 Text classifier initialized (using keyword-based classification + comprehensive database)")
-        print("   Can be enhanced with ML models (TF-IDF + Random Forest or BERT)")
+        # Weight values
+        self.weights = {'high': 5, 'medium': 3, 'low': 1}
+        
+        # Compile all keyword tables into one word-boundary matcher
+        self.matcher = KeywordMatcher(self.keywords, self.weights)
+        
+        # Keyword tables are the fallback "model"; any edit invalidates cached results
+        self._keywords_version = hashlib.sha256(
+            json.dumps({'matcher': 'ngram-v2', 'keywords': self.keywords, 'weights': self.weights},
+                       sort_keys=True).encode()
+        ).hexdigest()[:16]
+        
+        # Trained model, loaded lazily on first use
+        self.text_model = TextModel(model_path)
+        
+        print("📝 Text classifier initialized (trained model if available, keyword-based fallback)")
+        print("   Train a model using: python models/train_text_model.py <labelled.csv>")
+    
+    @property
+    def version(self) -> str:
+        """Changes whenever the keyword tables or the trained artifact change"""
+        return f"{self._keywords_version}:{self.text_model.fingerprint}"
     
-    def classify(self, text: str) -> Dict:
+    def classify(self, text: str, profile: str = 'full', fields=None) -> Dict:
         """
         Classify waste from text description and return comprehensive analysis.
         
         Args:
             text: User's description of the waste item
+            profile: 'full' (all guidance) or 'compact' (fields the server uses)
+            fields: Explicit list (or comma-separated string) of response keys
             
         Returns:
             Dictionary with comprehensive waste information
         """
         try:
             # Preprocess text
-            text_lower = text.lower()
-            text_clean = re.sub(r'[^\w\s]', ' ', text_lower)
+            text_clean = normalize_text(text)
             
             # Calculate weighted scores
-            category, confidence = self._calculate_scores(text_clean)
+            category, confidence, probabilities = self._classify_cached([text_clean])[0]
             
-            # Get comprehensive information from database
-            waste_info = WASTE_DATABASE.get(category, {})
+            with metrics.timer('response', kind='text'):
+                return self._build_response(text, category, confidence, probabilities, profile, fields)
             
-            # Build comprehensive response
-            result = {
-                'category': category,
-                'confidence': confidence,
-                'detection_method': f"Classified based on text analysis: '{text[:50]}...'",
-                'waste_name': waste_info.get('name', category),
-                'examples': waste_info.get('examples', []),
-                'risk_level': waste_info.get('risk_level', 'Unknown'),
-                'risk_reason': waste_info.get('risk_reason', ''),
-                'storage': waste_info.get('storage', {}),
-                'sanitization': waste_info.get('sanitization', {}),
-                'disposal': waste_info.get('disposal', {}),
-                'monitoring': waste_info.get('monitoring', {}),
-                'tools_required': waste_info.get('tools_required', []),
-                'environmental_impact': waste_info.get('environmental_impact', {}),
-                'pros_cons': waste_info.get('pros_cons', {})
-            }
+        except Exception as e:
+            raise Exception(f"Text processing error: {str(e)}")
+    
+    async def classify_async(self, text: str, profile: str = 'full', fields=None, timeout: float = None,
+                             executor=None) -> Dict:
+        """
+        asyncio variant of `classify`, run on `executor` (default: the
+        loop's) so loading the trained model never blocks the event loop.
+        Raises TimeoutError after `timeout` seconds; a timed-out or
+        cancelled request that has not started is skipped.
+        """
+        return await asyncio.wait_for(
+            run_cancellable(lambda cancellation: self.classify(text, profile, fields), executor=executor),
+            timeout)
+    
+    def classify_batch(self, texts: List[str], profile: str = 'full', fields=None) -> List[Dict]:
+        """
+        Classify many descriptions at once.
+        Results are returned in the same order as the input texts.
+        """
+        try:
+            results = self._classify_cached([normalize_text(text) for text in texts])
             
-            return result
+            with metrics.timer('response', kind='text'):
+                return [self._build_response(text, *result, profile, fields)
+                        for text, result in zip(texts, results)]
             
         except Exception as e:
             raise Exception(f"Text processing error: {str(e)}")
     
-    def _calculate_scores(self, text: str):
+    def classify_json(self, text: str, profile: str = 'full', fields=None) -> bytes:
         """
-        Calculate weighted scores for each category.
-        Returns: (category, confidence)
+        Like `classify`, but returns the JSON-encoded response.
+        Only the per-request fields are serialized; category guidance is
+        spliced in from bytes encoded once at import.
         """
-        scores = {category: 0 for category in self.categories}
+        try:
+            category, confidence, probabilities = self._classify_cached([normalize_text(text)])[0]
+            parts = self._response_parts(text, category, confidence, probabilities)
+            
+            with metrics.timer('response', kind='text'):
+                return encode_response(*parts[:3], profile=profile, fields=fields, extra=parts[3])
+            
+        except Exception as e:
+            raise Exception(f"Text processing error: {str(e)}")
+    
+    def _response_parts(self, text: str, category: str, confidence: float,
+                        probabilities: Dict[str, float] = None) -> Tuple[str, float, str, Dict]:
+        """Per-request response fields: (category, confidence, method, extra)"""
+        if probabilities is not None:
+            method = f"Trained text model (TF-IDF): '{text[:50]}...'"
+        else:
+            method = f"Classified based on text analysis: '{text[:50]}...'"
         
-        # Weight values
-        weights = {'high': 5, 'medium': 3, 'low': 1}
+        # Per-class probabilities are only meaningful for the trained model
+        extra = {'probabilities': probabilities} if probabilities is not None else None
+        
+        return category, confidence, method, extra
+    
+    def _build_response(self, text: str, category: str, confidence: float,
+                        probabilities: Dict[str, float] = None,
+                        profile: str = 'full', fields=None) -> Dict:
+        """Build the response for a classified category (see models/responses.py)"""
+        category, confidence, method, extra = self._response_parts(text, category, confidence, probabilities)
+        
+        return build_response(category, confidence, method, profile=profile, fields=fields, extra=extra)
+    
+    def _classify_cached(self, texts_clean: List[str]) -> List[Tuple[str, float, Dict]]:
+        """Look up normalized texts in the result cache and only classify the misses"""
+        cache = self.cache
+        if cache is None:
+            return self._predict_batch(texts_clean)
         
-        # Calculate scores
-        for category, keyword_groups in self.keywords.items():
-            for weight_level, keywords in keyword_groups.items():
-                weight = weights[weight_level]
-                for keyword in keywords:
-                    if keyword in text:
-                        scores[category] += weight
+        # Versioned by the keyword tables and trained model only, not the image model files
+        version = self.version
+        keys = [cache.make_key('text', text.encode(), version=version) for text in texts_clean]
+        results = [cache.get(key) for key in keys]
+        if metrics.enabled:
+            misses = results.count(None)
+            metrics.increment('cache_requests_total', len(results) - misses, kind='text', result='hit')
+            metrics.increment('cache_requests_total', misses, kind='text', result='miss')
         
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self._predict_batch([texts_clean[i] for i in missing])
+            for i, result in zip(missing, fresh):
+                results[i] = result
+                cache.put(keys[i], list(result))
+        
+        return [tuple(result) for result in results]
+    
+    def _predict_batch(self, texts_clean: List[str]) -> List[Tuple[str, float, Dict]]:
+        """
+        Classify normalized texts with the trained model when present,
+        otherwise with weighted keywords (probabilities are then None).
+        """
+        metrics.observe('batch_size', len(texts_clean), kind='text')
+        if self.text_model.available:
+            try:
+                with metrics.timer('text_model', kind='text'):
+                    results = self.text_model.predict(texts_clean)
+                metrics.increment('classifications_total', len(results), kind='text', method='text_model')
+                return results
+            except Exception as e:
+                print(f"Text model classification error: {e}")
+                metrics.increment('errors_total', stage='text_model', kind='text')
+        
+        with metrics.timer('keywords', kind='text'):
+            results = [(category, confidence, None)
+                       for category, confidence in self._calculate_scores_batch(texts_clean)]
+        metrics.increment('classifications_total', len(results), kind='text', method='keywords')
+        return results
+    
+    def _calculate_scores(self, text: str):
+        """
+        Calculate weighted scores for each category.
+        Returns: (category, confidence)
+        """
+        return self._scores_to_prediction(self.matcher.score(text))
+    
+    def _calculate_scores_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Score many normalized texts with the compiled matcher"""
+        return [self._scores_to_prediction(scores) for scores in self.matcher.score_batch(texts)]
+    
+    def _scores_to_prediction(self, scores: Dict[str, int]):
+        """Turn per-category keyword scores into (category, confidence)"""
         # Find best match
         best_category = max(scores.keys(), key=lambda k: scores[k])
         best_score = scores[best_category]
@@ -123,17 +238,23 @@ class TextClassifier:
     
     def train_model(self, training_data):
         """
-        Train a machine learning model on labeled data.
+        Train the TF-IDF + Logistic Regression text model and save it.
         
-        Example with scikit-learn:
-            from sklearn.feature_extraction.text import TfidfVectorizer
-            from sklearn.ensemble import RandomForestClassifier
-            
-            self.vectorizer = TfidfVectorizer()
-            self.model = RandomForestClassifier()
+        Args:
+            training_data: Path to a CSV with `text` and `category` columns,
+                or an iterable of (text, category) pairs
             
-            X = self.vectorizer.fit_transform(texts)
-            self.model.fit(X, labels)
+        Returns:
+            Training summary (samples, classes, features, train accuracy)
         """
-        # TODO: Implement when training data is available
-        pass
+        if isinstance(training_data, str):
+            texts, labels = load_training_csv(training_data)
+        else:
+            pairs = list(training_data)
+            texts = [text for text, _ in pairs]
+            labels = [label for _, label in pairs]
+        
+        summary = self.text_model.train(texts, labels)
+        print(f"✅ Text model trained on {summary['samples']} samples "
+              f"({summary['train_accuracy']:.1%} train accuracy)")
+        return summary
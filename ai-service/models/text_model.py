@@ -0,0 +1,160 @@
+"""
+Trained text classification model (TF-IDF + Logistic Regression).
+Replaces keyword heuristics when a trained artifact is available.
+"""
+
+import csv
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from models.keyword_matcher import normalize_text
+
+DEFAULT_MODEL_PATH = 'models/text_classifier.joblib'
+
+
+def load_training_csv(csv_path: str) -> Tuple[List[str], List[str]]:
+    """Read a CSV with `text` and `category` columns"""
+    texts, labels = [], []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            text = (row.get('text') or '').strip()
+            label = (row.get('category') or '').strip()
+            if text and label:
+                texts.append(text)
+                labels.append(label)
+    return texts, labels
+
+
+class TextModel:
+    """
+    TF-IDF (word unigrams + bigrams) with a multinomial logistic regression.
+
+    The artifact is loaded lazily on first use, so constructing a
+    TextClassifier stays cheap when no model has been trained. Inference
+    vectorizes whole batches into one sparse matrix. The file is checked
+    for changes at most every `check_interval` seconds, and a reloaded
+    vectorizer, model and class list are swapped in together.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, check_interval: float = 1.0):
+        self.model_path = model_path
+        self.check_interval = check_interval
+        # (vectorizer, model, classes) or None; replaced as one reference
+        self._artifact = None
+        self._loaded_fingerprint = None
+        self._fingerprint = ''
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def vectorizer(self):
+        artifact = self._artifact
+        return artifact[0] if artifact else None
+
+    @property
+    def model(self):
+        artifact = self._artifact
+        return artifact[1] if artifact else None
+
+    @property
+    def classes(self) -> List[str]:
+        artifact = self._artifact
+        return artifact[2] if artifact else []
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the artifact on disk; empty when there is none"""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            try:
+                st = os.stat(self.model_path)
+                self._fingerprint = f"{st.st_size}:{st.st_mtime_ns}"
+            except OSError:
+                self._fingerprint = ''
+            self._checked_at = now
+        return self._fingerprint
+
+    @property
+    def available(self) -> bool:
+        """True when a trained artifact exists and loads"""
+        fingerprint = self.fingerprint
+        if not fingerprint:
+            return False
+        if fingerprint != self._loaded_fingerprint:
+            self._load(fingerprint)
+        return self._artifact is not None
+
+    def _load(self, fingerprint: str):
+        with self._lock:
+            if fingerprint == self._loaded_fingerprint:
+                return
+            try:
+                import joblib
+                loaded = joblib.load(self.model_path)
+                model = loaded['model']
+                artifact = (loaded['vectorizer'], model, [str(c) for c in model.classes_])
+                print(f"✅ Text model loaded ({len(artifact[2])} classes)")
+            except Exception as e:
+                print(f"⚠️ Failed to load text model: {e}")
+                artifact = None
+            self._artifact = artifact
+            self._loaded_fingerprint = fingerprint
+
+    def train(self, texts: Iterable[str], labels: Iterable[str], save: bool = True) -> Dict:
+        """Fit the vectorizer and classifier, then save the artifact"""
+        import joblib
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        texts = [normalize_text(t) for t in texts]
+        labels = list(labels)
+        if len(set(labels)) < 2:
+            raise ValueError("Training data needs at least two categories")
+
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, dtype=np.float32)
+        X = vectorizer.fit_transform(texts)
+
+        model = LogisticRegression(max_iter=1000, C=10.0)
+        model.fit(X, labels)
+
+        with self._lock:
+            self._artifact = (vectorizer, model, [str(c) for c in model.classes_])
+            if save:
+                os.makedirs(os.path.dirname(self.model_path) or '.', exist_ok=True)
+                joblib.dump({'vectorizer': vectorizer, 'model': model}, self.model_path, compress=3)
+                self._checked_at = None
+                self._loaded_fingerprint = self.fingerprint
+
+        return {
+            'samples': len(texts),
+            'classes': [str(c) for c in model.classes_],
+            'features': len(vectorizer.vocabulary_),
+            'train_accuracy': float(model.score(X, labels)),
+            'model_path': self.model_path,
+        }
+
+    def predict_proba(self, texts_clean: List[str]):
+        """Class probabilities for already-normalized texts, columns in `self.classes` order"""
+        return self._predict_proba(self._artifact, texts_clean)
+
+    @staticmethod
+    def _predict_proba(artifact, texts_clean: List[str]):
+        if artifact is None:
+            raise RuntimeError("No trained text model loaded")
+        vectorizer, model, _ = artifact
+        return model.predict_proba(vectorizer.transform(texts_clean))
+
+    def predict(self, texts_clean: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """(category, confidence, per-class probabilities) for each text"""
+        # One snapshot: a concurrent reload must not mix vectorizer, model and classes
+        artifact = self._artifact
+        probabilities = self._predict_proba(artifact, texts_clean)
+        classes = artifact[2]
+        best = probabilities.argmax(axis=1)
+        return [
+            (classes[j], float(row[j]), {c: float(p) for c, p in zip(classes, row)})
+            for row, j in zip(probabilities, best)
+        ]
@@ -3,15 +3,34 @@ AI Waste Classification Model Training Script
 Uses Transfer Learning with MobileNetV2
 """
 
+import argparse
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import os
+import sys
 import json
+import hashlib
+import numpy as np
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.data_pipeline import build_dataset, build_dataset_from_shards, ThroughputLogger
+from models.dataset_shards import list_split, load_manifest, open_shard
+from models.embedding_cache import EmbeddingCache, file_hash, load_files
+
+parser = argparse.ArgumentParser(description='Train the waste classification model')
+parser.add_argument('--shards', metavar='DIR',
+                    help='Read pre-decoded shards (scripts/prepare_dataset.py build-shards) '
+                         'instead of datasets/<split>/ images')
+parser.add_argument('--cached-features', action='store_true',
+                    help='Phase 1: run the frozen backbone once, cache pooled embeddings on disk '
+                         'and train the head on them')
+parser.add_argument('--head-only', action='store_true',
+                    help='Skip phase 2 fine-tuning (e.g. nightly head retraining)')
+args = parser.parse_args()
+
 # Configuration
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
@@ -36,55 +55,30 @@ print("=" * 60)
 os.makedirs('models', exist_ok=True)
 os.makedirs('logs', exist_ok=True)
 
-# Data Augmentation for Training
-print("\n📊 Setting up data augmentation...")
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=20,
-    width_shift_range=0.2,
-    height_shift_range=0.2,
-    shear_range=0.2,
-    zoom_range=0.2,
-    horizontal_flip=True,
-    brightness_range=[0.8, 1.2],
-    fill_mode='nearest'
-)
-
-# Validation data (no augmentation, only rescaling)
-val_datagen = ImageDataGenerator(rescale=1./255)
-test_datagen = ImageDataGenerator(rescale=1./255)
-
 # Load Data
+# tf.data pipeline: parallel decode, batched augmentation, cached eval splits
 print("\n📁 Loading datasets...")
 try:
-    train_generator = train_datagen.flow_from_directory(
-        'datasets/train',
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        shuffle=True
-    )
-    
-    val_generator = val_datagen.flow_from_directory(
-        'datasets/validation',
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        shuffle=False
-    )
+    if args.shards:
+        print(f"   Using pre-decoded shards from {args.shards}")
+        # Shards are labelled with the train split's class map when built
+        load_split = lambda split, training=False, class_indices=None: build_dataset_from_shards(
+            args.shards, split, IMG_SIZE, BATCH_SIZE, NUM_CLASSES, training=training
+        )
+    else:
+        load_split = lambda split, training=False, class_indices=None: build_dataset(
+            f'datasets/{split}', IMG_SIZE, BATCH_SIZE, NUM_CLASSES, training=training, class_indices=class_indices
+        )
     
-    test_generator = test_datagen.flow_from_directory(
-        'datasets/test',
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        shuffle=False
-    )
+    train_dataset, train_labels, class_indices = load_split('train', training=True)
+    # Validation and test may lack some classes: label them with the train indices
+    val_dataset, val_labels, _ = load_split('validation', class_indices=class_indices)
+    test_dataset, test_labels, _ = load_split('test', class_indices=class_indices)
     
-    print(f"✅ Training samples: {train_generator.samples}")
-    print(f"✅ Validation samples: {val_generator.samples}")
-    print(f"✅ Test samples: {test_generator.samples}")
-    print(f"✅ Class indices: {train_generator.class_indices}")
+    print(f"✅ Training samples: {len(train_labels)}")
+    print(f"✅ Validation samples: {len(val_labels)}")
+    print(f"✅ Test samples: {len(test_labels)}")
+    print(f"✅ Class indices: {class_indices}")
     
 except Exception as e:
     print(f"❌ Error loading datasets: {e}")
@@ -148,6 +142,7 @@ model.compile(
 # Callbacks
 print("\n📌 Setting up callbacks...")
 callbacks = [
+    ThroughputLogger(len(train_labels)),
     keras.callbacks.ModelCheckpoint(
         'models/waste_classifier_best.h5',
         save_best_only=True,
@@ -175,55 +170,123 @@ callbacks = [
     keras.callbacks.CSVLogger('logs/training_history.csv')
 ]
 
+def split_features(split, extractor, cache):
+    """Pooled backbone embeddings and labels for a split, cached by content hash"""
+    if args.shards:
+        # Shards stay memory-mapped; a batch reads only its own rows from each
+        shards, labels, keys = [], [], []
+        for shard in load_manifest(args.shards)['splits'][split]['shards']:
+            shard_images, shard_labels = open_shard(args.shards, shard)
+            shards.append(shard_images)
+            labels.append(shard_labels)
+            keys.extend(hashlib.sha256(image.tobytes()).hexdigest() for image in shard_images)
+        labels = np.concatenate(labels)
+        starts = np.cumsum([0] + [len(shard_images) for shard_images in shards])
+        
+        def load_batch(indices):
+            owners = np.searchsorted(starts, indices, side='right') - 1
+            batch = np.stack([shards[owner][i - starts[owner]] for owner, i in zip(owners, indices)])
+            return batch.astype(np.float32) / 255.0
+    else:
+        paths, labels, _ = list_split(f'datasets/{split}', class_indices)
+        keys = [file_hash(path) for path in paths]
+        load_batch = lambda indices: load_files([paths[i] for i in indices])
+    
+    features = cache.get_or_compute(keys, load_batch, extractor, batch_size=BATCH_SIZE)
+    return features, keras.utils.to_categorical(labels, NUM_CLASSES)
+
 # Phase 1: Train with frozen base
 print("\n" + "=" * 60)
 print("🎯 PHASE 1: Training with frozen MobileNetV2 base")
 print("=" * 60)
 
-history_phase1 = model.fit(
-    train_generator,
-    validation_data=val_generator,
-    epochs=EPOCHS_PHASE1,
-    callbacks=callbacks,
-    verbose=1
-)
+if args.cached_features:
+    # The frozen backbone gives the same output every epoch: compute it once
+    print("🧠 Using cached backbone embeddings (no augmentation in this phase)")
+    extractor = keras.Sequential([base_model, layers.GlobalAveragePooling2D()])
+    feature_dim = extractor.output_shape[-1]
+    cache = EmbeddingCache(f"mobilenetv2_imagenet_{IMG_SIZE[0]}x{IMG_SIZE[1]}_rescale255", feature_dim)
+    
+    train_features, train_targets = split_features('train', extractor, cache)
+    val_features, val_targets = split_features('validation', extractor, cache)
+    
+    # Same head layers as the full model, fed by embeddings instead of the backbone
+    head = keras.Sequential(
+        [keras.Input((feature_dim,))] +
+        [layer.__class__.from_config(layer.get_config()) for layer in model.layers[2:]],
+        name='WasteClassifierHead'
+    )
+    head.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+        loss='categorical_crossentropy',
+        metrics=['accuracy', keras.metrics.TopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+    )
+    history_phase1 = head.fit(
+        train_features, train_targets,
+        validation_data=(val_features, val_targets),
+        epochs=EPOCHS_PHASE1,
+        batch_size=BATCH_SIZE,
+        callbacks=[
+            keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True,
+                                          monitor='val_accuracy', verbose=1),
+            keras.callbacks.ReduceLROnPlateau(factor=0.5, patience=5, min_lr=1e-7,
+                                              monitor='val_loss', verbose=1),
+        ],
+        verbose=1
+    )
+    
+    # Copy the trained head into the full model
+    for trained, target in zip(head.layers, model.layers[2:]):
+        target.set_weights(trained.get_weights())
+    print(f"✅ Head trained on {len(train_features)} cached embeddings ({len(cache)} in cache)")
+else:
+    history_phase1 = model.fit(
+        train_dataset,
+        validation_data=val_dataset,
+        epochs=EPOCHS_PHASE1,
+        callbacks=callbacks,
+        verbose=1
+    )
 
 # Phase 2: Fine-tuning
-print("\n" + "=" * 60)
-print("🎯 PHASE 2: Fine-tuning (unfreezing last 30 layers)")
-print("=" * 60)
-
-# Unfreeze the base model
-base_model.trainable = True
-
-# Freeze all layers except the last 30
-for layer in base_model.layers[:-30]:
-    layer.trainable = False
-
-print(f"✅ Trainable layers: {len([l for l in model.layers if l.trainable])}")
-
-# Recompile with lower learning rate
-model.compile(
-    optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE/10),
-    loss='categorical_crossentropy',
-    metrics=['accuracy', keras.metrics.TopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
-)
+if args.head_only:
+    print("\n⏭️  Skipping phase 2 fine-tuning (--head-only)")
+else:
+    print("\n" + "=" * 60)
+    print("🎯 PHASE 2: Fine-tuning (unfreezing last 30 layers)")
+    print("=" * 60)
+
+    # Unfreeze the base model
+    base_model.trainable = True
+
+    # Freeze all layers except the last 30
+    for layer in base_model.layers[:-30]:
+        layer.trainable = False
+
+    print(f"✅ Trainable layers: {len([l for l in model.layers if l.trainable])}")
+
+    # Recompile with lower learning rate
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE/10),
+        loss='categorical_crossentropy',
+        metrics=['accuracy', keras.metrics.TopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+    )
 
-# Continue training
-history_phase2 = model.fit(
-    train_generator,
-    validation_data=val_generator,
-    epochs=EPOCHS_PHASE2,
-    callbacks=callbacks,
-    verbose=1
-)
+    # Continue training
+    history_phase2 = model.fit(
+        train_dataset,
+        validation_data=val_dataset,
+        epochs=EPOCHS_PHASE2,
+        callbacks=callbacks,
+        verbose=1
+    )
 
 # Evaluate on test set
 print("\n" + "=" * 60)
 print("📊 FINAL EVALUATION ON TEST SET")
 print("=" * 60)
 
-test_loss, test_accuracy, test_top3 = model.evaluate(test_generator, verbose=1)
+test_loss, test_accuracy, test_top3 = model.evaluate(test_dataset, verbose=1)
 print(f"\n✅ Test Loss: {test_loss:.4f}")
 print(f"✅ Test Accuracy: {test_accuracy*100:.2f}%")
 print(f"✅ Top-3 Accuracy: {test_top3*100:.2f}%")
@@ -235,7 +298,7 @@ model.save('models/waste_classifier_v1')  # SavedModel format
 
 # Save class indices
 with open('models/class_indices.json', 'w') as f:
-    json.dump(train_generator.class_indices, f, indent=2)
+    json.dump(class_indices, f, indent=2)
 
 print("\n✅ Model saved successfully!")
 print("   - Keras H5: models/waste_classifier_v1.h5")
@@ -252,22 +315,22 @@ import numpy as np
 
 # Get predictions
 print("Generating predictions on test set...")
-test_generator.reset()
-predictions = model.predict(test_generator, verbose=1)
+predictions = model.predict(test_dataset, verbose=1)
 predicted_classes = np.argmax(predictions, axis=1)
-true_classes = test_generator.classes
+true_classes = test_labels
 
 # Classification report
 print("\n📊 Classification Report:")
 print(classification_report(
     true_classes, 
     predicted_classes, 
-    target_names=CLASS_NAMES
+    labels=list(range(len(class_indices))),
+    target_names=list(class_indices)
 ))
 
 # Confusion matrix
 print("\n🔢 Confusion Matrix:")
-cm = confusion_matrix(true_classes, predicted_classes)
+cm = confusion_matrix(true_classes, predicted_classes, labels=list(range(len(class_indices))))
 print(cm)
 
 # Save metrics
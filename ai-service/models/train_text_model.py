@@ -0,0 +1,64 @@
+"""
+Text Classification Model Training Script
+TF-IDF + Logistic Regression on labelled waste descriptions
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+
+from models.keyword_matcher import normalize_text
+from models.text_model import TextModel, DEFAULT_MODEL_PATH, load_training_csv
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python models/train_text_model.py <labelled.csv> [output.joblib]")
+        print("   CSV columns: text,category")
+        sys.exit(1)
+
+    csv_path = sys.argv[1]
+    model_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH
+
+    print("=" * 60)
+    print("📝 Text Classification Model Training")
+    print("=" * 60)
+
+    texts, labels = load_training_csv(csv_path)
+    print(f"✅ Loaded {len(texts)} labelled descriptions from {csv_path}")
+
+    # Hold out 20% to report generalization before training on everything
+    stratify = labels if min(labels.count(c) for c in set(labels)) >= 2 else None
+    train_texts, test_texts, train_labels, test_labels = train_test_split(
+        texts, labels, test_size=0.2, random_state=42, stratify=stratify
+    )
+
+    holdout = TextModel(model_path)
+    holdout.train(train_texts, train_labels, save=False)
+
+    test_clean = [normalize_text(t) for t in test_texts]
+    start = time.perf_counter()
+    predictions = [category for category, _, _ in holdout.predict(test_clean)]
+    elapsed = time.perf_counter() - start
+
+    print("\n📊 Hold-out Classification Report:")
+    print(classification_report(test_labels, predictions, zero_division=0))
+    print(f"⏱️  Batch inference: {elapsed / max(len(test_clean), 1) * 1e6:.1f} µs/description")
+
+    # Final model on all data
+    summary = TextModel(model_path).train(texts, labels)
+
+    print("\n💾 Model saved:")
+    print(f"   - Path: {summary['model_path']} ({os.path.getsize(summary['model_path']) / 1024:.1f} KB)")
+    print(f"   - Classes: {', '.join(summary['classes'])}")
+    print(f"   - Features: {summary['features']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+AI Service Benchmark Suite
+Times preprocessing, inference backends, response building and text scoring on synthetic
+inputs, writes JSON results and compares them against a stored baseline
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from PIL import Image
+
+from models.image_classifier import ImageClassifier
+from models.inference_backends import BACKENDS, BATCH_BUCKETS, cpu_supports_bfloat16
+from models.keyword_matcher import normalize_text
+from models.metrics import metrics
+from models.preprocessing import INPUT_SIZE, load_image, preprocess_batch
+from models.responses import build_response, encode_response
+from models.text_classifier import TextClassifier
+
+KERAS_MODEL_PATH = 'models/waste_classifier_v1.h5'
+RESOLUTIONS = [(640, 480), (1920, 1440), (4032, 3024)]
+FORMATS = ['jpeg', 'png', 'rgba', 'palette']
+
+FILLER = ['the', 'old', 'broken', 'small', 'used', 'empty', 'my', 'a', 'from', 'kitchen',
+          'office', 'scan', 'report', 'with', 'some', 'and', 'left', 'over', 'dirty', 'large']
+
+
+class TinyRandomModel:
+    """
+    Randomly initialized stand-in for the custom model: average-pools the
+    batch to 8x8 and applies one dense softmax layer. Lets the pipeline be
+    benchmarked offline, without TensorFlow or trained weights.
+    """
+
+    name = 'tiny-random'
+
+    def __init__(self, num_classes: int = 6, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(0, 0.05, (8 * 8 * 3, num_classes)).astype(np.float32)
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        n, height, width, channels = batch.shape
+        pooled = batch.reshape(n, 8, height // 8, 8, width // 8, channels).mean(axis=(2, 4))
+        logits = pooled.reshape(n, -1) @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def synthetic_image(size, fmt: str, seed: int = 0) -> bytes:
+    """A photo-like image (gradients plus noise) encoded in the given format"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(buffer, format='JPEG', quality=90)
+    elif fmt == 'png':
+        image.save(buffer, format='PNG')
+    elif fmt == 'rgba':
+        alpha = Image.fromarray((x * 255 // max(width - 1, 1)).astype(np.uint8))
+        image.putalpha(alpha)
+        image.save(buffer, format='PNG')
+    elif fmt == 'palette':
+        image.quantize(colors=256).save(buffer, format='PNG')
+    else:
+        raise ValueError(f"Unknown image format: {fmt}")
+    return buffer.getvalue()
+
+
+def synthetic_corpus(classifier: TextClassifier, size: int, seed: int = 0):
+    """Descriptions mixing category keywords with filler words"""
+    rng = random.Random(seed)
+    keywords = [kw for groups in classifier.keywords.values() for kws in groups.values() for kw in kws]
+    corpus = []
+    for _ in range(size):
+        words = rng.choices(FILLER, k=rng.randint(2, 15)) + rng.choices(keywords, k=rng.randint(0, 3))
+        rng.shuffle(words)
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def measure(fn, items: int = 1, repeat: int = 20, warmup: int = 2, min_seconds: float = 0.0):
+    """
+    Time `fn()` `repeat` times after `warmup` calls. Returns per-item
+    milliseconds (median, p90, min) and items/sec from the median.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - start < min_seconds:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000 / items)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        'median_ms': median,
+        'p90_ms': samples[min(len(samples) - 1, int(len(samples) * 0.9))],
+        'min_ms': samples[0],
+        'items_per_sec': 1000 / median if median > 0 else None,
+        'samples': len(samples),
+    }
+
+
+def stage_breakdown(fn, repeat: int):
+    """Run `fn` with metrics enabled and return mean milliseconds per call of each stage"""
+    metrics.reset()
+    metrics.enable()
+    try:
+        for _ in range(repeat):
+            fn()
+    finally:
+        metrics.disable()
+    stages = {}
+    for (name, labels), value in metrics.snapshot().items():
+        if name == 'stage_seconds':
+            stage = dict(labels)['stage']
+            stages[stage] = stages.get(stage, 0.0) + value[2] * 1000 / repeat
+    metrics.reset()
+    return stages
+
+
+def image_backends(quick: bool, xla: bool = False):
+    """
+    Yield (name, classifier) for each backend available offline. Created one
+    at a time, so each is measured before the next is built: the bfloat16
+    graph rewrite is process-wide and comes last.
+    """
+    yield 'filename', ImageClassifier(background_load=False, backend='none')
+
+    tiny = ImageClassifier(background_load=False, backend='none')
+    tiny.model, tiny.model_type, tiny.backend_name = TinyRandomModel(len(tiny.categories)), 'custom', 'tiny-random'
+    yield 'tiny-random', tiny
+
+    for name, (_, path) in BACKENDS.items():
+        if os.path.exists(path):
+            classifier = ImageClassifier(background_load=False, backend=name)
+            if classifier.backend_name == name:
+                yield name, classifier
+
+    if not os.path.exists(KERAS_MODEL_PATH) or quick:
+        return
+    variants = [('keras', {}), ('keras-graph', {'graph_mode': True})]
+    if xla:
+        variants.append(('keras-graph-xla', {'graph_mode': True, 'jit_compile': True}))
+    if cpu_supports_bfloat16():
+        variants.append(('keras-graph-bf16', {'graph_mode': True, 'precision': 'bfloat16'}))
+    for name, options in variants:
+        classifier = ImageClassifier(background_load=False, backend='keras', **options)
+        if classifier.backend_name == name:
+            yield name, classifier
+
+
+def print_bucket_report(results, reference_outputs):
+    """Milliseconds per batch of each Keras variant at each batch size, against plain `model.predict`"""
+    variants = sorted({name.split('/')[1] for name in results
+                       if name.startswith('image.predict/keras') and name.split('/')[1] != 'keras'})
+    if 'keras' not in reference_outputs or not variants:
+        return
+
+    print("\n📐 Keras batch buckets (ms per batch, speedup over model.predict)")
+    print(f"   {'batch':>5} {'keras':>10}" + ''.join(f" {variant:>24}" for variant in variants))
+    for size in sorted(set(BATCH_BUCKETS) | {12}):
+        baseline = results.get(f"image.predict/keras/b{size}")
+        if not baseline:
+            continue
+        line = f"   {size:>5} {baseline['median_ms'] * size:10.1f}"
+        for variant in variants:
+            stats = results.get(f"image.predict/{variant}/b{size}")
+            if stats:
+                line += f" {stats['median_ms'] * size:15.1f} ({baseline['median_ms'] / stats['median_ms']:4.1f}x)"
+        print(line)
+    for variant in variants:
+        if variant in reference_outputs:
+            diff = np.abs(reference_outputs[variant] - reference_outputs['keras'])
+            agreement = np.mean(reference_outputs[variant].argmax(axis=1) == reference_outputs['keras'].argmax(axis=1))
+            print(f"   {variant}: max probability difference {diff.max():.4f}, top-1 agreement {agreement:.0%}")
+
+
+class _Upload(io.BytesIO):
+    """Minimal stand-in for an uploaded file"""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+
+
+def run_benchmarks(quick: bool, xla: bool = False):
+    results = {}
+    repeat = 5 if quick else 20
+    resolutions = RESOLUTIONS[:2] if quick else RESOLUTIONS
+
+    print("\n🖼️  Image decode and resize")
+    images = {(fmt, size): synthetic_image(size, fmt) for fmt in FORMATS for size in resolutions}
+    for (fmt, (width, height)), data in images.items():
+        timings = {}
+        stats = measure(lambda: load_image(data, INPUT_SIZE, timings), repeat=repeat)
+        calls = stats['samples'] + 2
+        stats['decode_ms'] = timings['decode'] * 1000 / calls
+        stats['resize_ms'] = timings.get('resize', 0.0) * 1000 / calls
+        stats['bytes'] = len(data)
+        name = f"image.load/{fmt}/{width}x{height}"
+        results[name] = stats
+        print(f"   {name:<36} {stats['median_ms']:8.2f} ms  "
+              f"(decode {stats['decode_ms']:.2f}, resize {stats['resize_ms']:.2f})")
+
+    photo = images[('jpeg', (1920, 1440))]
+    for batch_size in (1, 16):
+        batch = [photo] * batch_size
+        name = f"image.preprocess_batch/jpeg-1920x1440/b{batch_size}"
+        results[name] = measure(lambda: preprocess_batch(batch, 'custom'), items=batch_size, repeat=repeat)
+        print(f"   {name:<36} {results[name]['median_ms']:8.2f} ms/image")
+
+    print("\n🤖 Image classification per backend")
+    small = images[('jpeg', (640, 480))]
+    model_batch = np.random.default_rng(0).random((max(BATCH_BUCKETS),) + INPUT_SIZE[::-1] + (3,), dtype=np.float32)
+    photos = [synthetic_image((640, 480), 'jpeg', seed) for seed in range(16)]
+    # Outputs on the same decoded photos, to check the graph variants against plain Keras
+    reference_outputs = {}
+    for backend_name, classifier in image_backends(quick, xla):
+        if classifier.model is not None:
+            keras_family = backend_name.startswith('keras')
+            # Keras variants at every compiled bucket, plus one size that needs padding
+            batch_sizes = sorted(set(BATCH_BUCKETS) | {12}) if keras_family else (1, 16)
+            for batch_size in batch_sizes:
+                name = f"image.predict/{backend_name}/b{batch_size}"
+                results[name] = measure(lambda: classifier.model.predict(model_batch[:batch_size], verbose=0),
+                                        items=batch_size, repeat=max(3, repeat // 4) if keras_family else repeat)
+                print(f"   {name:<36} {results[name]['median_ms']:8.2f} ms/image")
+            if keras_family:
+                batch = preprocess_batch(photos, classifier.model_type)[0].copy()
+                reference_outputs[backend_name] = np.asarray(classifier.model.predict(batch, verbose=0))
+
+        name = f"image.classify/{backend_name}/single"
+        results[name] = measure(lambda: classifier.classify(_Upload(small, 'photo.jpg')), repeat=repeat)
+        results[name]['stages_ms'] = stage_breakdown(lambda: classifier.classify(_Upload(small, 'photo.jpg')),
+                                                     repeat)
+        print(f"   {name:<36} {results[name]['median_ms']:8.2f} ms/image")
+
+        items = [(small, 'photo.jpg')] * 16
+        name = f"image.classify/{backend_name}/batch16"
+        results[name] = measure(lambda: classifier.classify_images(items), items=16, repeat=repeat)
+        results[name]['stages_ms'] = stage_breakdown(lambda: classifier.classify_images(items), repeat)
+        print(f"   {name:<36} {results[name]['median_ms']:8.2f} ms/image")
+
+    print_bucket_report(results, reference_outputs)
+
+    tiny = TinyRandomModel()
+    row = tiny.predict(model_batch[:1])[0]
+    interpreter = ImageClassifier(background_load=False, backend='none')
+    results['image.interpret/custom'] = measure(lambda: interpreter._interpret_custom_prediction(row),
+                                                repeat=repeat * 50)
+
+    print("\n📦 Response building")
+    for profile in ('full', 'compact'):
+        name = f"response.build/{profile}"
+        results[name] = measure(lambda: build_response('Hazardous', 0.91, 'AI Model (Trained)', profile),
+                                repeat=repeat * 50)
+        name = f"response.encode/{profile}"
+        results[name] = measure(lambda: encode_response('Hazardous', 0.91, 'AI Model (Trained)', profile),
+                                repeat=repeat * 50)
+    results['response.json_dumps/full'] = measure(
+        lambda: json.dumps(build_response('Hazardous', 0.91, 'AI Model (Trained)')), repeat=repeat * 50)
+    for name in [n for n in results if n.startswith('response.')]:
+        print(f"   {name:<36} {results[name]['median_ms'] * 1000:8.2f} µs")
+
+    print("\n📝 Text classification")
+    text_classifier = TextClassifier()
+    corpus = synthetic_corpus(text_classifier, 500 if quick else 2000)
+    clean = [normalize_text(text) for text in corpus]
+    text_benchmarks = {
+        'text.normalize': (lambda: [normalize_text(t) for t in corpus], len(corpus)),
+        'text.keywords/single': (lambda: [text_classifier._calculate_scores(t) for t in clean], len(clean)),
+        'text.keywords/batch': (lambda: text_classifier._calculate_scores_batch(clean), len(clean)),
+        'text.classify/single': (lambda: [text_classifier.classify(t) for t in corpus[:200]], 200),
+        'text.classify/batch': (lambda: text_classifier.classify_batch(corpus), len(corpus)),
+        'text.classify_json/compact': (lambda: [text_classifier.classify_json(t, 'compact') for t in corpus[:200]],
+                                       200),
+    }
+    for name, (fn, items) in text_benchmarks.items():
+        results[name] = measure(fn, items=items, repeat=max(3, repeat // 4))
+        print(f"   {name:<36} {results[name]['median_ms'] * 1000:8.2f} µs/description")
+
+    return results
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+    }
+    try:
+        import importlib.metadata
+        info['tensorflow'] = importlib.metadata.version('tensorflow')
+    except Exception:
+        info['tensorflow'] = None
+    return info
+
+
+def compare(results, baseline, threshold: float):
+    """Return (regressions, improvements) as lists of (name, baseline_ms, current_ms, ratio)"""
+    regressions, improvements = [], []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get('median_ms'):
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        entry = (name, previous['median_ms'], current['median_ms'], ratio)
+        if ratio > 1 + threshold:
+            regressions.append(entry)
+        elif ratio < 1 - threshold:
+            improvements.append(entry)
+    return regressions, improvements
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ai-service hot paths')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write results')
+    parser.add_argument('--baseline', help='Compare against this earlier results file')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Relative slowdown of the median counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on regressions')
+    parser.add_argument('--quick', action='store_true', help='Fewer repeats, smaller images, no Keras')
+    parser.add_argument('--xla', action='store_true', help='Also time the XLA-compiled Keras graph (slow to compile)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  AI Service Benchmark Suite")
+    print("=" * 60)
+
+    random.seed(0)
+    np.random.seed(0)
+    results = run_benchmarks(args.quick, args.xla)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick': args.quick,
+        'environment': environment(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved: {args.output}")
+
+    if not args.baseline:
+        print("=" * 60)
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("⚠️  Baseline was recorded in a different environment; compare with care")
+
+    regressions, improvements = compare(results, baseline['results'], args.threshold)
+    print(f"\n📊 Compared with {args.baseline} (threshold {args.threshold:.0%})")
+    for title, entries in (('❌ Regressions', regressions), ('✅ Improvements', improvements)):
+        if entries:
+            print(f"\n{title}:")
+            for name, before, after, ratio in sorted(entries, key=lambda e: -abs(e[3] - 1)):
+                print(f"   {name:<40} {before:10.4f} -> {after:10.4f} ms  ({ratio:.2f}x)")
+    if not regressions:
+        print("\n✅ No regressions")
+    print("=" * 60)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+AI Service Load Test
+Measures requests/sec and p50/p99 latency of /classify/image or /classify/text,
+optionally starting gunicorn at several worker x thread settings
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+TEXTS = ['plastic water bottle', 'banana peel and coffee grounds', 'old laptop charger',
+         'used AA battery', 'styrofoam cup', 'empty paint can', 'cardboard box', 'broken phone screen']
+
+
+def synthetic_jpeg(size=(640, 480)) -> bytes:
+    from PIL import Image
+
+    pixels = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def multipart_body(image_bytes: bytes, filename: str = 'image.jpg'):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """One keep-alive connection per load-generating thread"""
+
+    def __init__(self, url: str):
+        parsed = urllib.parse.urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def run_load(url: str, endpoint: str, total: int, concurrency: int, image_bytes: bytes, profile: str):
+    """Fire `total` requests from `concurrency` threads; return a summary dict"""
+    client = Client(url)
+    path = f'/classify/{endpoint}?profile={profile}'
+    if endpoint == 'image':
+        payloads = [multipart_body(image_bytes)]
+    else:
+        payloads = [(json.dumps({'text': text}).encode(), 'application/json') for text in TEXTS]
+
+    def one(i):
+        body, content_type = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        try:
+            status = client.post(path, body, content_type)
+        except Exception:
+            status = 0
+        return status, (time.perf_counter() - start) * 1000
+
+    # Warm-up so model loading and connection setup are not measured
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(concurrency * 2)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    ok = [ms for status, ms in results if status == 200]
+    statuses = [status for status, _ in results]
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'ok': len(ok),
+        'rejected_429': statuses.count(429),
+        'errors': len(results) - len(ok) - statuses.count(429),
+        'requests_per_sec': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms_p50': float(np.percentile(ok, 50)) if ok else None,
+        'latency_ms_p99': float(np.percentile(ok, 99)) if ok else None,
+    }
+
+
+def wait_for_health(url: str, timeout: float = 120.0, need_model: bool = True) -> bool:
+    client = Client(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(client.host, client.port, timeout=5)
+            connection.request('GET', '/health')
+            status = json.loads(connection.getresponse().read())
+            connection.close()
+            if not need_model or status['image_classifier'].get('state') in ('ready', 'fallback'):
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_server(port: int, workers: int, threads: int, model_threads: int, preload: bool):
+    env = dict(os.environ, AI_BIND=f'127.0.0.1:{port}', AI_WORKERS=str(workers), AI_THREADS=str(threads),
+               AI_PRELOAD='1' if preload else '0', AI_ACCESS_LOG='', PYTHONUNBUFFERED='1')
+    if model_threads:
+        env['AI_MODEL_THREADS'] = str(model_threads)
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                            cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the AI service')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to test (ignored with --matrix)')
+    parser.add_argument('--endpoint', choices=['image', 'text'], default='image')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--image', help='Image to upload (default: synthetic 640x480 JPEG)')
+    parser.add_argument('--profile', choices=['full', 'compact'], default='full')
+    parser.add_argument('--matrix', metavar='WxT[,WxT...]',
+                        help='Start gunicorn for each workers x threads setting, e.g. 1x4,2x4,4x2')
+    parser.add_argument('--model-threads', type=int, default=0,
+                        help='AI_MODEL_THREADS for the started servers (0 = library default)')
+    parser.add_argument('--no-preload', action='store_true', help='Start servers with AI_PRELOAD=0')
+    parser.add_argument('--port', type=int, default=8765, help='Port for started servers')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = synthetic_jpeg()
+
+    print("=" * 60)
+    print(f"🚦 AI Service Load Test: /classify/{args.endpoint}")
+    print(f"   {args.requests} requests, concurrency {args.concurrency}")
+    print("=" * 60)
+
+    results = []
+    if args.matrix:
+        for setting in args.matrix.split(','):
+            workers, threads = (int(n) for n in setting.lower().split('x'))
+            url = f'http://127.0.0.1:{args.port}'
+            server = start_server(args.port, workers, threads, args.model_threads, not args.no_preload)
+            try:
+                if not wait_for_health(url):
+                    print(f"❌ {setting}: server did not become ready")
+                    continue
+                result = run_load(url, args.endpoint, args.requests, args.concurrency, image_bytes, args.profile)
+            finally:
+                server.terminate()
+                server.wait()
+            result.update(workers=workers, threads=threads)
+            results.append(result)
+    else:
+        if not wait_for_health(args.url, timeout=10):
+            print(f"❌ No AI service responding at {args.url}")
+            sys.exit(1)
+        results.append(run_load(args.url, args.endpoint, args.requests, args.concurrency,
+                                image_bytes, args.profile))
+
+    print(f"\n{'Workers':>7} {'Threads':>7} {'Req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'429':>6} {'Errors':>6}")
+    for r in results:
+        p50 = f"{r['latency_ms_p50']:.1f}" if r['latency_ms_p50'] is not None else '-'
+        p99 = f"{r['latency_ms_p99']:.1f}" if r['latency_ms_p99'] is not None else '-'
+        print(f"{r.get('workers', '-'):>7} {r.get('threads', '-'):>7} {r['requests_per_sec']:>8.1f} "
+              f"{p50:>8} {p99:>8} {r['rejected_429']:>6} {r['errors']:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,16 @@ Downloads waste classification datasets and organizes them
 """
 
 import os
+import sys
+import argparse
 import shutil
 import requests
 from pathlib import Path
 import zipfile
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
 print("=" * 60)
 print("📦 Waste Classification Dataset Preparation")
 print("=" * 60)
@@ -174,6 +178,26 @@ def check_dataset_ready():
         print("\n⚠️  Dataset is not ready. Please add images.")
         return False
 
+def build_shards_mode(args):
+    """Resize every image once and store pre-decoded shards for training"""
+    from models.dataset_shards import build_shards
+    
+    print(f"\n🧱 Building {args.size}x{args.size} shards in {args.output}...")
+    manifest = build_shards(
+        dataset_dir=str(DATASET_DIR),
+        output_dir=args.output,
+        size=(args.size, args.size),
+        shard_size=args.shard_size,
+        workers=args.workers
+    )
+    
+    total = sum(split['count'] for split in manifest['splits'].values())
+    print("\n" + "=" * 60)
+    print(f"📊 SHARDS COMPLETE: {total} images")
+    print("=" * 60)
+    print(f"🚀 Train with: python models/train_model.py --shards {args.output}")
+    print("=" * 60)
+
 def main():
     """Main execution"""
     create_directory_structure()
@@ -198,4 +222,17 @@ def main():
     print("=" * 60)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Prepare the waste classification dataset')
+    subparsers = parser.add_subparsers(dest='mode')
+    
+    shards_parser = subparsers.add_parser('build-shards', help='Pre-decode images into .npy shards')
+    shards_parser.add_argument('--output', default=str(DATASET_DIR / 'shards'), help='Shard directory')
+    shards_parser.add_argument('--size', type=int, default=224, help='Square image size in pixels')
+    shards_parser.add_argument('--shard-size', type=int, default=1024, help='Images per shard')
+    shards_parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    
+    args = parser.parse_args()
+    if args.mode == 'build-shards':
+        build_shards_mode(args)
+    else:
+        main()
@@ -0,0 +1,263 @@
+"""
+Offline Batch Scoring
+Classifies every image under a directory tree: worker processes decode and resize,
+the main process runs the model in large batches and writes CSV or Parquet
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from models.dataset_shards import IMAGE_EXTENSIONS
+from models.preprocessing import INPUT_SIZE, load_image
+
+COLUMNS = ['path', 'sha256', 'folder', 'category', 'confidence', 'detection_method', 'error']
+
+# Hashes already in the output, shared with workers by the pool initializer
+_done_hashes = frozenset()
+
+
+def is_final(error, method) -> bool:
+    """
+    Whether a written row is a model answer that --resume can keep. Errors and
+    filename/random fallbacks (model still loading, read failures) are retried.
+    """
+    return not error and (method or '').startswith('AI ')
+
+
+def find_images(root: str):
+    """Image paths under root, recursively, in a stable order"""
+    paths = []
+    for directory, subdirs, filenames in os.walk(root):
+        subdirs.sort()
+        paths.extend(os.path.join(directory, name) for name in sorted(filenames)
+                     if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+def _init_worker(done_hashes):
+    global _done_hashes
+    _done_hashes = done_hashes
+
+
+def decode_chunk(paths):
+    """
+    Worker: read, hash, decode and resize a chunk of images.
+    Returns (decoded, failed, skipped, timings); decoded pixels are uint8.
+    """
+    timings = {'read': 0.0, 'decode': 0.0, 'resize': 0.0}
+    decoded, failed, skipped = [], [], 0
+    width, height = INPUT_SIZE
+    pixels = np.empty((len(paths), height, width, 3), dtype=np.uint8)
+
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                image_bytes = f.read()
+        except OSError as e:
+            failed.append((path, '', str(e)))
+            continue
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        timings['read'] += time.perf_counter() - start
+
+        if digest in _done_hashes:
+            skipped += 1
+            continue
+        try:
+            pixels[len(decoded)] = np.asarray(load_image(image_bytes, INPUT_SIZE, timings))
+            decoded.append((path, digest, len(image_bytes)))
+        except Exception as e:
+            failed.append((path, digest, f"Image preprocessing error: {e}"))
+
+    return decoded, pixels[:len(decoded)], failed, skipped, timings
+
+
+class CsvSink:
+    """Appends rows to a CSV file, flushing after every batch"""
+
+    def __init__(self, path: str):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if not exists:
+            self._writer.writeheader()
+
+    @staticmethod
+    def scored_hashes(path: str):
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'r', newline='') as f:
+            return {row['sha256'] for row in csv.DictReader(f)
+                    if row.get('sha256') and is_final(row.get('error'), row.get('detection_method'))}
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Writes rows as part files in a directory (Parquet files cannot be
+    appended to), so an interrupted run loses at most `rows_per_part` rows.
+    """
+
+    def __init__(self, path: str, rows_per_part: int = 10000):
+        import pyarrow  # noqa: F401  (fail early if missing)
+
+        self.path = path
+        self.rows_per_part = rows_per_part
+        os.makedirs(path, exist_ok=True)
+        self._rows = []
+        self._run = time.strftime('%Y%m%d-%H%M%S')
+        self._parts = 0
+
+    @staticmethod
+    def scored_hashes(path: str):
+        import pyarrow.parquet as pq
+
+        hashes = set()
+        for part in glob.glob(os.path.join(path, '*.parquet')):
+            table = pq.read_table(part, columns=['sha256', 'detection_method', 'error']).to_pydict()
+            hashes.update(h for h, method, error in zip(table['sha256'], table['detection_method'], table['error'])
+                          if h and is_final(error, method))
+        return hashes
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        table = pa.table({column: [row[column] for row in self._rows] for column in COLUMNS})
+        pq.write_table(table, os.path.join(self.path, f"part-{self._run}-{self._parts:05d}.parquet"))
+        self._parts += 1
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every image under a directory tree')
+    parser.add_argument('root', help='Directory to scan, e.g. datasets/test')
+    parser.add_argument('--output', default='scores.csv',
+                        help='CSV file, or a .parquet directory of part files (needs pyarrow)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help='Decode processes')
+    parser.add_argument('--batch-size', type=int, default=256, help='Images per model call')
+    parser.add_argument('--chunk-size', type=int, default=32, help='Images per worker task')
+    parser.add_argument('--backend', default='auto', choices=['auto', 'tflite', 'onnx', 'keras'])
+    parser.add_argument('--no-resume', action='store_true', help='Score everything, ignoring existing output')
+    args = parser.parse_args()
+
+    sink_class = ParquetSink if args.output.endswith('.parquet') else CsvSink
+
+    print("=" * 60)
+    print("🗂️  Offline Batch Scoring")
+    print("=" * 60)
+
+    paths = find_images(args.root)
+    done = set() if args.no_resume else sink_class.scored_hashes(args.output)
+    print(f"✅ Found {len(paths)} images under {args.root}")
+    if done:
+        print(f"↩️  Resuming: {len(done)} images already scored in {args.output} "
+              f"(failed and fallback rows are retried)")
+
+    # Start the decode pool before the model is loaded: TensorFlow is not fork-safe
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    pool = context.Pool(args.workers, initializer=_init_worker, initargs=(frozenset(done),))
+
+    from models.image_classifier import ImageClassifier
+    classifier = ImageClassifier(background_load=False, backend=args.backend)
+    classifier.wait_until_ready()
+    print(f"🤖 Model: {classifier.model_type or 'filename fallback'} ({classifier.backend_name or '-'})")
+
+    sink = sink_class(args.output)
+    stage = {'read': 0.0, 'decode': 0.0, 'resize': 0.0, 'infer': 0.0, 'write': 0.0}
+    counts = {'scored': 0, 'skipped': 0, 'failed': 0}
+    root = os.path.abspath(args.root)
+
+    pending_meta, pending_pixels, pending_count = [], [], 0
+
+    def folder_of(path):
+        return os.path.relpath(os.path.dirname(os.path.abspath(path)), root)
+
+    def flush():
+        nonlocal pending_meta, pending_pixels, pending_count
+        if not pending_count:
+            return
+        pixels = np.concatenate(pending_pixels)
+
+        start = time.perf_counter()
+        results = classifier.classify_decoded(pixels, [(os.path.basename(p), size) for p, _, size in pending_meta])
+        stage['infer'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        sink.write([
+            {'path': path, 'sha256': digest, 'folder': folder_of(path), 'category': category,
+             'confidence': round(confidence, 6), 'detection_method': method, 'error': ''}
+            for (path, digest, _), (category, confidence, method) in zip(pending_meta, results)
+        ])
+        stage['write'] += time.perf_counter() - start
+
+        counts['scored'] += pending_count
+        pending_meta, pending_pixels, pending_count = [], [], 0
+
+    chunks = [paths[i:i + args.chunk_size] for i in range(0, len(paths), args.chunk_size)]
+    start = time.perf_counter()
+    try:
+        for decoded, pixels, failed, skipped, timings in pool.imap_unordered(decode_chunk, chunks):
+            for name, seconds in timings.items():
+                stage[name] += seconds
+            counts['skipped'] += skipped
+            if failed:
+                counts['failed'] += len(failed)
+                sink.write([{'path': path, 'sha256': digest, 'folder': folder_of(path), 'category': '',
+                             'confidence': None, 'detection_method': '', 'error': error}
+                            for path, digest, error in failed])
+            if decoded:
+                pending_meta.extend(decoded)
+                pending_pixels.append(pixels)
+                pending_count += len(decoded)
+            if pending_count >= args.batch_size:
+                flush()
+        flush()
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrupted; rerun the same command to resume")
+    finally:
+        pool.terminate()
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 Scored {counts['scored']} images in {elapsed:.1f}s "
+          f"({counts['scored'] / elapsed if elapsed > 0 else 0:.1f} images/sec)")
+    print(f"   Skipped (already scored): {counts['skipped']}, failed: {counts['failed']}")
+    print("\n⏱️  Stage timings (read/decode/resize are summed over worker processes)")
+    for name, seconds in stage.items():
+        per_image = seconds / counts['scored'] * 1000 if counts['scored'] else 0.0
+        print(f"   {name:<7} {seconds:>8.2f}s  {per_image:>7.2f} ms/image")
+    print(f"\n💾 Results: {args.output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the service modules the way app.py does, with ai-service/ on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+import pytest
+
+from models.image_classifier import ImageClassifier
+from models.inference_executor import InferenceExecutor
+from models.preprocessing import batch_buffer
+
+
+class FakeModel:
+    """Keras-style replica: returns each row's sum, optionally blocking until released"""
+
+    def __init__(self, release: threading.Event = None):
+        self.release = release
+        self.started = threading.Event()
+        self.calls = 0
+
+    def predict(self, batch, verbose=0):
+        self.calls += 1
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+
+def test_predict_returns_the_replica_output():
+    executor = InferenceExecutor([FakeModel()], timeout=5)
+    batch = np.arange(6, dtype=np.float32).reshape(2, 3)
+    np.testing.assert_array_equal(executor.predict(batch), [[3.0], [12.0]])
+    executor.close(5)
+
+
+def test_needs_a_replica():
+    with pytest.raises(ValueError):
+        InferenceExecutor([])
+
+
+def test_timeout_while_running_raises_and_releases_the_batch_buffer():
+    release = threading.Event()
+    executor = InferenceExecutor([FakeModel(release)], timeout=0.05)
+    batch = batch_buffer(1)
+    with pytest.raises(TimeoutError, match='timed out'):
+        executor.predict(batch)
+    # The replica may still read `batch`: this thread's next batch must not overwrite it
+    assert batch_buffer(1).base is not batch.base
+    release.set()
+    executor.close(5)
+
+
+def test_batches_still_queued_when_the_caller_gives_up_are_skipped():
+    release = threading.Event()
+    replica = FakeModel(release)
+    executor = InferenceExecutor([replica], timeout=5)
+    running = executor.submit(np.zeros((1, 1), dtype=np.float32))
+    replica.started.wait(5)
+    with pytest.raises(TimeoutError):
+        executor.predict(np.zeros((1, 1), dtype=np.float32), timeout=0.05)
+    release.set()
+    running.result(5)
+    executor.close(5)
+    assert replica.calls == 1
+
+
+def test_full_queue_raises_instead_of_waiting_forever():
+    release = threading.Event()
+    replica = FakeModel(release)
+    executor = InferenceExecutor([replica], max_queue=1)
+    executor.submit(np.zeros((1, 1), dtype=np.float32))
+    replica.started.wait(5)
+    executor.submit(np.zeros((1, 1), dtype=np.float32))
+    with pytest.raises(TimeoutError, match='queue is full'):
+        executor.submit(np.zeros((1, 1), dtype=np.float32), timeout=0.05)
+    release.set()
+    executor.close(5)
+
+
+def test_submit_after_close_raises():
+    executor = InferenceExecutor([FakeModel()])
+    executor.close(5)
+    with pytest.raises(RuntimeError, match='closed'):
+        executor.submit(np.zeros((1, 1), dtype=np.float32))
+
+
+def test_classifier_falls_back_to_filename_analysis_on_timeout(tmp_path, monkeypatch):
+    # No model files here and no Keras backend requested: nothing is loaded
+    monkeypatch.chdir(tmp_path)
+    classifier = ImageClassifier(background_load=False, backend='tflite')
+    assert classifier.state == 'fallback'
+
+    release = threading.Event()
+    executor = InferenceExecutor([FakeModel(release)], timeout=0.05)
+    results = classifier._predict_rows(executor, 'mobilenet', batch_buffer(1), [('plastic_bottle.jpg', 1000)])
+    release.set()
+    executor.close(5)
+
+    category, _, method = results[0]
+    assert category == 'Recyclable'
+    assert method.startswith('Filename analysis')
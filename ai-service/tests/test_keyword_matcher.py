@@ -0,0 +1,72 @@
+import pytest
+
+from models.keyword_matcher import KeywordMatcher, normalize_text, plural
+from models.text_classifier import TextClassifier
+from scripts.benchmark_keywords import legacy_scores, make_corpus
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return TextClassifier()
+
+
+def whole_word_legacy_scores(classifier, text):
+    """The original substring scan, restricted to (normalized) keywords that occur as whole words"""
+    padded = f" {text} "
+    scores = {category: 0 for category in classifier.categories}
+    for category, keyword_groups in classifier.keywords.items():
+        for weight_level, keywords in keyword_groups.items():
+            for keyword in keywords:
+                if f" {normalize_text(keyword)} " in padded:
+                    scores[category] += classifier.weights[weight_level]
+    return scores
+
+
+def test_matches_the_original_scorer_on_whole_words(classifier):
+    identical = 0
+    for text in make_corpus(classifier, 2000):
+        expected = whole_word_legacy_scores(classifier, text)
+        assert classifier.matcher.score(text) == expected, text
+        # Where the old scan found no partial-word matches the scores are unchanged
+        identical += legacy_scores(classifier, text) == expected
+    assert identical > 100
+
+
+def test_no_matches_inside_other_words(classifier):
+    text = normalize_text('Scan of cancer report')
+    assert legacy_scores(classifier, text)['Recyclable'] > 0
+    assert classifier.matcher.score(text)['Recyclable'] == 0
+
+
+def test_plurals_match_their_keyword():
+    matcher = KeywordMatcher({'A': {'high': ['bottle', 'glass', 'battery', 'leaf', 'food waste']}}, {'high': 5})
+    assert matcher.find('two bottles') == {'bottle'}
+    assert matcher.find('broken glasses') == {'glass'}
+    assert matcher.find('old batteries') == {'battery'}
+    assert matcher.find('dry leaves') == {'leaf'}
+    assert matcher.find('food wastes') == {'food waste'}
+    assert matcher.find('canes bottled') == set()
+
+
+def test_each_keyword_counts_once_per_text():
+    matcher = KeywordMatcher({'A': {'high': ['can'], 'low': ['tin can']}}, {'high': 5, 'low': 1})
+    assert matcher.score('can can tin can cans') == {'A': 6}
+
+
+def test_exact_keyword_wins_over_a_plural():
+    # 'glasses' is its own keyword here and also the plural of 'glass'
+    matcher = KeywordMatcher({'A': {'high': ['glass']}, 'B': {'high': ['glasses']}}, {'high': 5})
+    assert matcher.score('reading glasses') == {'A': 0, 'B': 5}
+
+
+@pytest.mark.parametrize('word, expected', [
+    ('bottle', 'bottles'), ('box', 'boxes'), ('brush', 'brushes'), ('battery', 'batteries'),
+    ('toy', 'toys'), ('knife', 'knives'), ('mouse', 'mice'),
+])
+def test_plural(word, expected):
+    assert plural(word) == expected
+
+
+def test_score_batch_matches_score(classifier):
+    corpus = make_corpus(classifier, 50, seed=3)
+    assert classifier.matcher.score_batch(corpus) == [classifier.matcher.score(text) for text in corpus]
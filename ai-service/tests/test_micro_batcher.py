@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from models.micro_batcher import MicroBatcher
+
+
+def test_concurrent_items_are_batched_in_submission_order():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6]
+    batcher.close(5)
+    assert batches == [[0, 1, 2, 3]]
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=16, max_wait_ms=20)
+    start = time.monotonic()
+    assert batcher.submit('a').result(5) == 'a'
+    assert time.monotonic() - start < 2
+    batcher.close(5)
+
+
+def test_batch_failure_is_raised_by_every_caller():
+    def process(items):
+        raise ValueError('model failed')
+
+    batcher = MicroBatcher(process, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError, match='model failed'):
+            future.result(5)
+    batcher.close(5)
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match='2 items'):
+            future.result(5)
+    batcher.close(5)
+
+
+def test_close_flushes_queued_items():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+    futures = [batcher.submit(i) for i in range(3)]
+    closer = threading.Thread(target=batcher.close, args=(5,))
+    closer.start()
+    release.set()
+    closer.join(5)
+    assert [future.result(5) for future in futures] == [0, 1, 2]
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(lambda items: items)
+    batcher.close(5)
+    with pytest.raises(RuntimeError, match='closed'):
+        batcher.submit(1)
+    # Closing twice is a no-op
+    batcher.close(5)
+
+
+def test_cancelled_items_are_skipped():
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def process(items):
+        seen.extend(items)
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit('first')
+    started.wait(5)
+    # Still queued behind the running batch: a caller that gives up is never processed
+    abandoned = batcher.submit('abandoned')
+    assert abandoned.cancel()
+    kept = batcher.submit('kept')
+    release.set()
+    assert first.result(5) == 'first'
+    assert kept.result(5) == 'kept'
+    batcher.close(5)
+    assert seen == ['first', 'kept']
+
+
+def test_result_wait_times_out_without_blocking_the_batcher():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0)
+    future = batcher.submit('slow')
+    with pytest.raises(TimeoutError):
+        future.result(0.05)
+    release.set()
+    assert future.result(5) == 'slow'
+    batcher.close(5)
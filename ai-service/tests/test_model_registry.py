@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pytest
+
+from models.model_registry import ModelRegistry
+from models.preprocessing import INPUT_SIZE
+
+CLASS_INDICES = {'Dry Waste': 0, 'E-Waste': 1, 'Hazardous': 2, 'Medical Waste': 3, 'Organic': 4, 'Recyclable': 5}
+
+
+def save_model(path, outputs: int, predicted: int):
+    """A tiny Keras model that always predicts class `predicted`"""
+    keras = pytest.importorskip('tensorflow').keras
+    model = keras.Sequential([
+        keras.Input(INPUT_SIZE[::-1] + (3,)),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(outputs, activation='softmax'),
+    ])
+    kernel, bias = model.layers[-1].get_weights()
+    bias[predicted] = 10.0
+    model.layers[-1].set_weights([np.zeros_like(kernel), bias])
+    model.save(path)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def artifacts(tmp_path_factory):
+    root = tmp_path_factory.mktemp('artifacts')
+    class_indices = root / 'class_indices.json'
+    class_indices.write_text(json.dumps(CLASS_INDICES))
+    return {
+        'class_indices': str(class_indices),
+        'organic': save_model(root / 'organic.h5', 6, CLASS_INDICES['Organic']),
+        'recyclable': save_model(root / 'recyclable.h5', 6, CLASS_INDICES['Recyclable']),
+        'three_classes': save_model(root / 'three_classes.h5', 3, 0),
+    }
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+
+def register(registry, artifacts, name):
+    return registry.register(artifacts[name], artifacts['class_indices'], metrics_path=None)
+
+
+def served_category(classifier):
+    pixels = np.zeros((1,) + INPUT_SIZE[::-1] + (3,), dtype=np.uint8)
+    category, _, method = classifier.classify_decoded(pixels, [('', 1000)])[0]
+    assert method.startswith('AI ')
+    return category
+
+
+def test_register_promote_and_rollback_pointer(registry, artifacts):
+    assert registry.current() is None
+    v1 = register(registry, artifacts, 'organic')
+    v2 = register(registry, artifacts, 'recyclable')
+    assert (v1, v2) == ('v1', 'v2')
+    assert registry.versions() == ['v1', 'v2']
+    assert registry.manifest(v1)['class_indices'] == CLASS_INDICES
+
+    registry.promote(v1)
+    registry.promote(v2)
+    assert (registry.current(), registry.previous()) == (v2, v1)
+    assert registry.rollback() == v1
+    assert registry.current() == v1
+
+
+def test_rollback_needs_a_previous_version(registry, artifacts):
+    registry.promote(register(registry, artifacts, 'organic'))
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_tampered_artifacts_cannot_be_promoted(registry, artifacts):
+    version = register(registry, artifacts, 'organic')
+    with open(registry.artifact_paths(version)['keras'], 'ab') as f:
+        f.write(b'corrupted')
+    with pytest.raises(ValueError, match='checksum'):
+        registry.promote(version)
+
+
+def test_classifier_hot_swaps_to_the_promoted_version(registry, artifacts):
+    from models.image_classifier import ImageClassifier
+
+    registry.promote(register(registry, artifacts, 'organic'))
+    classifier = ImageClassifier(background_load=False, backend='keras', registry=registry)
+    assert classifier.version == 'v1'
+    assert served_category(classifier) == 'Organic'
+
+    registry.promote(register(registry, artifacts, 'recyclable'))
+    assert classifier.reload()
+    assert classifier.version == 'v2'
+    assert classifier.last_reload['result'] == 'swapped'
+    assert served_category(classifier) == 'Recyclable'
+
+    # Rolling the pointer back swaps the previous version in again
+    registry.rollback()
+    assert classifier.reload()
+    assert classifier.version == 'v1'
+    assert served_category(classifier) == 'Organic'
+
+
+def test_classifier_keeps_serving_when_a_new_version_fails(registry, artifacts):
+    from models.image_classifier import ImageClassifier
+
+    registry.promote(register(registry, artifacts, 'organic'))
+    classifier = ImageClassifier(background_load=False, backend='keras', registry=registry)
+
+    # Outputs 3 classes for a 6-class map: warm-up rejects it
+    registry.promote(register(registry, artifacts, 'three_classes'))
+    assert not classifier.reload()
+    assert classifier.version == 'v1'
+    assert classifier.last_reload['result'] == 'rolled_back'
+    assert served_category(classifier) == 'Organic'
+    # Not retried by the registry watcher
+    assert 'v2' in classifier._failed_versions
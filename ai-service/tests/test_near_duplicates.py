@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+from models.near_duplicates import HASH_BITS, NearDuplicateIndex, dhash
+
+
+def flip(image_hash, bits):
+    for bit in bits:
+        image_hash ^= 1 << bit
+    return image_hash
+
+
+def test_exact_and_max_distance_matches_are_found():
+    index = NearDuplicateIndex(max_distance=6)
+    stored = 0x0123456789ABCDEF
+    index.add(stored, 'result')
+    assert index.lookup(stored) == ('result', 0)
+
+    # One flipped bit in each of six different chunks: only the seventh chunk still agrees
+    chunk_starts = [shift for shift, _ in index._chunks]
+    assert index.lookup(flip(stored, chunk_starts[:6])) == ('result', 6)
+    assert index.lookup(flip(stored, chunk_starts[:7])) is None
+
+
+def test_lookup_matches_a_linear_scan():
+    rng = random.Random(7)
+    index = NearDuplicateIndex(max_distance=4)
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(200)]
+    for image_hash in stored:
+        index.add(image_hash, image_hash)
+
+    for _ in range(500):
+        query = flip(rng.choice(stored), rng.sample(range(HASH_BITS), rng.randint(0, 7)))
+        distances = [bin(query ^ image_hash).count('1') for image_hash in stored]
+        nearest = min(distances)
+        match = index.lookup(query)
+        if nearest <= index.max_distance:
+            assert match is not None and match[1] == nearest
+        else:
+            assert match is None
+
+
+def test_least_recently_matched_entry_is_evicted():
+    # 32 bits apart from each other
+    a, b, c = 0xFFFFFFFFFFFFFFFF, 0x0F0F0F0F0F0F0F0F, 0xF0F0F0F0F0F0F0F0
+    index = NearDuplicateIndex(max_distance=2, max_entries=2)
+    index.add(a, 'a')
+    index.add(b, 'b')
+    index.lookup(a)
+    index.add(c, 'c')
+
+    assert len(index) == 2
+    assert index.lookup(b) is None
+    assert index.lookup(a) == ('a', 0)
+    assert index.lookup(c) == ('c', 0)
+    # The evicted hash is gone from every chunk table too
+    assert not any(b in bucket for table in index._tables for bucket in table.values())
+
+
+def test_adding_a_stored_hash_replaces_its_result():
+    index = NearDuplicateIndex(max_entries=1)
+    index.add(5, 'old')
+    index.add(5, 'new')
+    assert len(index) == 1
+    assert index.lookup(5) == ('new', 0)
+
+
+def test_max_distance_is_validated():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(max_distance=HASH_BITS // 2)
+
+
+def test_dhash_ignores_brightness_and_flags_flat_images():
+    rng = np.random.default_rng(0)
+    image = rng.random((224, 224, 3), dtype=np.float32)
+    assert dhash(image) == dhash(image * 0.5 + 0.2)
+    assert dhash(np.full((224, 224, 3), 0.5, dtype=np.float32), min_contrast=0.01) == 0
@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+from models.result_cache import ResultCache
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / 'model.tflite'
+    path.write_bytes(b'v1')
+    return str(path)
+
+
+def make_cache(model_file, **kwargs):
+    kwargs.setdefault('version_files', {'image': (model_file,)})
+    # Check the model files on every call
+    return ResultCache(version_check_interval=0.0, **kwargs)
+
+
+def replace_model(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    # Make sure the fingerprint changes even on coarse-mtime filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_keys_depend_on_content_and_namespace(model_file):
+    cache = make_cache(model_file)
+    key = cache.make_key('image', b'pixels')
+    assert key.startswith('image:')
+    assert key == cache.make_key('image', b'pixels')
+    assert key != cache.make_key('image', b'other pixels')
+    assert cache.make_key('text', b'pixels') != cache.make_key('image', b'pixels')
+    assert cache.make_key('image', b'pixels', version='v2') != key
+
+
+def test_get_returns_what_was_put(model_file):
+    cache = make_cache(model_file)
+    key = cache.make_key('image', b'a')
+    assert cache.get(key) is None
+    cache.put(key, ['Organic', 0.9, 'AI Model'])
+    assert cache.get(key) == ['Organic', 0.9, 'AI Model']
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_bytes(model_file):
+    value = 'x' * 100
+    cache = make_cache(model_file)
+    a, b, c = (cache.make_key('image', content) for content in (b'a', b'b', b'c'))
+    # Room for two entries (key + JSON value)
+    cache.max_bytes = 2 * (len(a) + len(json.dumps(value)))
+    cache.put(a, value)
+    cache.put(b, value)
+    cache.get(a)
+    cache.put(c, value)
+
+    assert cache.get(b) is None
+    assert cache.get(a) == value and cache.get(c) == value
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['memory_bytes'] <= cache.max_bytes
+
+
+def test_values_larger_than_the_budget_are_not_kept(model_file):
+    cache = make_cache(model_file, max_bytes=50)
+    key = cache.make_key('image', b'a')
+    cache.put(key, 'x' * 100)
+    assert cache.get(key) is None
+    assert cache.stats()['memory_bytes'] == 0
+
+
+def test_replacing_a_model_file_invalidates_only_its_namespace(model_file):
+    cache = make_cache(model_file)
+    image_key = cache.make_key('image', b'a')
+    text_key = cache.make_key('text', b'a')
+    cache.put(image_key, 'old image result')
+    cache.put(text_key, 'text result')
+
+    replace_model(model_file, b'v2 with different weights')
+
+    new_key = cache.make_key('image', b'a')
+    assert new_key != image_key
+    assert cache.get(new_key) is None
+    assert cache.get(image_key) is None
+    assert cache.get(text_key) == 'text result'
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_disk_tier_survives_a_restart_until_the_model_changes(model_file, tmp_path):
+    disk_path = str(tmp_path / 'cache' / 'results.sqlite')
+    cache = make_cache(model_file, disk_path=disk_path)
+    key = cache.make_key('image', b'a')
+    cache.put(key, 'stored')
+
+    restarted = make_cache(model_file, disk_path=disk_path)
+    assert restarted.get(key) == 'stored'
+    assert restarted.stats()['disk_hits'] == 1
+
+    replace_model(model_file, b'v2 with different weights')
+    retrained = make_cache(model_file, disk_path=disk_path)
+    assert retrained.get(key) is None
+    assert retrained._db.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0
+
+
+def test_disk_tier_keeps_the_newest_entries(model_file, tmp_path):
+    cache = make_cache(model_file, disk_path=str(tmp_path / 'results.sqlite'), max_disk_entries=2, max_bytes=0)
+    keys = [cache.make_key('image', bytes([i])) for i in range(3)]
+    for key in keys:
+        cache.put(key, 'value')
+    assert cache._db.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 2